@@ -0,0 +1,96 @@
+import os
+import json
+from typing import List, Tuple
+
+import streamlit as st
+import streamlit_authenticator as stauth
+
+# Cookie 설정 (세 앱이 동일 쿠키를 공유)
+AUTH_COOKIE_NAME = 'ks_auth_cookie'
+AUTH_COOKIE_KEY = 'ks_auth_key'
+
+
+def _get_secret(key: str, default=None):
+    """Streamlit secrets 우선, 없으면 환경변수 (secrets.toml이 없어도 안전)"""
+    try:
+        return st.secrets.get(key, os.getenv(key, default))
+    except Exception:
+        return os.getenv(key, default)
+
+
+def _parse_auth_users(raw) -> List[Tuple[str, str, str]]:
+    """
+    AUTH_USERS 설정을 (username, name, password) 목록으로 변환
+    - secrets.toml: [AUTH_USERS.<username>] name=..., password=...
+    - 환경변수: JSON 문자열 (dict 또는 list 형태 모두 지원)
+    """
+    if not raw:
+        return []
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            print("[WARN] AUTH_USERS 형식이 올바르지 않아 무시합니다.")
+            return []
+
+    users = []
+    if isinstance(raw, dict):
+        # { "username": {"name": ..., "password": ...} }
+        for username, info in raw.items():
+            info = dict(info or {})
+            users.append((str(username), str(info.get("name", username)), str(info.get("password", ""))))
+    elif isinstance(raw, list):
+        # [ {"username": ..., "name": ..., "password": ...} ]
+        for info in raw:
+            info = dict(info or {})
+            username = str(info.get("username", ""))
+            users.append((username, str(info.get("name", username)), str(info.get("password", ""))))
+    return [u for u in users if u[0] and u[2]]
+
+
+def load_credentials() -> Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]]:
+    """
+    로그인 계정 목록 (names, usernames, passwords) 반환
+    - 기존 단일 계정(AUTH_USERNAME/AUTH_PASSWORD/AUTH_NAME) + AUTH_USERS 다중 계정
+    """
+    try:
+        # Try Streamlit Cloud secrets first, then fallback to environment variables
+        auth_username = st.secrets.get("AUTH_USERNAME", os.getenv("AUTH_USERNAME", "YOUR-ID"))
+        auth_password = st.secrets.get("AUTH_PASSWORD", os.getenv("AUTH_PASSWORD", "YOUR-PASSWORD"))
+        auth_name = st.secrets.get("AUTH_NAME", os.getenv("AUTH_NAME", "KS"))
+    except Exception:
+        # Fallback to environment variables only (for local development)
+        auth_username = os.getenv("AUTH_USERNAME", "YOUR-ID")
+        auth_password = os.getenv("AUTH_PASSWORD", "YOUR-PASSWORD")
+        auth_name = os.getenv("AUTH_NAME", "YOUR-NAME")
+
+    users = [(auth_username, auth_name, auth_password)]
+    for user in _parse_auth_users(_get_secret("AUTH_USERS")):
+        if user[0] not in {u[0] for u in users}:
+            users.append(user)
+
+    names = tuple(u[1] for u in users)
+    usernames = tuple(u[0] for u in users)
+    passwords = tuple(u[2] for u in users)
+    return names, usernames, passwords
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def hash_passwords(passwords: Tuple[str, ...]) -> List[str]:
+    """
+    bcrypt 해싱은 프로세스 전체에서 계정 세트당 1회만 수행
+    - 인자(계정 세트)가 캐시 키이므로 secrets가 바뀌면 자동으로 다시 해싱됨
+    """
+    return stauth.Hasher(list(passwords)).generate()
+
+
+def get_authenticator():
+    """
+    로그인용 Authenticate 객체 생성 (해싱은 캐시된 결과 사용)
+    - 0.1.5의 Authenticate는 생성자에서 쿠키 컴포넌트를 렌더링하므로 매 rerun마다 생성하되,
+      비용이 큰 bcrypt 해싱만 프로세스 단위로 재사용함
+    """
+    names, usernames, passwords = load_credentials()
+    hashed_passwords = hash_passwords(passwords)
+    return stauth.Authenticate(list(names), list(usernames), hashed_passwords,
+        AUTH_COOKIE_NAME, AUTH_COOKIE_KEY)
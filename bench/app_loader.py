@@ -0,0 +1,32 @@
+import ast
+import os
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _is_constant_assign(node: ast.stmt) -> bool:
+    """대문자 이름에 값을 넣는 모듈 상수 (예: HISTORY_TURNS = 20)"""
+    if not isinstance(node, (ast.Assign, ast.AnnAssign)):
+        return False
+    targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+    return all(isinstance(t, ast.Name) and t.id.isupper() for t in targets)
+
+
+def load_app_functions(filename: str) -> SimpleNamespace:
+    """
+    Streamlit 앱 스크립트에서 import / 함수 / 상수 정의만 골라 실행 (로그인/사이드바 등 화면 코드는 건너뜀)
+    - 앱을 띄우지 않고 create_gpt_prompt 같은 함수를 그대로 호출하기 위함
+    - 함수가 참조하는 st.session_state 값(storage, name 등)은 호출하는 쪽에서 미리 넣어 둠
+    """
+    path = os.path.join(ROOT, filename)
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    body = [
+        node for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef))
+        or _is_constant_assign(node)
+    ]
+    namespace = {"__name__": f"bench_{os.path.splitext(filename)[0]}", "__file__": path}
+    exec(compile(ast.Module(body=body, type_ignores=[]), path, "exec"), namespace)
+    return SimpleNamespace(**namespace)
@@ -0,0 +1,136 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# 응답 본문을 만드는 데 쓰는 문장 (토큰 하나 = 조각 하나로 취급)
+FAKE_REPLY_TEXT = (
+    "예를들어, 이번 분기 내 시행을 가정하면 어떤 자료를 근거로 판단하셨는지 먼저 확인하고 싶습니다. "
+    "다른 팀과 협의된 부분과 아직 협의가 필요한 부분을 나눠서 말씀해 주시겠어요? "
+)
+
+
+class FakeOpenAIServer:
+    """
+    로컬 OpenAI Chat Completions 대역 (네트워크 없이 벤치마크)
+    - POST /v1/chat/completions, stream=True면 SSE로 조각을 보냄
+    - ttft초 뒤 첫 조각, 이후 tokens_per_sec 속도로 reply_tokens개, 마지막에 usage 청크
+    - OPENAI_BASE_URL을 base_url로 설정하면 OpenAI SDK가 그대로 사용
+    """
+
+    def __init__(self, ttft: float = 0.05, tokens_per_sec: float = 200.0, reply_tokens: int = 120,
+                 cached_tokens: int = 0, host: str = "127.0.0.1", port: int = 0):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_tokens = reply_tokens
+        self.cached_tokens = cached_tokens
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def pieces(self):
+        words = FAKE_REPLY_TEXT.split(" ")
+        return [words[i % len(words)] + " " for i in range(self.reply_tokens)]
+
+    def usage(self, request: dict) -> dict:
+        prompt_chars = sum(len(str(m.get("content") or "")) for m in request.get("messages", []))
+        prompt_tokens = max(prompt_chars // 2, 1)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": self.reply_tokens,
+            "total_tokens": prompt_tokens + self.reply_tokens,
+            "prompt_tokens_details": {"cached_tokens": min(self.cached_tokens, prompt_tokens)},
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                fake.requests += 1
+                if request.get("stream"):
+                    self._stream(request)
+                else:
+                    self._complete(request)
+
+            def _chunk(self, request: dict, delta: dict, finish_reason=None, usage=None) -> bytes:
+                body = {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request.get("model", "gpt-4o"),
+                    "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                if usage:
+                    body["usage"] = usage
+                return f"data: {json.dumps(body, ensure_ascii=False)}\n\n".encode("utf-8")
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _stream(self, request: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(fake.ttft)
+                interval = 1.0 / fake.tokens_per_sec if fake.tokens_per_sec > 0 else 0.0
+                self._write_chunk(self._chunk(request, {"role": "assistant", "content": ""}))
+                for piece in fake.pieces():
+                    self._write_chunk(self._chunk(request, {"content": piece}))
+                    if interval:
+                        time.sleep(interval)
+                self._write_chunk(self._chunk(request, {}, finish_reason="stop"))
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    self._write_chunk(self._chunk(request, {}, usage=fake.usage(request)))
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+            def _complete(self, request: dict):
+                time.sleep(fake.ttft + fake.reply_tokens / max(fake.tokens_per_sec, 1e-9))
+                body = json.dumps({
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "gpt-4o"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "".join(fake.pieces())}}],
+                    "usage": fake.usage(request),
+                }, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -0,0 +1,302 @@
+"""
+핫패스 벤치마크 (네트워크 없이 실행)
+
+    python -m bench.run                     # 실행 후 bench/baseline.json과 비교
+    python -m bench.run --save-baseline     # 현재 결과를 기준값으로 저장
+    python -m bench.run --only chat_turn --repeat 20
+
+- OpenAI: bench.fake_openai 로컬 서버 (--ttft, --tokens-per-sec로 속도 조절)
+- DB: 임시 파일의 SqliteStorage (STORAGE_BACKEND=sqlite와 같은 구현)
+- 회의: bench.scripted_team.ScriptedTeam (Agno 스트림 이벤트를 정해진 순서로 재생)
+- 기준값 대비 중앙값이 --tolerance 비율 이상 느려진 항목이 있으면 종료 코드 1
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "bench", "baseline.json")
+
+BENCH_USER = "벤치"
+BENCH_SUBJECT_SEQ = 1
+BENCH_TOPIC = "내년 S/S 아웃도어 라인 원가 절감과 리드타임 단축 방안"
+
+
+class BenchContext:
+    """벤치마크 공용 준비물 (대역 서버/저장소/앱 함수)"""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="ks-bench-")
+        self.openai = None
+        try:
+            self._setup()
+        except BaseException:
+            self.close()
+            raise
+
+    def _setup(self):
+        """대역 OpenAI 서버, 임시 SQLite 저장소, 앱 함수 준비 (실패하면 __init__에서 정리)"""
+        args = self.args
+
+        from bench.fake_openai import FakeOpenAIServer
+        self.openai = FakeOpenAIServer(ttft=args.ttft, tokens_per_sec=args.tokens_per_sec,
+                                       reply_tokens=args.reply_tokens).start()
+
+        # 앱 모듈은 import 시점에 환경변수를 읽으므로 먼저 설정
+        os.environ.update({
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": self.openai.base_url,
+            "STORAGE_BACKEND": "sqlite",
+            "SQLITE_STORAGE_PATH": os.path.join(self.workdir, "ks.sqlite3"),
+            "LLM_CACHE_ENABLED": "false",
+            "WRITE_FAILED_PATH": os.path.join(self.workdir, "write_queue_failed.jsonl"),
+        })
+
+        import streamlit as st
+        from streamlit.logger import set_log_level
+        from storage import SqliteStorage
+        from bench.app_loader import load_app_functions
+
+        # 화면 없이 실행할 때마다 나오는 ScriptRunContext 경고 숨김
+        set_log_level("error")
+        self.storage = SqliteStorage(os.environ["SQLITE_STORAGE_PATH"])
+        st.session_state.storage = self.storage
+        st.session_state.name = BENCH_USER
+        self._seed()
+
+        self.index = load_app_functions("index.py")
+        self.index2 = load_app_functions("index2.py")
+        self.meeting_markdown = self._meeting_markdown()
+
+    def _seed(self):
+        """본부장 시뮬레이션 대화 (talk_latest 30턴 + talk_old 요약 2건)"""
+        rows = [
+            {
+                'name': BENCH_USER,
+                'subject_seq': BENCH_SUBJECT_SEQ,
+                'talk_seq': seq,
+                'from_to': 'Q' if seq % 2 else 'A',
+                'talk_history': f"{seq}번째 발언입니다. 원가 구조와 협력사 일정, 물류 리드타임을 함께 검토했습니다. " * 3,
+                'write_key': f"seed:{seq}",
+            }
+            for seq in range(1, 71)
+        ]
+        self.storage.insert_talk('talk_latest', rows)
+        self.storage.archive_talk_latest(BENCH_USER, BENCH_SUBJECT_SEQ, 20, "앞선 대화 요약: 원가 목표와 협력사 후보를 정리함. " * 10)
+        self.storage.archive_talk_latest(BENCH_USER, BENCH_SUBJECT_SEQ, 40, "최근 요약: 리드타임 단축 방안을 보강하기로 함. " * 10)
+
+    def _meeting_markdown(self) -> str:
+        """회의 결과 마크다운 (HTML/PDF 변환 입력)"""
+        from team_events import TranscriptSegments, iter_team_events
+
+        segments = TranscriptSegments()
+        for event in iter_team_events(self.scripted_team(), BENCH_TOPIC):
+            segments.add(event)
+        return segments.to_markdown()
+
+    def scripted_team(self):
+        from bench.scripted_team import ScriptedTeam
+        return ScriptedTeam([f"{team} 팀장" for team in ("의류기획", "소재개발", "생산", "영업", "마케팅")],
+                            member_chunks=self.args.member_chunks, leader_chunks=self.args.leader_chunks)
+
+    def close(self):
+        if self.openai is not None:
+            self.openai.stop()
+        # 남은 지연 쓰기를 마친 뒤 임시 작업 폴더(SQLite, 캐시, 실패 기록) 삭제
+        if "write_queue" in sys.modules:
+            sys.modules["write_queue"].flush_pending_writes()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+# ======================== 측정 항목 ========================
+
+def bench_team_stream_chunks(ctx: BenchContext) -> Dict:
+    """run_team_debate_stream: Agno 이벤트 → 표시용 텍스트 변환 (모델 대기 없이 청크 처리 비용만)"""
+    team = ctx.scripted_team()
+    text = "".join(ctx.index.run_team_debate_stream(team, BENCH_TOPIC, session_id="bench"))
+    return {"chunks": team.chunk_count, "chars": len(text)}
+
+
+def _prompt_args() -> Dict:
+    return dict(
+        user_name=BENCH_USER,
+        subject_seq=BENCH_SUBJECT_SEQ,
+        preliminary_info="상반기 실적과 협력사 현황 자료를 참고함",
+        report_topic=BENCH_TOPIC,
+        report_content="원가 8% 절감, 리드타임 2주 단축을 목표로 협력사 이원화를 제안합니다. " * 20,
+        user_input="협력사 이원화 일정은 다음 분기 초로 잡았습니다.",
+    )
+
+
+def bench_create_gpt_prompt(ctx: BenchContext) -> Dict:
+    """create_gpt_prompt (대화 사본이 메모리에 있는 평소 경로)"""
+    prompt = ctx.index2.create_gpt_prompt(**_prompt_args())
+    return {"chars": len(prompt)}
+
+
+def bench_create_gpt_prompt_cold(ctx: BenchContext) -> Dict:
+    """create_gpt_prompt (대화 사본을 DB에서 처음 읽는 경로)"""
+    from transcript_store import get_transcript_store
+    get_transcript_store().invalidate(('talk_latest', BENCH_USER, BENCH_SUBJECT_SEQ))
+    prompt = ctx.index2.create_gpt_prompt(**_prompt_args())
+    return {"chars": len(prompt)}
+
+
+def bench_create_html_from_markdown(ctx: BenchContext) -> Dict:
+    html = ctx.index.create_html_from_markdown(ctx.meeting_markdown, title="벤치 회의 결과")
+    return {"bytes": len(html)}
+
+
+def bench_create_pdf(ctx: BenchContext) -> Dict:
+    from pdf import create_pdf
+    return {"bytes": len(create_pdf(ctx.meeting_markdown, font_path=pdf_font_path()))}
+
+
+def bench_chat_turn(ctx: BenchContext) -> Dict:
+    """본부장 시뮬레이션 한 턴: 프롬프트 → 스트리밍 응답(대역 서버) → 저장 → 저장 완료 대기"""
+    from llm import consume_chat_stream
+    from write_queue import flush_pending_writes
+
+    args = _prompt_args()
+    prompt = ctx.index2.create_gpt_prompt(**args)
+    result = consume_chat_stream(ctx.index2.stream_gpt_response(prompt, use_cache=False), lambda piece: None)
+    ctx.index2.save_turn(BENCH_USER, BENCH_SUBJECT_SEQ, args["user_input"], result.text)
+    flush_pending_writes()
+    return {"ttft_ms": round((result.ttft or 0) * 1000, 2), "llm_ms": round(result.elapsed * 1000, 2),
+            "error": result.error}
+
+
+BENCH_CASES: Dict[str, Callable[[BenchContext], Dict]] = {
+    "team_stream_chunks": bench_team_stream_chunks,
+    "create_gpt_prompt": bench_create_gpt_prompt,
+    "create_gpt_prompt_cold": bench_create_gpt_prompt_cold,
+    "create_html_from_markdown": bench_create_html_from_markdown,
+    "create_pdf": bench_create_pdf,
+    "chat_turn": bench_chat_turn,
+}
+
+
+def pdf_font_path() -> str:
+    """앱 기본 한글 폰트, 없으면 reportlab 내장 Vera (글리프는 달라도 처리 경로는 같음)"""
+    path = os.getenv("BENCH_PDF_FONT", os.path.join(ROOT, "fonts", "NotoSansKR-Regular.ttf"))
+    if os.path.exists(path):
+        return path
+    import reportlab
+    return os.path.join(os.path.dirname(reportlab.__file__), "fonts", "Vera.ttf")
+
+
+# ======================== 실행/비교 ========================
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def run_case(ctx: BenchContext, name: str, repeat: int, warmup: int) -> Dict:
+    func = BENCH_CASES[name]
+    timings: List[float] = []
+    extra: Dict = {}
+    # 앱 함수의 [DEBUG] 출력은 결과 표를 가리므로 버림 (print 비용은 그대로 포함)
+    with contextlib.redirect_stdout(io.StringIO()) as sink:
+        for i in range(warmup + repeat):
+            started = time.perf_counter()
+            extra = func(ctx)
+            elapsed = time.perf_counter() - started
+            if i >= warmup:
+                timings.append(elapsed * 1000)
+            sink.seek(0)
+            sink.truncate()
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(_percentile(timings, 95), 3),
+        "min_ms": round(min(timings), 3),
+        "runs": len(timings),
+        **extra,
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """기준값보다 중앙값이 tolerance 비율 이상 느려진 항목"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("median_ms"):
+            continue
+        ratio = result["median_ms"] / base["median_ms"]
+        result["baseline_median_ms"] = base["median_ms"]
+        result["change"] = round(ratio - 1, 3)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def print_table(results: Dict[str, Dict], regressions: List[str]):
+    print(f"{'case':<28}{'median ms':>12}{'p95 ms':>12}{'baseline':>12}{'change':>10}")
+    for name, result in results.items():
+        base = result.get("baseline_median_ms")
+        change = result.get("change")
+        flag = "  ← 느려짐" if name in regressions else ""
+        print(f"{name:<28}{result['median_ms']:>12.2f}{result['p95_ms']:>12.2f}"
+              f"{(f'{base:.2f}' if base else '-'):>12}{(f'{change:+.1%}' if change is not None else '-'):>10}{flag}")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="KS 시뮬레이터 핫패스 벤치마크")
+    parser.add_argument("--only", action="append", choices=sorted(BENCH_CASES), help="실행할 항목 (여러 번 지정 가능)")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="결과를 기준값 파일로 저장")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="허용 증가율 (0.2 = 20%%)")
+    parser.add_argument("--output", help="결과 JSON 저장 경로")
+    parser.add_argument("--ttft", type=float, default=0.05, help="대역 OpenAI 첫 토큰 지연(초)")
+    parser.add_argument("--tokens-per-sec", type=float, default=400.0)
+    parser.add_argument("--reply-tokens", type=int, default=120)
+    parser.add_argument("--member-chunks", type=int, default=200)
+    parser.add_argument("--leader-chunks", type=int, default=300)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    os.chdir(ROOT)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    ctx = BenchContext(args)
+    try:
+        results = {name: run_case(ctx, name, args.repeat, args.warmup) for name in (args.only or BENCH_CASES)}
+    finally:
+        ctx.close()
+
+    regressions: List[str] = []
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"기준값 저장: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+    print_table(results, regressions)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if regressions:
+        print(f"기준값 대비 {args.tolerance:.0%} 이상 느려진 항목: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
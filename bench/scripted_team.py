@@ -0,0 +1,59 @@
+import time
+from types import SimpleNamespace
+from typing import Iterator, List, Optional
+
+MEMBER_TEXT = "우리 팀 관점에서 보면 이번 안건은 원가와 리드타임을 함께 봐야 합니다. "
+LEADER_TEXT = "팀장들의 의견을 종합하면 합의점은 일정이고, 이견은 예산 배분입니다. "
+
+
+class ScriptedTeam:
+    """
+    정해진 순서대로 Agno 스트림 이벤트를 내보내는 Team 대역
+    - team.run(stream=True, stream_intermediate_steps=True)와 같은 모양의 청크 (event/agent_name/content/tool)
+    - 팀장마다: 시작 → 검색 도구 호출/완료 → 발언 청크 → 완료, 마지막에 리더 종합 → TeamRunCompleted
+    - ttft/chunk_delay로 모델 속도를 흉내 (0이면 변환/표시 처리 비용만 측정)
+    """
+
+    def __init__(self, members: List[str], member_chunks: int = 200, leader_chunks: int = 300,
+                 ttft: float = 0.0, chunk_delay: float = 0.0, mode: str = "coordinate"):
+        self.name = "KS 회의팀"
+        self.mode = mode
+        self.member_names = members
+        self.member_chunks = member_chunks
+        self.leader_chunks = leader_chunks
+        self.ttft = ttft
+        self.chunk_delay = chunk_delay
+        self.run_response = None
+
+    @property
+    def chunk_count(self) -> int:
+        """한 번 실행에서 내보내는 청크 수"""
+        return len(self.member_names) * (self.member_chunks + 4) + self.leader_chunks + 1
+
+    def _sleep(self, seconds: float):
+        if seconds:
+            time.sleep(seconds)
+
+    def run(self, message: str, stream: bool = True, stream_intermediate_steps: bool = True,
+            session_id: Optional[str] = None) -> Iterator[SimpleNamespace]:
+        metrics = {"input_tokens": [1200], "output_tokens": [self.member_chunks], "cached_tokens": [800]}
+        member_responses = []
+        for name in self.member_names:
+            yield SimpleNamespace(event="RunStarted", agent_name=name, content=None)
+            tool = SimpleNamespace(tool_name="google_search", tool_args={"query": message[:30]},
+                                   result="[]", tool_call_error=False, metrics=SimpleNamespace(time=0.01))
+            yield SimpleNamespace(event="ToolCallStarted", agent_name=name, tool=tool)
+            yield SimpleNamespace(event="ToolCallCompleted", agent_name=name, tool=tool)
+            self._sleep(self.ttft)
+            for _ in range(self.member_chunks):
+                self._sleep(self.chunk_delay)
+                yield SimpleNamespace(event="RunResponseContent", agent_name=name, content=MEMBER_TEXT)
+            yield SimpleNamespace(event="RunCompleted", agent_name=name, content=None, metrics=dict(metrics))
+            member_responses.append(SimpleNamespace(agent_name=name, metrics=dict(metrics)))
+
+        self._sleep(self.ttft)
+        for _ in range(self.leader_chunks):
+            self._sleep(self.chunk_delay)
+            yield SimpleNamespace(event="TeamRunResponseContent", agent_name=None, content=LEADER_TEXT)
+        self.run_response = SimpleNamespace(metrics=dict(metrics), member_responses=member_responses)
+        yield SimpleNamespace(event="TeamRunCompleted", agent_name=None, content=None)
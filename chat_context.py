@@ -0,0 +1,214 @@
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import streamlit as st
+
+from llm import consume_chat_stream, stream_chat_completion
+
+try:
+    import tiktoken
+except ImportError:  # 없으면 글자 수 기반 어림값 사용
+    tiktoken = None
+
+# 채팅 컨텍스트 토큰 예산 - 최근 대화는 원문 그대로, 예산을 넘는 오래된 대화는 요약으로
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "6000"))
+CHAT_CONTEXT_MAX_RECENT_TURNS = int(os.getenv("CHAT_CONTEXT_MAX_RECENT_TURNS", "8"))
+# 요약 크기(토큰)와 요약에 쓰는 모델, 한 번 요약할 때 창 밖으로 더 밀어낼 턴 수
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "600"))
+CHAT_SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+CHAT_SUMMARY_BATCH_TURNS = int(os.getenv("CHAT_SUMMARY_BATCH_TURNS", "4"))
+# 요약 1회 호출에 넣을 원문 최대 토큰 (넘으면 나눠서 누적 요약)
+CHAT_SUMMARY_INPUT_TOKENS = int(os.getenv("CHAT_SUMMARY_INPUT_TOKENS", "6000"))
+# Agno 세션 저장소의 대화 기록 사용 (최근 대화를 메시지에 다시 넣지 않음)
+CHAT_AGNO_HISTORY = os.getenv("CHAT_AGNO_HISTORY", "false").lower() in ("1", "true", "yes", "on")
+CHAT_AGNO_HISTORY_RUNS = int(os.getenv("CHAT_AGNO_HISTORY_RUNS", "3"))
+CHAT_AGNO_STORAGE_PATH = os.getenv("CHAT_AGNO_STORAGE_PATH", os.path.join(".cache", "agno_sessions.sqlite3"))
+
+SPEAKER_LABELS = {"Q": "사용자", "A": "AI 팀"}
+
+SUMMARY_SYSTEM_PROMPT = """당신은 회의 기록 담당자입니다.
+기존 요약과 새 대화를 합쳐 하나의 누적 요약으로 다시 작성하세요.
+- 결정 사항, 합의/이견, 수치·근거, 남은 질문과 할 일을 빠짐없이 남깁니다.
+- 인사말, 반복, 수사적 표현은 버립니다.
+- 한국어 개조식으로, {max_tokens} 토큰 이내로 작성합니다."""
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """토큰 수 (tiktoken이 있으면 정확히, 없으면 어림값: 한글 1자≈1토큰, 그 외 4자≈1토큰)"""
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        return len(_encoding.encode(text))
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def format_turn(from_to: str, content: str, labels: Dict[str, str] = SPEAKER_LABELS) -> str:
+    return f"{labels.get(from_to, from_to)}: {content}"
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """max_tokens를 넘으면 앞부분만 남기고 자름 (요약 실패 시 대체용)"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + " …"
+
+
+def summarize_turns(previous_summary: str, turns: Sequence[Tuple[str, str]],
+                    max_tokens: int = CHAT_SUMMARY_MAX_TOKENS,
+                    model: str = CHAT_SUMMARY_MODEL, labels: Dict[str, str] = SPEAKER_LABELS,
+                    client=None, fallback: bool = True) -> Optional[str]:
+    """
+    기존 요약 + 새 대화 → 새 누적 요약 (LLM 호출)
+    - 원문이 길면 CHAT_SUMMARY_INPUT_TOKENS 단위로 나눠 차례로 누적
+    - 호출이 실패하면 기존 요약에 원문을 잘라 붙인 것으로 대신함
+      (fallback=False면 None 반환 - 요약으로 원문을 지우는 talk_archive용)
+    - 백그라운드 스레드에서 부를 때는 client(OpenAI)를 미리 만들어 넘김
+    """
+    summary = previous_summary or ""
+    chunk: List[str] = []
+    chunk_tokens = 0
+    for from_to, content in turns:
+        line = format_turn(from_to, content, labels)
+        line = clip_to_tokens(line, CHAT_SUMMARY_INPUT_TOKENS)
+        line_tokens = count_tokens(line)
+        if chunk and chunk_tokens + line_tokens > CHAT_SUMMARY_INPUT_TOKENS:
+            summary = _summarize_chunk(summary, chunk, max_tokens, model, client, fallback)
+            if summary is None:
+                return None
+            chunk, chunk_tokens = [], 0
+        chunk.append(line)
+        chunk_tokens += line_tokens
+    if chunk:
+        summary = _summarize_chunk(summary, chunk, max_tokens, model, client, fallback)
+    return summary
+
+
+def _summarize_chunk(summary: str, lines: List[str], max_tokens: int, model: str, client=None,
+                     fallback: bool = True) -> Optional[str]:
+    dialogue = "\n".join(lines)
+    messages = [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT.format(max_tokens=max_tokens)},
+        {"role": "user", "content": f"<summary>\n{summary or '(없음)'}\n</summary>\n\n<dialogue>\n{dialogue}\n</dialogue>"},
+    ]
+    result = consume_chat_stream(
+        stream_chat_completion(messages, model=model, max_tokens=max_tokens, temperature=0.2,
+                               client=client),
+        lambda piece: None,
+    )
+    if result.error or not result.text.strip():
+        if not fallback:
+            print(f"[ERROR] 대화 요약 실패: {result.text[:100]}")
+            return None
+        print(f"[ERROR] 대화 요약 실패 - 원문을 잘라 대신함: {result.text[:100]}")
+        return clip_to_tokens(f"{summary}\n{dialogue}".strip(), max_tokens)
+    return result.text.strip()
+
+
+class ChatContextBuilder:
+    """
+    토큰 예산 안에서 채팅 컨텍스트 구성
+    - 최근 대화는 원문 그대로(슬라이딩 윈도), 창 밖으로 밀린 대화는 누적 요약 하나로 유지
+    - 요약은 새로 밀린 턴만 기존 요약에 더해 갱신 (state에 요약/요약된 턴 수 보관)
+    - 창에서 밀어낼 때는 CHAT_SUMMARY_BATCH_TURNS만큼 더 밀어 요약 호출 횟수를 줄임
+    """
+
+    def __init__(self, state: Dict, budget: int = CHAT_CONTEXT_TOKEN_BUDGET,
+                 max_recent_turns: int = CHAT_CONTEXT_MAX_RECENT_TURNS,
+                 summary_tokens: int = CHAT_SUMMARY_MAX_TOKENS):
+        self.state = state
+        self.budget = budget
+        self.max_recent_turns = max_recent_turns
+        self.summary_tokens = summary_tokens
+
+    @property
+    def summary(self) -> str:
+        return self.state.get("summary", "")
+
+    @property
+    def summarized(self) -> int:
+        """요약에 반영된 (앞에서부터의) 턴 수"""
+        return self.state.get("upto", 0)
+
+    def _window_start(self, history: Sequence[Tuple[str, str]], available: int) -> int:
+        """뒤에서부터 예산/턴 수 한도 안에 들어가는 첫 턴의 위치"""
+        start = len(history)
+        used = 0
+        while start > 0 and len(history) - start < self.max_recent_turns:
+            tokens = count_tokens(format_turn(*history[start - 1]))
+            if used + tokens > available:
+                break
+            used += tokens
+            start -= 1
+        return start
+
+    def build(self, header_parts: List[str], history: Sequence[Tuple[str, str]], question: str,
+              recent_in_session: bool = False) -> str:
+        """
+        header_parts(사전 정보/주제 등) + 이전 대화 요약 + 최근 대화 원문 + 현재 질문
+        - recent_in_session: 최근 대화를 Agno 세션 기록이 넣어주는 경우 (요약만 붙임)
+        """
+        if self.summarized > len(history):
+            # 다른 토론으로 바뀌었거나 이력이 줄어든 경우 처음부터
+            self.state.clear()
+
+        fixed = "\n\n".join(header_parts + [f"현재 질문: {question}"])
+        available = max(self.budget - count_tokens(fixed) - self.summary_tokens, 0)
+        if recent_in_session:
+            start = max(len(history) - 2 * CHAT_AGNO_HISTORY_RUNS, 0)
+        else:
+            start = self._window_start(history, available)
+
+        if start > self.summarized:
+            # 여유분까지 함께 요약 (최근 2턴은 항상 원문 유지)
+            upto = max(start, min(start + CHAT_SUMMARY_BATCH_TURNS, len(history) - 2))
+            print(f"[DEBUG] 대화 요약 갱신 - {self.summarized}→{upto}턴")
+            self.state["summary"] = summarize_turns(
+                self.summary, history[self.summarized:upto], max_tokens=self.summary_tokens
+            )
+            self.state["upto"] = upto
+        start = max(start, self.summarized)
+
+        parts = list(header_parts)
+        if self.summary:
+            parts.append(f"이전 대화 요약:\n{self.summary}")
+        if not recent_in_session and start < len(history):
+            recent = "\n".join(format_turn(*turn) for turn in history[start:])
+            parts.append(f"최근 대화:\n{recent}")
+        parts.append(f"현재 질문: {question}")
+        context = "\n\n".join(parts)
+        print(f"[DEBUG] 채팅 컨텍스트 - 전체 {len(history)}턴 중 요약 {self.summarized}턴, "
+              f"원문 {0 if recent_in_session else len(history) - start}턴, 약 {count_tokens(context)} 토큰")
+        return context
+
+
+@st.cache_resource(show_spinner=False)
+def get_agno_storage():
+    """프로세스 공용 Agno 세션 저장소 (CHAT_AGNO_HISTORY일 때만, 없으면 None)"""
+    if not CHAT_AGNO_HISTORY:
+        return None
+    from agno.storage.sqlite import SqliteStorage
+
+    if os.path.dirname(CHAT_AGNO_STORAGE_PATH):
+        os.makedirs(os.path.dirname(CHAT_AGNO_STORAGE_PATH), exist_ok=True)
+    return SqliteStorage(table_name="team_sessions", db_file=CHAT_AGNO_STORAGE_PATH, mode="team")
+
+
+def agno_history_options() -> Dict:
+    """Team 생성 인자 - Agno 세션 기록 사용 시 저장소와 최근 실행 수"""
+    storage = get_agno_storage()
+    if storage is None:
+        return {}
+    return {"storage": storage, "add_history_to_messages": True, "num_history_runs": CHAT_AGNO_HISTORY_RUNS}
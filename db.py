@@ -0,0 +1,29 @@
+import os
+
+import streamlit as st
+from supabase import create_client, Client
+
+# 헬스체크 캐시 유지 시간(초) - 성공한 결과만 캐시됨
+DB_HEALTH_TTL = int(os.getenv("DB_HEALTH_TTL", "60"))
+
+
+@st.cache_resource(show_spinner=False)
+def get_supabase_client(url: str, key: str) -> Client:
+    """
+    (url, key) 조합당 프로세스에서 하나의 Supabase 클라이언트를 공유
+    - 세션마다 create_client를 호출하지 않으므로 HTTP 커넥션 풀도 하나만 유지됨
+    - postgrest 하위 클라이언트는 지연 생성되므로 여기서 미리 만들어 스레드 간 경합을 막음
+    """
+    client = create_client(url, key)
+    client.postgrest  # noqa: B018 - 지연 초기화 선행
+    return client
+
+
+@st.cache_data(ttl=DB_HEALTH_TTL, show_spinner=False)
+def probe_database(url: str, key: str, table: str = 'team_leads') -> bool:
+    """
+    테이블 접근 가능 여부를 확인 (TTL 동안 결과 재사용)
+    - 실패 시 예외를 그대로 올려 캐시되지 않게 함 → 다음 rerun에서 다시 확인
+    """
+    get_supabase_client(url, key).table(table).select('id').limit(1).execute()
+    return True
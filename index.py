@@ -1,29 +1,48 @@
 import streamlit as st
-import re
 import os
 import textwrap
-import streamlit_authenticator as stauth
-from supabase import create_client, Client
+from auth import get_authenticator
+from storage import STORAGE_BACKEND, get_supabase_storage, get_sqlite_storage
+from llm import get_http_client, http_pool_stats, append_current_date, PROMPT_CACHE_LAYOUT
+from team_leads import get_team_lead_repository
+from team_cache import get_team_pool, make_team_key
+from jobs import get_job_manager, follow_job, format_job_wait, JOB_ERROR, PRIORITY_MEETING
+from stream_render import MarkdownStreamRenderer
+from team_events import (
+    iter_team_events, iter_meeting_events, event_to_text, format_tool_event, TranscriptSegments,
+    LeaderContent, MemberStarted, MemberContent, MemberFinished, ToolCall, ToolResult, RunError,
+    RunMetrics, format_cache_report,
+)
 from dotenv import load_dotenv
 
 # Load environment variables from .env file (for local development)
 load_dotenv()
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
 from agno.team.team import Team
 from agno.tools.reasoning import ReasoningTools
 from typing import Iterator
-from agno.run.response import RunResponse  # 응답 객체 타입
-from agno.tools.googlesearch import GoogleSearchTools
+from llm_cache import make_team_model
+from search_cache import CachedGoogleSearchTools, search_cache_stats
 from pdf import create_pdf
+from perf_metrics import start_run, resume_run, finish_run, perf_span, observe_events, render_perf_panel
+from usage import UsageMeter, record_usage, budget_model, budget_message, render_usage_panel
+from write_queue import failed_write_count, replay_failed_writes
 from datetime import datetime
+from uuid import uuid4
+
+# "⚡ 팀장 동시 실행" 토글의 기본값 (기본 꺼짐 - 켜면 리더의 순차 위임 대신 팀장 의견을 동시에 받음)
+PARALLEL_MEMBERS_DEFAULT = os.getenv("PARALLEL_MEMBERS_DEFAULT", "false").lower() in ("1", "true", "yes", "on")
 
 
 # --- Session state defaults ---
 st.session_state.setdefault("meeting_result", "")     # 최종 결과(완료 후)
-st.session_state.setdefault("stream_buffer", "")      # 스트리밍 중 임시 버퍼
+st.session_state.setdefault("stream_buffer", [])      # 스트리밍 중 임시 버퍼 (청크 리스트)
 st.session_state.setdefault("is_streaming", False)    # 스트리밍 중 여부
 st.session_state.setdefault("confirm_reset", False)   # 초기화 확인창 노출 여부
+st.session_state.setdefault("meeting_segments", [])   # 발화자별 회의 기록 [{kind, speaker, text}]
+st.session_state.setdefault("meeting_job_id", None)   # 백그라운드 회의 작업 id (rerun 후 다시 연결)
+st.session_state.setdefault("meeting_perf", None)     # 진행 중인 회의의 응답 시간 측정 (rerun 후 이어서 기록)
+st.session_state.setdefault("meeting_stream_id", None)  # 마지막 회의의 사용량 집계 id
 st.session_state.setdefault("agent_frameworks", {})    # { lead_id: "gi"/"mda"/.../"none" }
 
 
@@ -292,7 +311,7 @@ def build_team_mode_instructions(mode: str, depth: str) -> list[str]:
 # Create team_leads table in Supabase if it doesn't exist
 def check_database_connection():
     """데이터베이스 연결 확인"""
-    if not st.session_state.supabase_client:
+    if not st.session_state.storage:
         return False
     return True
 
@@ -300,7 +319,7 @@ def insert_sample_data():
     """
     샘플 팀장 데이터를 삽입합니다.
     """
-    if not st.session_state.supabase_client:
+    if not st.session_state.storage:
         st.error("데이터베이스가 연결되지 않았습니다.")
         return
     
@@ -326,8 +345,7 @@ def insert_sample_data():
     ]
     
     try:
-        for lead in sample_leads:
-            st.session_state.supabase_client.table('team_leads').insert(lead).execute()
+        get_team_lead_repo().insert_many(sample_leads)
         st.success("샘플 데이터가 성공적으로 삽입되었습니다!")
     except Exception as e:
         st.error(f"샘플 데이터 삽입 중 오류가 발생했습니다: {str(e)}")
@@ -504,46 +522,65 @@ LABEL_TO_KEY = {
 KEY_TO_INDEX = {v: i for i, v in enumerate(LABEL_TO_KEY.keys())}  # selectbox index 계산용
 
 
-def create_team_from_leads(team_leads, selected_names, mode: str = "coordinate", depth: str = "mid"):
+TEAM_MODEL_ID = "gpt-5"
+
+
+def get_agent_frameworks() -> dict:
+    """팀장별 사고 프레임 설정 { lead_id: key } (회의 시작 시 스냅샷 우선)"""
+    return (st.session_state.get("run_config", {}).get("agent_frameworks")
+        or st.session_state.get("agent_frameworks")
+        or {})
+
+
+def create_team_from_leads(selected_names, mode: str = "coordinate", depth: str = "mid",
+                           model_id: str = TEAM_MODEL_ID):
     """
     선택된 팀장 정보로 GPT 기반 Agno Team 구성
     """
     agents = []
 
+    # 선택된 팀장 정보를 한 번에 조회 (캐시에 없는 항목만 DB에서 일괄 조회)
+    leads_by_name = get_team_leads_by_name(selected_names)
+
     # 🔽 ID로 조회해 주입
-    cfg_fw = (st.session_state.get("run_config", {}).get("agent_frameworks")
-        or st.session_state.get("agent_frameworks")
-        or {})
+    cfg_fw = get_agent_frameworks()
 
 
     for name in selected_names:
-        lead = next(l for l in team_leads if l[1] == name)
+        lead = leads_by_name.get(name)
+        if not lead:
+            continue
 
-        # lead[3] = 행동가이드(Instruction), lead[4] = 목표/Goal (사용자 DB 스키마 기준)
-        base_instructions = []
-        if lead[3]:
-            # 여러 줄이면 splitlines로 나눠도 되고, 통짜로 넣어도 됨
-            base_instructions.extend(lead[3].splitlines())
+        # personality = 행동가이드(Instruction), strategic_focus = 목표/Goal (사용자 DB 스키마 기준)
+        # 여러 줄이면 splitlines로 나눠도 되고, 통짜로 넣어도 됨
+        personality_lines = lead.personality.splitlines() if lead.personality else []
 
-        # 🔽 깊이 지시 추가
-        base_instructions.extend(build_depth_instruction(depth))
+        # 🔽 깊이 지시
+        depth_lines = build_depth_instruction(depth)
         #base_instructions.append("모든 사고 및 내용은 한국어로 작성합니다.")
-        #base_instructions.append(f"당신은 한국 패션 아웃도어 브랜드의 {lead[2]} 역할로 주어진 주제에 대해 본인의 역할 및 본인의 소속팀 관점에서만 얘기합니다.")
+        #base_instructions.append(f"당신은 한국 패션 아웃도어 브랜드의 {lead.role} 역할로 주어진 주제에 대해 본인의 역할 및 본인의 소속팀 관점에서만 얘기합니다.")
 
-        lead_id = lead[0]
+        lead_id = lead.id
+        fw_lines = []
         fw_key = cfg_fw.get(lead_id, "none")
         if fw_key != "none":
             fw_text = FRAMEWORKS_TEXT.get(fw_key, "").strip()
             if fw_text:
-                base_instructions.extend(fw_text.splitlines())
+                fw_lines = fw_text.splitlines()
+
+        # 프롬프트 캐시 배치: 공통(깊이/프레임) 지시를 앞에, 팀장별 성향은 뒤에
+        if PROMPT_CACHE_LAYOUT:
+            base_instructions = depth_lines + fw_lines + personality_lines
+        else:
+            base_instructions = personality_lines + depth_lines + fw_lines
 
         agents.append(Agent(
             name=name,
-            role=f"당신은 한국 패션 아웃도어 브랜드의 {lead[2]} 역할입니다.",
-            model=OpenAIChat(id="gpt-5"),
+            role=f"당신은 한국 패션 아웃도어 브랜드의 {lead.role} 역할입니다.",
+            model=make_team_model(model_id, http_client=get_http_client()),
             instructions=base_instructions,
-            goal=lead[4],
-            tools=[GoogleSearchTools()],
+            goal=lead.strategic_focus,
+            tools=[CachedGoogleSearchTools()],
         ))
 
     team_instructions = build_team_mode_instructions(mode, depth)
@@ -551,18 +588,79 @@ def create_team_from_leads(team_leads, selected_names, mode: str = "coordinate",
     team = Team(
         name="KS 회의팀",
         mode=mode,  
-        model=OpenAIChat(id="gpt-5"),
+        model=make_team_model(model_id, http_client=get_http_client()),
         members=agents,
         tools=[ReasoningTools(add_instructions=True)],
         instructions=team_instructions,
         markdown=True,
-        add_datetime_to_instructions=True,
+        # 캐시 배치에서는 날짜를 지침 대신 메시지 끝에 붙임 (append_current_date)
+        add_datetime_to_instructions=not PROMPT_CACHE_LAYOUT,
         show_members_responses=True,
         debug_mode=True,
     )
 
     return team
 
+def acquire_team(selected_names, mode: str = "coordinate", depth: str = "mid", model_id: str = TEAM_MODEL_ID):
+    """
+    팀 풀에서 구성된 Team을 빌려옴 (없으면 새로 구성) → (key, team)
+    - 사용 후 get_team_pool().release(key, team)으로 반납
+    """
+    leads_by_name = get_team_leads_by_name(selected_names)
+    leads = [leads_by_name[n] for n in selected_names if n in leads_by_name]
+    key = make_team_key(leads, mode, depth, get_agent_frameworks(), model_id)
+    team = get_team_pool().acquire(
+        key, lambda: create_team_from_leads(selected_names, mode=mode, depth=depth, model_id=model_id))
+    return key, team
+
+def get_agno_session_id() -> str:
+    """브라우저 세션별 Agno session_id (풀에서 재사용되는 Team의 실행 상태를 세션마다 분리)"""
+    return st.session_state.setdefault("agno_session_id", str(uuid4()))
+
+def start_meeting_job(cfg: dict, topic: str, model_id: str = TEAM_MODEL_ID):
+    """
+    회의를 백그라운드 작업으로 등록
+    - Team 준비(세션 정보 필요)는 스크립트 스레드에서, 실행과 반납은 작업 스레드에서
+    - 토큰/비용은 Agno 지표로 모아 작업이 끝나면(중단 포함) 저장
+    """
+    with perf_span("prompt"):
+        team_key, team = acquire_team(
+            cfg["selected_team_leads"],
+            mode=cfg["team_mode"],
+            depth=cfg["search_depth"],
+            model_id=model_id,
+        )
+    session_id = get_agno_session_id()
+    parallel = cfg.get("parallel_members", False)
+    message = append_current_date(topic) if PROMPT_CACHE_LAYOUT else topic
+    pool = get_team_pool()
+    timer = st.session_state.get("meeting_perf")
+    storage = st.session_state.storage
+    meter = UsageMeter("index", username or "", model_id, f"meeting:{uuid4().hex}")
+    st.session_state["meeting_stream_id"] = meter.stream_id
+
+    def release():
+        # 끝나거나 중단되어도 Team은 풀에 반납, 그때까지의 사용량 저장
+        pool.release(team_key, team)
+        record_usage(storage, meter)
+
+    job = get_job_manager().submit(
+        lambda: observe_events(meter.observe_events(
+            iter_meeting_events(team, message, session_id=session_id, parallel=parallel)), timer),
+        cleanup=release,
+        label=f"meeting:{topic[:30]}",
+        user=username or "",
+        priority=PRIORITY_MEETING,
+    )
+    st.session_state["meeting_job_id"] = job.id
+    return job
+
+def cancel_meeting_job():
+    """진행 중인 회의 작업 중단 및 세션에서 연결 해제"""
+    get_job_manager().discard(st.session_state.get("meeting_job_id"))
+    st.session_state["meeting_job_id"] = None
+    st.session_state["meeting_perf"] = None
+
 def run_team_debate(team, topic: str) -> str:
     """
     Team 객체를 기반으로 주제에 대해 토론 실행
@@ -577,28 +675,15 @@ def run_team_debate(team, topic: str) -> str:
     else:
         return str(result)  # fallback
 
-def run_team_debate_stream(team, topic: str) -> Iterator[str]:
+def run_team_debate_stream(team, topic: str, session_id: str = None) -> Iterator[str]:
     """
     Team 객체를 기반으로 주제에 대해 스트리밍 토론 실행
-    :return: 문자열 content chunk를 순차적으로 yield
+    :return: 문자열 content chunk를 순차적으로 yield (팀장 구분 제목/도구 완료 로그 포함)
     """
-    response_stream: Iterator[RunResponse] = team.run(topic, stream=True)
-    for chunk in response_stream:
-        content = chunk.content
-
-        # 기본 체크
-        if not content or not isinstance(content, str):
-            continue
-
-        # 디버깅 출력 (터미널이나 로그용)
-        #print("🔍 chunk.content:", repr(content))
-
-        # 로그 메시지 감지 (예: transfer_task_to_member(...) completed in ...)
-        if re.match(r".*\)\s+completed in \d+\.\d+s.*", content):
-            # 로그 메시지는 구분되게 마크다운 포맷으로 반환
-            yield f"\n\n`{content.strip()}`\n\n"
-        else:
-            yield content
+    for event in iter_team_events(team, topic, session_id=session_id):
+        text = event_to_text(event)
+        if text:
+            yield text
 
 
 # 페이지 제목과 아이콘 설정
@@ -610,21 +695,26 @@ if 'supabase_url' not in st.session_state:
     st.session_state.supabase_url = os.getenv('SUPABASE_URL', '')
 if 'supabase_anon_key' not in st.session_state:
     st.session_state.supabase_anon_key = os.getenv('SUPABASE_ANON_KEY', '')
-if 'supabase_client' not in st.session_state:
-    st.session_state.supabase_client = None
+if 'storage' not in st.session_state:
+    st.session_state.storage = None
 
 # 환경변수가 모두 설정되어 있으면 자동으로 연결 시도
 def init_supabase_from_env():
-    """환경변수에서 Supabase 설정을 읽어 자동 연결"""
+    """환경변수에서 Supabase 설정을 읽어 자동 연결 (STORAGE_BACKEND=sqlite면 내장 DB 사용)"""
+    if STORAGE_BACKEND == "sqlite":
+        if not st.session_state.storage:
+            st.session_state.storage = get_sqlite_storage()
+        return True
+
     url = os.getenv('SUPABASE_URL')
     key = os.getenv('SUPABASE_ANON_KEY')
 
     # print(url)
     # print(key)
     
-    if url and key and not st.session_state.supabase_client:
+    if url and key and not st.session_state.storage:
         try:
-            st.session_state.supabase_client = create_client(url, key)
+            st.session_state.storage = get_supabase_storage(url, key)
             st.session_state.supabase_url = url
             st.session_state.supabase_anon_key = key
             return True
@@ -636,27 +726,9 @@ def init_supabase_from_env():
 # 환경변수 기반 자동 연결 시도
 auto_connected = init_supabase_from_env()
 
-# Authentication setup using environment variables for streamlit-authenticator 0.1.5
-# Get credentials from environment variables (supports both local .env and Streamlit Cloud secrets)
-try:
-    # Try Streamlit Cloud secrets first, then fallback to environment variables
-    auth_username = st.secrets.get("AUTH_USERNAME", os.getenv("AUTH_USERNAME", "YOUR-ID"))
-    auth_password = st.secrets.get("AUTH_PASSWORD", os.getenv("AUTH_PASSWORD", "YOUR-PASSWORD"))
-    auth_name = st.secrets.get("AUTH_NAME", os.getenv("AUTH_NAME", "KS"))
-except Exception:
-    # Fallback to environment variables only (for local development)
-    auth_username = os.getenv("AUTH_USERNAME", "YOUR-ID")
-    auth_password = os.getenv("AUTH_PASSWORD", "YOUR-PASSWORD")
-    auth_name = os.getenv("AUTH_NAME", "YOUR-NAME")
-
-names = [auth_name]
-usernames = [auth_username]
-passwords = [auth_password]
-
-# Create authenticator with 0.1.5 API
-hashed_passwords = stauth.Hasher(passwords).generate()
-authenticator = stauth.Authenticate(names, usernames, hashed_passwords,
-    'ks_auth_cookie', 'ks_auth_key')
+# Authentication setup for streamlit-authenticator 0.1.5
+# 계정 로딩/해싱은 auth.py에서 처리 (bcrypt 해싱은 계정 세트당 1회만 수행)
+authenticator = get_authenticator()
 
 # Authentication logic - 0.1.5 version
 name, authentication_status, username = authenticator.login('KS 시뮬레이터 로그인', 'main')
@@ -671,7 +743,7 @@ elif authentication_status == None:
 # Authentication status handled in main sidebar section
 
 # Supabase connection setup
-if not st.session_state.supabase_client:
+if not st.session_state.storage:
     with st.sidebar:
         st.subheader("🔧 데이터베이스 설정")
         
@@ -714,7 +786,7 @@ if not st.session_state.supabase_client:
         if st.button("수동 연결"):
             if supabase_url and supabase_anon_key:
                 try:
-                    st.session_state.supabase_client = create_client(supabase_url, supabase_anon_key)
+                    st.session_state.storage = get_supabase_storage(supabase_url, supabase_anon_key)
                     st.session_state.supabase_url = supabase_url
                     st.session_state.supabase_anon_key = supabase_anon_key
                     
@@ -726,7 +798,7 @@ if not st.session_state.supabase_client:
             else:
                 st.error("URL과 Anon Key를 모두 입력해주세요.")
     
-    if not st.session_state.supabase_client:
+    if not st.session_state.storage:
         st.warning("데이터베이스 설정을 완료해주세요.")
         st.stop()
 
@@ -734,34 +806,43 @@ if not st.session_state.supabase_client:
 
 
 
+# 팀장 정보 저장소 (프로세스 공용 캐시, 쓰기 시 자동 무효화)
+def get_team_lead_repo():
+    return get_team_lead_repository(st.session_state.storage, st.session_state.storage.location)
+
 # Supabase에서 팀장 정보 가져오기
 def get_team_leads():
-    if not st.session_state.supabase_client:
+    if not st.session_state.storage:
         return []
     
     try:
-        response = st.session_state.supabase_client.table('team_leads').select('*').execute()
-        # Convert to list of tuples to match the original SQLite format
-        return [(row['id'], row['name'], row['role'], row['personality'], row['strategic_focus']) for row in response.data]
+        return get_team_lead_repo().all()
     except Exception as e:
         st.error(f"데이터 조회 중 오류가 발생했습니다: {str(e)}")
         return []
 
+def get_team_leads_by_name(names) -> dict:
+    """이름 목록으로 팀장 정보 조회 → {이름: TeamLead}"""
+    if not st.session_state.storage:
+        return {}
+
+    try:
+        with perf_span("db"):
+            return get_team_lead_repo().get_many_by_name(names)
+    except Exception as e:
+        st.error(f"데이터 조회 중 오류가 발생했습니다: {str(e)}")
+        return {}
+
 def update_team_lead(id: int, name: str, role: str, personality: str, strategic_focus: str):
     """
     팀장의 ID에 해당하는 이름, 역할, 성향, 전략 포커스를 업데이트합니다.
     """
-    if not st.session_state.supabase_client:
+    if not st.session_state.storage:
         st.error("데이터베이스가 연결되지 않았습니다.")
         return
     
     try:
-        st.session_state.supabase_client.table('team_leads').update({
-            'name': name,
-            'role': role,
-            'personality': personality,
-            'strategic_focus': strategic_focus
-        }).eq('id', id).execute()
+        get_team_lead_repo().update(id, name, role, personality, strategic_focus)
     except Exception as e:
         st.error(f"데이터 업데이트 중 오류가 발생했습니다: {str(e)}")
 
@@ -793,9 +874,9 @@ with st.sidebar:
 
     st.subheader("회의 참석자 선택")
     for lead in team_leads:
-        name = lead[1]
+        name = lead.name
         default_checked = name in st.session_state.selection_order
-        checked = st.checkbox(f"{name} ({lead[2]})", value=default_checked, key=f"check_{name}")
+        checked = st.checkbox(f"{name} ({lead.role})", value=default_checked, key=f"check_{name}")
         
         # 이전 상태가 없다면 초기화
         prev = st.session_state.previous_checked.get(name, None)
@@ -842,6 +923,15 @@ with st.sidebar:
     }
     team_mode = MODE_MAP[mode_label]
     
+    # 팀장 1차 의견을 동시에 받은 뒤 리더가 종합 (순차 위임보다 빠름)
+    parallel_members = st.toggle(
+        "⚡ 팀장 동시 실행",
+        value=PARALLEL_MEMBERS_DEFAULT,
+        help="팀장들의 1차 의견을 동시에 받습니다. 개인의견 취합은 리더가 바로 종합하며 팀장별 세부 과업 배분은 생략되고, "
+             "상호토론은 첫 입장 발표만 동시에 받은 뒤 반박 라운드와 공동 결론을 이어서 진행합니다. "
+             "끄면 리더가 팀장에게 순서대로 위임합니다.",
+    )
+    
     # ==================== 하단 섹션 ====================
     st.markdown("---")
     
@@ -854,15 +944,33 @@ with st.sidebar:
         st.warning("⚠️ OpenAI API Key가 설정되지 않았습니다")
     
     # 데이터베이스 연결 상태
-    if st.session_state.supabase_client:
-        st.success("✅ 데이터베이스 연결됨")
+    if st.session_state.storage:
+        st.success(f"✅ 데이터베이스 연결됨 ({st.session_state.storage.backend})")
         if st.button("샘플 데이터 삽입", key="sample_data_main"):
             insert_sample_data()
+        # 재시도 후에도 저장하지 못한 대화/사용량 (WRITE_FAILED_PATH)
+        failed_writes = failed_write_count()
+        if failed_writes:
+            st.warning(f"⚠️ 저장하지 못한 행 {failed_writes}건")
+            if st.button("실패한 저장 다시 쓰기", key="replay_failed_writes"):
+                try:
+                    written, remaining = replay_failed_writes(st.session_state.storage)
+                    st.success(f"✅ {written}건 저장, {remaining}건 남음")
+                except Exception as e:
+                    st.error(f"실패한 저장 다시 쓰기 중 오류: {str(e)}")
         if st.button("데이터베이스 연결 해제", key="disconnect_main"):
-            st.session_state.supabase_client = None
+            st.session_state.storage = None
             st.rerun()
     else:
         st.error("❌ 데이터베이스 연결 안됨")
+    
+    # 최근 회의 응답 시간 분석 (p50/p95)
+    render_perf_panel("index")
+    
+    # 토큰/비용 (이번 기간 한도, 마지막 회의의 팀장별/사용자별 집계)
+    if st.session_state.storage:
+        render_usage_panel(st.session_state.storage, username or "",
+                           stream_id=st.session_state.get("meeting_stream_id"))
 
 
 # 우측 채팅 인터페이스 구성
@@ -889,15 +997,16 @@ if selected_team_leads:
                 if st.session_state.visible_settings_lead == name:
                     st.session_state.visible_settings_lead = None
                 else:
-                    lead = next(l for l in team_leads if l[1] == name)
-                    st.session_state.selected_lead = {
-                        "id": lead[0],
-                        "name": name,
-                        "role": lead[2],
-                        "personality": lead[3],
-                        "strategic_focus": lead[4],
-                    }
-                    st.session_state.visible_settings_lead = name
+                    lead = get_team_leads_by_name([name]).get(name)
+                    if lead:
+                        st.session_state.selected_lead = {
+                            "id": lead.id,
+                            "name": name,
+                            "role": lead.role,
+                            "personality": lead.personality,
+                            "strategic_focus": lead.strategic_focus,
+                        }
+                        st.session_state.visible_settings_lead = name
 
     # ⚙️ 설정 폼은 회의 중엔 아예 렌더하지 않음
     if (
@@ -959,17 +1068,18 @@ if st.button("회의 시작", disabled=start_disabled):
     if st.session_state.get("meeting_result") or st.session_state.get("stream_buffer"):
         st.session_state["confirm_reset"] = True
     else:
-        st.session_state.setdefault("stream_id", 0)
-        st.session_state["stream_id"] += 1
+        cancel_meeting_job()
         st.session_state["topic"] = topic
         st.session_state["run_config"] = {
             "team_mode": team_mode,
             "search_depth": search_depth,
             "selected_team_leads": selected_team_leads[:],
+            "parallel_members": parallel_members,
              "agent_frameworks": st.session_state["agent_frameworks"].copy(),  # ← 스냅샷
         }
         st.session_state["meeting_result"] = ""
-        st.session_state["stream_buffer"] = ""
+        st.session_state["meeting_segments"] = []
+        st.session_state["stream_buffer"] = []
         st.session_state["is_streaming"] = True
         st.session_state["confirm_reset"] = False
         st.rerun()
@@ -979,17 +1089,18 @@ if st.session_state.get("confirm_reset", False):
     c1, c2 = st.columns(2)
     with c1:
         if st.button("계속 진행"):
-            st.session_state.setdefault("stream_id", 0)
-            st.session_state["stream_id"] += 1
+            cancel_meeting_job()
             st.session_state["topic"] = topic
             st.session_state["run_config"] = {
                 "team_mode": team_mode,
                 "search_depth": search_depth,
                 "selected_team_leads": selected_team_leads[:],
+                "parallel_members": parallel_members,
                 "agent_frameworks": st.session_state["agent_frameworks"].copy(), 
             }
             st.session_state["meeting_result"] = ""
-            st.session_state["stream_buffer"] = ""
+            st.session_state["meeting_segments"] = []
+            st.session_state["stream_buffer"] = []
             st.session_state["is_streaming"] = True
             st.session_state["confirm_reset"] = False
             st.rerun()
@@ -1003,6 +1114,8 @@ if st.session_state.get("confirm_reset", False):
 debate_container = st.container()
 with debate_container:
     banner_placeholder = st.empty()   # ↑ 먼저: 배너 자리 (화면 위)
+    members_area = st.container()     # 팀장별 의견 (스트리밍 중)
+    tools_area = st.container()       # 도구 호출 로그 (스트리밍 중)
     result_placeholder = st.empty()   # ↓ 다음: 결과 자리 (배너 아래)
 
 
@@ -1016,36 +1129,93 @@ if st.session_state.get("is_streaming", False):
     _topic = st.session_state["topic"]
     
     # 1) 배너는 '회의 시작' 버튼 바로 아래 자리(banner_placeholder)에만 한 번 출력
-    banner_placeholder.markdown(
-        f"팀 모드: **{cfg['team_mode']}**, 탐색 깊이: **{cfg['search_depth']}**  🧠 팀 토론을 시작합니다..."
-    )
-
-    team = create_team_from_leads(
-        team_leads,
-        cfg["selected_team_leads"],
-        mode=cfg["team_mode"],
-        depth=cfg["search_depth"],
-    )
-
-    current_id = st.session_state["stream_id"]
-    full = ""
-    try:
-        for chunk in run_team_debate_stream(team, _topic):
-            if current_id != st.session_state.get("stream_id"):
-                break  # 다른 시작 감지 → 오래된 루프 중단
-            full += chunk
-            st.session_state["stream_buffer"] = full
-            result_placeholder.markdown(full + "▌")
-
-        if current_id == st.session_state.get("stream_id"):
-            st.session_state["meeting_result"] = full
-            st.session_state["stream_buffer"] = ""
+    parallel_label = " (⚡ 팀장 동시 실행)" if cfg.get("parallel_members") else ""
+    banner = f"팀 모드: **{cfg['team_mode']}**{parallel_label}, 탐색 깊이: **{cfg['search_depth']}**  🧠 팀 토론을 시작합니다..."
+    banner_placeholder.markdown(banner)
+
+    # 2) 회의는 백그라운드 작업으로 실행 (rerun되어도 계속 진행, 다시 그릴 때는 버퍼를 처음부터 재생)
+    jobs = get_job_manager()
+    job = jobs.get(st.session_state.get("meeting_job_id"))
+    if job is None:
+        # 사용 한도 확인 (초과 시 막거나 낮은 모델로)
+        model_id = budget_model(st.session_state.storage, username or "", TEAM_MODEL_ID)
+        if model_id is None:
             st.session_state["is_streaming"] = False
-            result_placeholder.markdown(full)
-            st.success("회의가 종료되었습니다.")
-    except Exception as e:
-        st.session_state["is_streaming"] = False
-        st.error(f"오류 발생: {e}")
+            st.error(budget_message(username or ""))
+            st.stop()
+        if model_id != TEAM_MODEL_ID:
+            st.warning(f"사용 한도를 넘어 {model_id} 모델로 진행합니다.")
+        # 응답 시간 측정 (팀 구성/팀장별 TTFT·토큰 속도/도구/표시) - rerun 후에도 같은 측정을 이어감
+        st.session_state["meeting_perf"] = start_run("index", "meeting", user=username or "", label=_topic[:30])
+        job = start_meeting_job(cfg, _topic, model_id=model_id)
+    else:
+        resume_run(st.session_state.get("meeting_perf"))
+
+    # 완성된 블록은 고정하고 작성 중인 블록만 일정 간격으로 다시 그림
+    renderer = MarkdownStreamRenderer(result_placeholder.container())
+    tool_log = MarkdownStreamRenderer(tools_area.expander("🔧 도구 호출 로그", expanded=False), cursor="")
+    member_renderers = {}
+    transcript = TranscriptSegments()
+    st.session_state["stream_buffer"] = renderer.chunks
+
+    def on_idle(job):
+        # 새 이벤트를 기다리는 사이 밀린 내용과 대기열/경과 시간 표시
+        # (st 호출 시점에 rerun 요청이 있으면 이 루프만 중단되고 작업은 계속 진행됨)
+        with perf_span("render"):
+            for pending in [renderer, tool_log, *member_renderers.values()]:
+                if pending.has_pending:
+                    pending.flush()
+            banner_placeholder.markdown(f"{banner}  {format_job_wait(jobs, job)}")
+
+    # 이벤트 종류별로 각자의 영역에 표시 (리더 발화 → 결과, 팀장 발화 → 팀장별 패널, 도구 → 로그)
+    for event in follow_job(job, on_idle):
+        transcript.add(event)
+
+        with perf_span("render"):
+            if isinstance(event, LeaderContent):
+                renderer.write(event.text)
+            elif isinstance(event, (MemberStarted, MemberContent)):
+                member_renderer = member_renderers.get(event.member)
+                if member_renderer is None:
+                    member_renderer = MarkdownStreamRenderer(
+                        members_area.expander(f"🧑‍💼 {event.member}", expanded=True))
+                    member_renderers[event.member] = member_renderer
+                if isinstance(event, MemberContent):
+                    member_renderer.write(event.text)
+            elif isinstance(event, MemberFinished):
+                if event.member in member_renderers:
+                    member_renderers[event.member].finish()
+            elif isinstance(event, (ToolCall, ToolResult)):
+                tool_log.write(format_tool_event(event) + "\n\n")
+            elif isinstance(event, RunError):
+                st.error(f"오류 발생: {event.message}")
+            elif isinstance(event, RunMetrics):
+                cache_report = format_cache_report(event)
+                if cache_report:
+                    print(f"[DEBUG] 프롬프트 캐시 (캐시/입력 토큰): {cache_report}")
+                    st.caption(f"🧮 프롬프트 캐시 적중 (캐시/입력 토큰): {cache_report}")
+
+    with perf_span("render"):
+        renderer.finish()
+        tool_log.finish()
+        for member_renderer in member_renderers.values():
+            member_renderer.finish()
+    finish_run(st.session_state.get("meeting_perf"))
+    st.session_state["meeting_perf"] = None
+    st.session_state["stream_buffer"] = []
+    st.session_state["is_streaming"] = False
+    jobs.discard(job.id)
+    st.session_state["meeting_job_id"] = None
+    print(f"[DEBUG] OpenAI HTTP 풀: {http_pool_stats()}")
+    print(f"[DEBUG] 검색 캐시: {search_cache_stats()}")
+
+    if job.status == JOB_ERROR:
+        st.error(f"오류 발생: {job.error}")
+    else:
+        full = transcript.to_markdown()
+        st.session_state["meeting_result"] = full
+        st.session_state["meeting_segments"] = transcript.segments
+        st.success("회의가 종료되었습니다.")
 
 
 if st.session_state["meeting_result"]:
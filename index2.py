@@ -1,12 +1,25 @@
 import streamlit as st
-import openai
 import json
 from datetime import datetime
 import os
-from typing import List, Tuple
+from typing import List, Optional, Tuple, Generator
 from dotenv import load_dotenv
-import streamlit_authenticator as stauth
-from supabase import create_client, Client
+from auth import get_authenticator
+from stream_render import MarkdownStreamRenderer
+from llm import (
+    ChatCompletionResult, stream_chat_completion, consume_chat_stream,
+    get_openai_api_key, get_openai_client, PROMPT_CACHE_LAYOUT,
+)
+from talk_archive import get_talk_archiver, get_summary_digest
+from talk_seq import allocate_talk_seq
+from write_queue import insert_rows, flush_pending_writes
+from transcript_store import get_transcript_store
+from llm_cache import get_completion_cache
+from storage import STORAGE_BACKEND, get_supabase_storage, get_sqlite_storage
+from perf_metrics import (
+    start_run, finish_run, perf_span, TimedWriter, record_completion, render_perf_panel,
+)
+from usage import UsageMeter, record_usage, budget_model, budget_message, render_usage_panel
 
 # 환경 변수 로드
 load_dotenv()
@@ -19,18 +32,23 @@ if 'supabase_url' not in st.session_state:
     st.session_state.supabase_url = os.getenv('SUPABASE_URL', '')
 if 'supabase_anon_key' not in st.session_state:
     st.session_state.supabase_anon_key = os.getenv('SUPABASE_ANON_KEY', '')
-if 'supabase_client' not in st.session_state:
-    st.session_state.supabase_client = None
+if 'storage' not in st.session_state:
+    st.session_state.storage = None
 
 # 환경변수 기반 자동 연결 시도
 def init_supabase_from_env():
-    """환경변수에서 Supabase 설정을 읽어 자동 연결"""
+    """환경변수에서 Supabase 설정을 읽어 자동 연결 (STORAGE_BACKEND=sqlite면 내장 DB 사용)"""
+    if STORAGE_BACKEND == "sqlite":
+        if not st.session_state.storage:
+            st.session_state.storage = get_sqlite_storage()
+        return True
+
     url = os.getenv('SUPABASE_URL')
     key = os.getenv('SUPABASE_ANON_KEY')
     
-    if url and key and not st.session_state.supabase_client:
+    if url and key and not st.session_state.storage:
         try:
-            st.session_state.supabase_client = create_client(url, key)
+            st.session_state.storage = get_supabase_storage(url, key)
             st.session_state.supabase_url = url
             st.session_state.supabase_anon_key = key
             return True
@@ -42,27 +60,9 @@ def init_supabase_from_env():
 # 환경변수 기반 자동 연결 시도
 auto_connected = init_supabase_from_env()
 
-# Authentication setup using environment variables for streamlit-authenticator 0.1.5
-# Get credentials from environment variables (supports both local .env and Streamlit Cloud secrets)
-try:
-    # Try Streamlit Cloud secrets first, then fallback to environment variables
-    auth_username = st.secrets.get("AUTH_USERNAME", os.getenv("AUTH_USERNAME", "YOUR-ID"))
-    auth_password = st.secrets.get("AUTH_PASSWORD", os.getenv("AUTH_PASSWORD", "YOUR-PASSWORD"))
-    auth_name = st.secrets.get("AUTH_NAME", os.getenv("AUTH_NAME", "KS"))
-except Exception:
-    # Fallback to environment variables only (for local development)
-    auth_username = os.getenv("AUTH_USERNAME", "YOUR-ID")
-    auth_password = os.getenv("AUTH_PASSWORD", "YOUR-PASSWORD")
-    auth_name = os.getenv("AUTH_NAME", "YOUR-NAME")
-
-names = [auth_name]
-usernames = [auth_username]
-passwords = [auth_password]
-
-# Create authenticator with 0.1.5 API
-hashed_passwords = stauth.Hasher(passwords).generate()
-authenticator = stauth.Authenticate(names, usernames, hashed_passwords,
-    'ks_auth_cookie', 'ks_auth_key')
+# Authentication setup for streamlit-authenticator 0.1.5
+# 계정 로딩/해싱은 auth.py에서 처리 (bcrypt 해싱은 계정 세트당 1회만 수행)
+authenticator = get_authenticator()
 
 # Authentication logic - 0.1.5 version
 name, authentication_status, username = authenticator.login('KS 시뮬레이터 로그인', 'main')
@@ -77,7 +77,7 @@ elif authentication_status == None:
 # Authentication status handled in main sidebar section
 
 # Supabase connection setup
-if not st.session_state.supabase_client:
+if not st.session_state.storage:
     with st.sidebar:
         st.subheader("🔧 데이터베이스 설정")
         
@@ -120,7 +120,7 @@ if not st.session_state.supabase_client:
         if st.button("수동 연결"):
             if supabase_url and supabase_anon_key:
                 try:
-                    st.session_state.supabase_client = create_client(supabase_url, supabase_anon_key)
+                    st.session_state.storage = get_supabase_storage(supabase_url, supabase_anon_key)
                     st.session_state.supabase_url = supabase_url
                     st.session_state.supabase_anon_key = supabase_anon_key
                     
@@ -131,16 +131,16 @@ if not st.session_state.supabase_client:
             else:
                 st.error("URL과 Anon Key를 모두 입력해주세요.")
     
-    if not st.session_state.supabase_client:
+    if not st.session_state.storage:
         st.warning("데이터베이스 설정을 완료해주세요.")
         st.stop()
 
 # 연결된 경우 사이드바에 상태 표시
-# if st.session_state.supabase_client:
+# if st.session_state.storage:
 #     with st.sidebar:
 #         st.success("✅ 데이터베이스 연결됨")
 #         if st.button("연결 해제"):
-#             st.session_state.supabase_client = None
+#             st.session_state.storage = None
 #             st.rerun()
 
 # Session state 초기화
@@ -170,169 +170,136 @@ if 'is_chat_started' not in st.session_state:
 # Supabase table creation info
 def init_database():
     """데이터베이스 초기화 - 연결 확인만"""
-    if not st.session_state.supabase_client:
+    if not st.session_state.storage:
         return
 
 def get_last_subject_seq(name: str) -> int:
     """해당 이름의 마지막 subject_seq 반환"""
-    if not st.session_state.supabase_client:
+    if not st.session_state.storage:
         return 0
     
     try:
-        response = st.session_state.supabase_client.table('talk_latest')\
-            .select('subject_seq')\
-            .eq('name', name)\
-            .order('subject_seq', desc=True)\
-            .limit(1)\
-            .execute()
-        
-        if response.data:
-            return response.data[0]['subject_seq']
-        return 0
+        return st.session_state.storage.last_subject_seq('talk_latest', name=name)
     except Exception as e:
         st.error(f"subject_seq 조회 중 오류: {str(e)}")
         return 0
 
-def save_conversation(name: str, subject_seq: int, talk_seq: int, from_to: str, content: str):
-    """대화 내용을 데이터베이스에 저장"""
-    if not st.session_state.supabase_client:
+def save_turn(name: str, subject_seq: int, question: str, answer: Optional[str] = None):
+    """
+    한 턴(질문 + 답변)을 한 번의 insert로 저장
+    - talk_seq는 턴에 필요한 개수만큼 한 번에 발급 (allocate_talk_seq)
+    """
+    if not st.session_state.storage:
         st.error("데이터베이스가 연결되지 않았습니다.")
         return
     
     try:
-        st.session_state.supabase_client.table('talk_latest').insert({
-            'name': name,
-            'subject_seq': subject_seq,
-            'talk_seq': talk_seq,
-            'from_to': from_to,
-            'talk_history': content
-        }).execute()
+        turns = [('Q', question)] + ([('A', answer)] if answer is not None else [])
+        first_seq = allocate_talk_seq(
+            st.session_state.storage, 'talk_latest', subject_seq, len(turns),
+            name=name, read_next=lambda: get_next_talk_seq(name, subject_seq)
+        )
+        print(f"[DEBUG] 대화 저장 - talk_seq {first_seq}~{first_seq + len(turns) - 1}")
+        # 백그라운드에서 모아 저장 (응답 시간에 DB 쓰기 지연이 더해지지 않음)
+        insert_rows(st.session_state.storage, 'talk_latest', [
+            {
+                'name': name,
+                'subject_seq': subject_seq,
+                'talk_seq': first_seq + i,
+                'from_to': from_to,
+                'talk_history': content
+            }
+            for i, (from_to, content) in enumerate(turns)
+        ])
+        # 대화 사본에도 바로 추가 (다음 턴에 DB를 다시 읽지 않음)
+        get_transcript_store().append(
+            ('talk_latest', name, subject_seq),
+            [(first_seq + i, from_to, content) for i, (from_to, content) in enumerate(turns)]
+        )
     except Exception as e:
         st.error(f"대화 저장 중 오류: {str(e)}")
 
-def get_conversation_history(name: str, subject_seq: int, limit: int = 20) -> List[Tuple]:
-    """최근 대화 내역 가져오기 (최대 20건)"""
-    if not st.session_state.supabase_client:
-        return []
+def load_transcript(name: str, subject_seq: int) -> Optional[Tuple[List[Tuple[int, str, str]], Optional[str]]]:
+    """
+    DB에서 대화 전체 읽기 → ([(talk_seq, from_to, 내용)], talk_old 요약) (대화 사본을 처음 만들 때만)
+    - 읽지 못하면 None (빈 이력으로 사본에 남기지 않고 다음에 다시 읽음)
+    """
+    if not st.session_state.storage:
+        return None
     
     try:
-        # talk_latest에서 최근 20건
-        latest_response = st.session_state.supabase_client.table('talk_latest')\
-            .select('from_to, talk_history')\
-            .eq('name', name)\
-            .eq('subject_seq', subject_seq)\
-            .order('talk_seq', desc=True)\
-            .limit(limit)\
-            .execute()
-        
-        latest_conversations = [(row['from_to'], row['talk_history']) for row in latest_response.data]
-        
-        # talk_old에서 요약된 내용 가져오기
-        old_response = st.session_state.supabase_client.table('talk_old')\
-            .select('talk_history')\
-            .eq('name', name)\
-            .eq('subject_seq', subject_seq)\
-            .order('id', desc=True)\
-            .limit(1)\
-            .execute()
-        
-        # 결과 조합 (시간순 정렬)
-        history = []
-        if old_response.data:
-            history.append(('SUMMARY', old_response.data[0]['talk_history']))
-        
-        # 최신순으로 가져온 것을 시간순으로 뒤집기
-        for from_to, content in reversed(latest_conversations):
-            history.append((from_to, content))
-        
-        return history
+        with perf_span("db"):
+            # 대기 중인 저장이 있으면 먼저 반영
+            flush_pending_writes()
+            
+            # talk_latest 전체 (보관 기준 건수 이하로 유지됨)
+            rows = st.session_state.storage.talk_rows('talk_latest', subject_seq, name=name)
+            
+            turns = [(row['talk_seq'], row['from_to'], row['talk_history']) for row in rows]
+            
+            # talk_old 단계별 요약을 합친 프롬프트용 요약 (크기 제한)
+            digest = get_summary_digest(st.session_state.storage, name, subject_seq)
+        return turns, digest
     except Exception as e:
         st.error(f"대화 이력 조회 중 오류: {str(e)}")
-        return []
+        return None
+
+def history_fragment(from_to: str, content: str) -> str:
+    """프롬프트 <history>에 넣을 턴 하나 (XML 이스케이프, 대화 사본에 미리 만들어 둠)"""
+    role = "user" if from_to == 'Q' else "assistant"
+    # XML 안전을 위해 기본적인 치환(필요시 더 강화 가능)
+    safe = content.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return f'<turn role="{role}">{safe}</turn>'
+
+def get_transcript(name: str, subject_seq: int):
+    """대화 사본 (처음 한 번만 DB에서 읽고, 이후에는 저장할 때마다 이어 붙인 메모리 사본)"""
+    return get_transcript_store().get(
+        ('talk_latest', name, subject_seq),
+        lambda: load_transcript(name, subject_seq),
+        render=history_fragment
+    )
 
 def get_next_talk_seq(name: str, subject_seq: int) -> int:
-    """다음 talk_seq 값 계산"""
-    if not st.session_state.supabase_client:
+    """다음 talk_seq 값 계산 (서버 발급을 못 쓸 때 처음 한 번만 사용)"""
+    if not st.session_state.storage:
         return 1
     
+    # 대기 중인 저장이 있으면 먼저 반영
+    flush_pending_writes()
+    
     try:
-        response = st.session_state.supabase_client.table('talk_latest')\
-            .select('talk_seq')\
-            .eq('name', name)\
-            .eq('subject_seq', subject_seq)\
-            .order('talk_seq', desc=True)\
-            .limit(1)\
-            .execute()
-        
-        if response.data:
-            return response.data[0]['talk_seq'] + 1
-        return 1
+        return st.session_state.storage.last_talk_seq('talk_latest', subject_seq, name=name) + 1
     except Exception as e:
         st.error(f"talk_seq 계산 중 오류: {str(e)}")
         return 1
 
-def should_summarize_conversations(name: str, subject_seq: int) -> bool:
-    """대화가 40개 이상인지 확인"""
-    if not st.session_state.supabase_client:
-        return False
-    
-    try:
-        response = st.session_state.supabase_client.table('talk_latest')\
-            .select('id')\
-            .eq('name', name)\
-            .eq('subject_seq', subject_seq)\
-            .execute()
-        
-        return len(response.data) >= 40
-    except Exception as e:
-        st.error(f"대화 개수 확인 중 오류: {str(e)}")
-        return False
-
 def summarize_and_archive_conversations(name: str, subject_seq: int):
-    """처음 20건의 대화를 요약해서 talk_old에 저장하고 talk_latest에서 삭제"""
-    if 'supabase_client' not in st.session_state:
-        st.error("데이터베이스에 연결되지 않았습니다.")
+    """
+    대화가 TALK_SUMMARIZE_THRESHOLD건 이상 쌓였으면 오래된 대화를 요약해 talk_old로 옮김
+    - 개수 확인/LLM 요약/삭제는 모두 백그라운드에서 실행 (응답 경로에서 기다리지 않음)
+    """
+    if not st.session_state.storage:
         return
     
-    try:
-        # 처음 20건 가져오기 (talk_seq 오름차순)
-        response = st.session_state.supabase_client.table('talk_latest')\
-            .select('id, from_to, talk_history')\
-            .eq('name', name)\
-            .eq('subject_seq', subject_seq)\
-            .order('talk_seq', desc=False)\
-            .limit(20)\
-            .execute()
-        
-        conversations = response.data
-        
-        if conversations:
-            # GPT를 사용해서 요약
-            summary_text = "이전 대화 요약:\n"
-            for conv in conversations:
-                summary_text += f"{conv['from_to']}: {conv['talk_history']}\n"
-            
-            # TODO: 실제로는 GPT API를 호출해서 요약해야 함
-            # 현재는 단순히 텍스트 연결
-            
-            # talk_old에 요약 저장
-            st.session_state.supabase_client.table('talk_old').insert({
-                'name': name,
-                'subject_seq': subject_seq,
-                'talk_history': summary_text
-            }).execute()
-            
-            # talk_latest에서 처음 20건 삭제
-            ids_to_delete = [conv['id'] for conv in conversations]
-            for conv_id in ids_to_delete:
-                st.session_state.supabase_client.table('talk_latest')\
-                    .delete()\
-                    .eq('id', conv_id)\
-                    .execute()
-            
-    except Exception as e:
-        st.error(f"대화 요약 및 아카이브 중 오류 발생: {str(e)}")
+    api_key = get_openai_api_key()
+    if not api_key:
+        # 요약 없이 원문을 지우지 않도록 보관하지 않음
+        print("[DEBUG] OpenAI API 키가 없어 대화 보관을 건너뜀")
         return
+    
+    # 보관이 끝나면 요약이 바뀌므로 대화 사본을 다시 읽게 함
+    store = get_transcript_store()
+    scheduled = get_talk_archiver().schedule(
+        st.session_state.storage,
+        get_openai_client(api_key),
+        name,
+        subject_seq,
+        on_done=lambda: store.invalidate(('talk_latest', name, subject_seq))
+    )
+    print(f"[DEBUG] 대화 보관 예약 - {name}/{subject_seq}: {'등록' if scheduled else '이미 진행 중'}")
+
+# 프롬프트에 원문으로 넣는 최근 대화 수 (그 이전은 talk_old 요약으로)
+HISTORY_TURNS = 20
 
 def create_gpt_prompt(
     user_name: str,
@@ -342,7 +309,14 @@ def create_gpt_prompt(
     report_content: str,
     user_input: str
 ) -> str:
-    """GPT용 프롬프트 생성 (XML 태그 구조 + 페르소나/가이드 분리 + STAGE 추론 지시)"""
+    """
+    GPT용 프롬프트 생성 (XML 태그 구조 + 페르소나/가이드 분리 + STAGE 추론 지시)
+    - PROMPT_CACHE_LAYOUT이면 고정 블록(페르소나/가이드/지시)을 앞에, 보고 내용/이력/이름/입력을 뒤에 배치
+      → 사용자·대화가 바뀌어도 앞부분이 같아 OpenAI 프롬프트 캐시가 적중함
+    """
+
+    # 캐시 배치에서는 고정 블록에 이름을 넣지 않고 <user_name> 값으로 부르게 함
+    name_ref = "{이름}" if PROMPT_CACHE_LAYOUT else user_name
 
     # 1) 페르소나(정체성/톤) - '무엇처럼 말할지'만 기술
     persona_context = f"""
@@ -352,7 +326,7 @@ def create_gpt_prompt(
     <language>한국어(존칭, 간결·명료)</language>
   </identity>
   <tone_and_manners>
-    <call_by_name>모든 팀원을 "{user_name}님"으로 호명</call_by_name>
+    <call_by_name>모든 팀원을 "{name_ref}님"으로 호명</call_by_name>
     <no_praise>칭찬 금지(좋다/훌륭/탁월 등 금지)</no_praise>
     <teacher_mode>지식을 전수하는 스승의 태도(우월감은 은연중, 노골적 표현 금지)</teacher_mode>
     <indirect_pointing>직접 지적 금지, "예를들어" 사례/반문으로 자가점검 유도</indirect_pointing>
@@ -387,7 +361,7 @@ def create_gpt_prompt(
 
   <stage_0_preamble>
     첫 턴인 경우 1문장만:
-    "{user_name}님, 오늘 안건은 OOO죠. 예를들어, 우리가 지금 선택하면 다음 분기에 어떤 변화가 발생할지부터 가정해 보겠습니다."
+    "{name_ref}님, 오늘 안건은 OOO죠. 예를들어, 우리가 지금 선택하면 다음 분기에 어떤 변화가 발생할지부터 가정해 보겠습니다."
     그 후 즉시 STAGE 1로.
   </stage_0_preamble>
 
@@ -396,7 +370,7 @@ def create_gpt_prompt(
     출력: 2~3문 선별(아래 예시는 참조용이고 실제 보고 context_subject 내용에 맞는 추가 질문을 해야되는데 처음에는 일반적으로, 구체적 자료 기반에 관련한 질문으로 시작), 
     만약 보고 내용이 더 내용을 파악하기에 부족한 경우, 어떤 부분을 조금 더 설명해줘야될지 구체적으로 문의.
     예시:
-      - "{user_name}님, 이거는 어떤 자료를 참고하고 만드신건가요?"
+      - "{name_ref}님, 이거는 어떤 자료를 참고하고 만드신건가요?"
       - "현재 작성된 내용은 다른팀과 협의 후 작성된 내용이 맞으실까요?"
       - "이 내용의 OOO부분은 어떻게 생각하신걸까요?"
   </stage_1_explore>
@@ -435,21 +409,15 @@ def create_gpt_prompt(
 </dialogue_guide>
 """.strip()
 
-    # 3) 이전 대화 내역을 AI가 파싱하기 쉬운 XML로 구성
-    history = get_conversation_history(user_name, subject_seq)
+    # 3) 이전 대화 내역을 AI가 파싱하기 쉬운 XML로 구성 (대화 사본의 미리 만든 조각, DB 조회 없음)
+    transcript = get_transcript(user_name, subject_seq)
     history_items = []
     # talk_old 요약이 있으면 먼저
-    if history and history[0][0] == 'SUMMARY':
-        history_items.append(f"<summary>{history[0][1]}</summary>")
-
-    # 그 외 턴들(시간순)
-    for from_to, content in history:
-        if from_to == 'SUMMARY':
-            continue
-        role = "user" if from_to == 'Q' else "assistant"
-        # XML 안전을 위해 기본적인 치환(필요시 더 강화 가능)
-        safe = content.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-        history_items.append(f'<turn role="{role}">{safe}</turn>')
+    if transcript.summary:
+        history_items.append(f"<summary>{transcript.summary}</summary>")
+
+    # 그 외 최근 턴들(시간순, 최대 HISTORY_TURNS건)
+    history_items.extend(transcript.recent_fragments(HISTORY_TURNS))
 
     history_xml = "<history>\n  " + "\n  ".join(history_items) + "\n</history>"
 
@@ -466,25 +434,39 @@ def create_gpt_prompt(
     current_input_xml = f"<current_input>{user_input}</current_input>"
 
     # 5) 최종 지시(출력 형식 고정)
-    final_instructions = """
+    user_name_xml = f"<user_name>{user_name}</user_name>"
+    name_rule = '\n  - 지시와 예시의 "{이름}"은 <user_name>의 값으로 바꿔 부르십시오.' if PROMPT_CACHE_LAYOUT else ""
+    final_instructions = f"""
 <instructions>
-  - 위 <history>와 <current_input>를 근거로 현재 STAGE를 스스로 추론하고, 해당 단계의 질문만 출력하세요.
+  - {"아래" if PROMPT_CACHE_LAYOUT else "위"} <history>와 <current_input>를 근거로 현재 STAGE를 스스로 추론하고, 해당 단계의 질문만 출력하세요.
   - 한 번에 한 단계만 진행하십시오. 충분하면 다음 단계로, 불충분하면 같은 단계에서 1회 보강 질문 후 대기하십시오.
   - 페르소나를 준수하여 본부장 어투로만 말하고, 어떤 XML 태그도 그대로 반복 출력하지 마십시오.
   - 각 응답의 마지막 줄에는 정확히 "--- 응답 대기 ---"만 출력하십시오, 단 stage_4_closure 로 도달한 경우는 출력하지 않습니다.
-  - stage_4_closure 이후 추가 질문이 들어오면 "보완 완료되면 윤기님에게 미팅 잡아달라고 하세요" 만 출력합니다.
+  - stage_4_closure 이후 추가 질문이 들어오면 "보완 완료되면 윤기님에게 미팅 잡아달라고 하세요" 만 출력합니다.{name_rule}
 </instructions>
 """.strip()
 
     # 6) 전체 프롬프트 조립
-    full_prompt = "\n".join([
-        persona_context,
-        dialogue_guide,
-        history_xml,
-        contexts_xml,
-        current_input_xml,
-        final_instructions
-    ])
+    if PROMPT_CACHE_LAYOUT:
+        # 고정 블록 → 대화 주제별 블록(보고 내용) → 턴마다 늘어나는 이력 → 이름/현재 입력
+        full_prompt = "\n".join([
+            persona_context,
+            dialogue_guide,
+            final_instructions,
+            contexts_xml,
+            history_xml,
+            user_name_xml,
+            current_input_xml
+        ])
+    else:
+        full_prompt = "\n".join([
+            persona_context,
+            dialogue_guide,
+            history_xml,
+            contexts_xml,
+            current_input_xml,
+            final_instructions
+        ])
 
     # 디버깅: 생성된 전체 프롬프트 출력
     print("\n" + "="*80)
@@ -496,68 +478,69 @@ def create_gpt_prompt(
     return full_prompt
 
 
-def stream_gpt_response(prompt: str):
-    """GPT API를 통한 스트리밍 응답"""
-    try:
-        # 디버깅: 함수 시작 시 프롬프트 길이 정보 출력
-        print(f"\n[DEBUG] stream_gpt_response 함수 호출됨")
-        print(f"[DEBUG] 프롬프트 길이: {len(prompt)} 문자")
-        print(f"[DEBUG] 프롬프트 첫 100자: {prompt[:100]}...")
-        
-        # OpenAI API 키 확인 (환경변수 또는 Streamlit secrets)
-        api_key = os.getenv('OPENAI_API_KEY') or st.secrets.get('OPENAI_API_KEY')
-        if not api_key:
-            return "❌ OpenAI API 키가 설정되지 않았습니다. 환경변수 OPENAI_API_KEY를 설정해주세요."
-        
-        client = openai.OpenAI(api_key=api_key)
-        
-        # response = client.chat.completions.create(
-        #     model="gpt-4o",  # 또는 사용 가능한 모델
-        #     messages=[{"role": "user", "content": prompt}],
-        #     stream=True,
-        #     max_tokens=2000,
-        #     temperature=0.7
-        # )
-
-        # 디버깅: API 호출 정보 출력
-        print(f"[DEBUG] OpenAI API 호출 시작 - 모델: gpt-4o")
-        print(f"[DEBUG] API 요청 파라미터:")
-        print(f"  - model: gpt-4o")
-        print(f"  - stream: True")
-        print(f"  - max_tokens: 2000")
-        print(f"  - temperature: 0.7")
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",  # GPT-5 대신 사용 가능한 모델로 변경
-            messages=[{"role": "user", "content": prompt}],
-            stream=True,
-            max_tokens=2000,  # max_completion_tokens 대신 max_tokens 사용
-            temperature=0.7   # temperature 파라미터 추가
-        )
-        
-        print(f"[DEBUG] API 응답 스트리밍 시작")
-        
-        full_response = ""
-        chunk_count = 0
-        for chunk in response:
-            chunk_count += 1
-            
-            # 일부 청크에는 content가 없을 수 있으니 방어 코딩
-            if hasattr(chunk, "choices") and chunk.choices:
-                delta = getattr(chunk.choices[0], "delta", None)
-                if delta and getattr(delta, "content", None):
-                    piece = delta.content
-                    full_response += piece
-        
-        # print(f"[DEBUG] API 응답 완료")
-        # print(f"[DEBUG] 총 청크 수: {chunk_count}")
-        # print(f"[DEBUG] 응답 길이: {len(full_response)} 문자")
-        # print(f"[DEBUG] 응답 첫 200자: {full_response[:200]}...")
-        
-        return full_response
-                
-    except Exception as e:
-        return f"❌ 오류가 발생했습니다: {str(e)}"
+# 본부장 응답 모델 (사용 한도를 넘으면 usage.budget_model이 낮춰서 돌려줄 수 있음)
+CHAT_MODEL_ID = "gpt-4o"
+
+def stream_gpt_response(prompt: str, use_cache: bool = True,
+                        model: str = CHAT_MODEL_ID) -> Generator[str, None, ChatCompletionResult]:
+    """GPT API를 통한 스트리밍 응답 (조각을 도착하는 대로 yield, 끝나면 ChatCompletionResult 반환)"""
+    # 디버깅: 함수 시작 시 프롬프트 길이 정보 출력
+    print(f"\n[DEBUG] stream_gpt_response 함수 호출됨")
+    print(f"[DEBUG] 프롬프트 길이: {len(prompt)} 문자")
+    print(f"[DEBUG] 프롬프트 첫 100자: {prompt[:100]}...")
+    
+    # 클라이언트는 프로세스 공용 (llm.get_openai_client)
+    result = yield from stream_chat_completion(
+        [{"role": "user", "content": prompt}],
+        model=model,
+        max_tokens=2000,
+        temperature=0.7,
+        use_cache=use_cache
+    )
+    
+    ttft = f"{result.ttft:.2f}s" if result.ttft is not None else "-"
+    print(f"[DEBUG] 응답 완료 - 첫 토큰 {ttft}, 전체 {result.elapsed:.2f}s, 사용량 {result.usage}, 캐시 {result.cached}")
+    print(f"[DEBUG] 프롬프트 캐시 적중 토큰: {result.cached_tokens}")
+    return result
+
+def get_usage_user() -> str:
+    """사용량/한도 기준 사용자 (로그인 아이디, 없으면 입력한 이름)"""
+    return username or st.session_state.name
+
+def get_usage_stream_id() -> str:
+    """사용량 집계 단위 - 대화(talk_latest) 하나"""
+    return f"talk_latest:{st.session_state.name}:{st.session_state.subject_seq}"
+
+def show_gpt_response(container, user_message: str, prompt: str) -> Optional[str]:
+    """
+    질문과 본부장 응답을 채팅 영역에 바로 표시 (토큰이 도착하는 대로) 후 전체 응답 반환
+    - 사용 한도로 막히면 None (안내는 rerun 후 채팅 영역에 표시, 응답으로 저장하지 않음)
+    """
+    with container:
+        st.markdown(f"**👤 {st.session_state.name}:** {user_message}")
+        st.markdown("**🤖 본부장님:**")
+        renderer = MarkdownStreamRenderer(st.container())
+    
+    # 사용 한도 확인 (초과 시 막거나 낮은 모델로)
+    user = get_usage_user()
+    model = budget_model(st.session_state.storage, user, CHAT_MODEL_ID)
+    if model is None:
+        st.session_state["chat_notice"] = budget_message(user)
+        renderer.finish()
+        return None
+    
+    use_cache = st.session_state.get("use_llm_cache", True)
+    write = TimedWriter(renderer.write)
+    result = consume_chat_stream(stream_gpt_response(prompt, use_cache=use_cache, model=model), write)
+    with perf_span("render"):
+        renderer.finish()
+    record_completion("본부장", result, render_seconds=write.seconds)
+    
+    # 토큰/비용 기록 (대화와 같은 대기열로 저장)
+    meter = UsageMeter("index2", user, model, get_usage_stream_id(), st.session_state.subject_seq)
+    meter.add_completion("본부장", result)
+    record_usage(st.session_state.storage, meter)
+    return result.text
 
 # 데이터베이스 초기화
 init_database()
@@ -632,6 +615,15 @@ with st.sidebar:
         
         st.caption(f"현재 대화 번호: {st.session_state.subject_seq}")
     
+    # 응답 캐시 (LLM_CACHE_ENABLED일 때만) - 끄면 같은 질문도 새로 생성
+    if get_completion_cache().enabled:
+        st.checkbox(
+            "같은 질문은 저장된 응답 재사용",
+            value=True,
+            key="use_llm_cache",
+            help="보고 내용과 질문이 완전히 같으면 이전 응답을 다시 보여줍니다. 새 답변이 필요하면 끄세요."
+        )
+    
     st.markdown("---")
     
     # 4. 현재 상태
@@ -656,19 +648,20 @@ with st.sidebar:
         st.rerun()
     
     if st.button("📊 DB 상태 확인"):
-        conn = sqlite3.connect('talk.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM talk_latest")
-        latest_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM talk_old")
-        old_count = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        st.write(f"talk_latest: {latest_count}건")
-        st.write(f"talk_old: {old_count}건")
+        try:
+            counts = st.session_state.storage.table_counts(['talk_latest', 'talk_old'])
+            st.write(f"저장소: {st.session_state.storage.backend}")
+            st.write(f"talk_latest: {counts['talk_latest']}건")
+            st.write(f"talk_old: {counts['talk_old']}건")
+        except Exception as e:
+            st.error(f"DB 상태 조회 중 오류: {str(e)}")
+    
+    # 최근 응답 시간 분석 (p50/p95)
+    render_perf_panel("index2")
+    
+    # 토큰/비용 (이번 기간 한도, 대화별/사용자별 집계)
+    if st.session_state.storage:
+        render_usage_panel(st.session_state.storage, get_usage_user(), stream_id=get_usage_stream_id())
     
     # ==================== 하단 섹션 ====================
     st.markdown("---")
@@ -682,10 +675,10 @@ with st.sidebar:
         st.warning("⚠️ OpenAI API Key가 설정되지 않았습니다")
     
     # 데이터베이스 연결 상태
-    if 'supabase_client' in st.session_state and st.session_state.supabase_client:
-        st.success("✅ 데이터베이스 연결됨")
+    if st.session_state.get('storage'):
+        st.success(f"✅ 데이터베이스 연결됨 ({st.session_state.storage.backend})")
         if st.button("데이터베이스 연결 해제", key="disconnect_index2"):
-            st.session_state.supabase_client = None
+            st.session_state.storage = None
             st.rerun()
     else:
         st.error("❌ 데이터베이스 연결 안됨")
@@ -765,6 +758,9 @@ if st.session_state.is_chat_started:
                 st.markdown(f"**👤 {st.session_state.name}:** {message['content']}")
             else:
                 st.markdown(f"**🤖 본부장님:** {message['content']}")
+        # 직전 요청이 사용 한도로 막힌 경우 안내 (응답으로 저장하지 않음)
+        if st.session_state.get("chat_notice"):
+            st.error(st.session_state.pop("chat_notice"))
     
     # 처음 채팅 시작 시 기본 질문 버튼 표시
     if not st.session_state.messages:
@@ -776,53 +772,46 @@ if st.session_state.is_chat_started:
             default_message = "본부장님, 위 보고 내용에 대해 어떻게 생각하시나요?"
             st.session_state.messages.append({"role": "user", "content": default_message})
             
-            # talk_seq 계산
-            talk_seq = get_next_talk_seq(st.session_state.name, st.session_state.subject_seq)
-            print(f"[DEBUG] 빠른 시작 - 사용자 talk_seq: {talk_seq}")
-            
-            # 사용자 입력 DB 저장
-            save_conversation(
-                st.session_state.name,
-                st.session_state.subject_seq,
-                talk_seq,
-                'Q',
-                default_message
-            )
+            # 응답 시간 측정 (DB/프롬프트/모델/표시)
+            perf_timer = start_run("index2", "chat", user=st.session_state.name)
             
             # GPT 프롬프트 생성 및 응답
             if st.session_state.mode == "본부장 사전 컨펌시뮬레이션":
-                prompt = create_gpt_prompt(
-                    st.session_state.name,
-                    st.session_state.subject_seq,
-                    st.session_state.preliminary_info,
-                    st.session_state.topic,
-                    st.session_state.report_content,
-                    default_message
-                )
+                with perf_span("prompt"):
+                    prompt = create_gpt_prompt(
+                        st.session_state.name,
+                        st.session_state.subject_seq,
+                        st.session_state.preliminary_info,
+                        st.session_state.topic,
+                        st.session_state.report_content,
+                        default_message
+                    )
                 
-                with st.spinner("AI가 응답을 생성중입니다..."):
-                    ai_response = stream_gpt_response(prompt)
+                # 토큰이 도착하는 대로 표시
+                ai_response = show_gpt_response(chat_container, default_message, prompt)
+                if ai_response is not None:
                     st.session_state.messages.append({"role": "assistant", "content": ai_response})
-                    
-                    # AI 응답 DB 저장 (새로운 talk_seq 계산)
-                    ai_talk_seq = get_next_talk_seq(st.session_state.name, st.session_state.subject_seq)
-                    print(f"[DEBUG] 빠른 시작 - AI talk_seq: {ai_talk_seq}")
-                    save_conversation(
+                
+                # 질문 + AI 응답을 한 번에 DB 저장
+                with perf_span("db"):
+                    save_turn(
                         st.session_state.name,
                         st.session_state.subject_seq,
-                        ai_talk_seq,
-                        'A',
+                        default_message,
                         ai_response
                     )
-                    
-                    # 40개 이상이면 요약
-                    if should_summarize_conversations(st.session_state.name, st.session_state.subject_seq):
-                        summarize_and_archive_conversations(st.session_state.name, st.session_state.subject_seq)
+                
+                # 많이 쌓였으면 오래된 대화 요약 (백그라운드)
+                if ai_response is not None:
+                    summarize_and_archive_conversations(st.session_state.name, st.session_state.subject_seq)
             
             else:  # 팀 토론 모드
+                with perf_span("db"):
+                    save_turn(st.session_state.name, st.session_state.subject_seq, default_message)
                 ai_response = f"[팀 토론] {', '.join(st.session_state.selected_team_members)}와 함께 '{default_message}'에 대해 토론합니다. (Agno 시스템 연동 예정)"
                 st.session_state.messages.append({"role": "assistant", "content": ai_response})
             
+            finish_run(perf_timer)
             st.rerun()
         
         st.markdown("---")
@@ -834,56 +823,49 @@ if st.session_state.is_chat_started:
         # 사용자 메시지 추가
         st.session_state.messages.append({"role": "user", "content": user_input})
         
-        # talk_seq 계산
-        talk_seq = get_next_talk_seq(st.session_state.name, st.session_state.subject_seq)
-        print(f"[DEBUG] 일반 채팅 - 사용자 talk_seq: {talk_seq}")
-        
-        # 사용자 입력 DB 저장
-        save_conversation(
-            st.session_state.name,
-            st.session_state.subject_seq,
-            talk_seq,
-            'Q',
-            user_input
-        )
+        # 응답 시간 측정 (DB/프롬프트/모델/표시)
+        perf_timer = start_run("index2", "chat", user=st.session_state.name)
         
         # GPT 프롬프트 생성
         if st.session_state.mode == "본부장 사전 컨펌시뮬레이션":
-            prompt = create_gpt_prompt(
-                st.session_state.name,
-                st.session_state.subject_seq,
-                st.session_state.preliminary_info,
-                st.session_state.topic,
-                st.session_state.report_content,
-                user_input
-            )
+            with perf_span("prompt"):
+                prompt = create_gpt_prompt(
+                    st.session_state.name,
+                    st.session_state.subject_seq,
+                    st.session_state.preliminary_info,
+                    st.session_state.topic,
+                    st.session_state.report_content,
+                    user_input
+                )
             
-            # AI 응답 생성
-            with st.spinner("AI가 응답을 생성중입니다..."):
-                ai_response = stream_gpt_response(prompt)
-                
-                # AI 응답 추가
+            # AI 응답 생성 (토큰이 도착하는 대로 표시)
+            ai_response = show_gpt_response(chat_container, user_input, prompt)
+            
+            # AI 응답 추가 (한도로 막혔으면 질문만 저장)
+            if ai_response is not None:
                 st.session_state.messages.append({"role": "assistant", "content": ai_response})
-                
-                # AI 응답 DB 저장 (새로운 talk_seq 계산)
-                ai_talk_seq = get_next_talk_seq(st.session_state.name, st.session_state.subject_seq)
-                print(f"[DEBUG] 일반 채팅 - AI talk_seq: {ai_talk_seq}")
-                save_conversation(
+            
+            # 질문 + AI 응답을 한 번에 DB 저장
+            with perf_span("db"):
+                save_turn(
                     st.session_state.name,
                     st.session_state.subject_seq,
-                    ai_talk_seq,
-                    'A',
+                    user_input,
                     ai_response
                 )
-                
-                # 40개 이상이면 요약
-                if should_summarize_conversations(st.session_state.name, st.session_state.subject_seq):
-                    summarize_and_archive_conversations(st.session_state.name, st.session_state.subject_seq)
+            
+            # 많이 쌓였으면 오래된 대화 요약 (백그라운드)
+            if ai_response is not None:
+                summarize_and_archive_conversations(st.session_state.name, st.session_state.subject_seq)
         
         else:  # 팀 토론 모드
+            with perf_span("db"):
+                save_turn(st.session_state.name, st.session_state.subject_seq, user_input)
             ai_response = f"[팀 토론] {', '.join(st.session_state.selected_team_members)}와 함께 '{user_input}'에 대해 토론합니다. (Agno 시스템 연동 예정)"
             st.session_state.messages.append({"role": "assistant", "content": ai_response})
         
+        finish_run(perf_timer)
+        
         # 페이지 새로고침 (st.chat_input은 자동으로 초기화되므로 무한루프 없음)
         st.rerun()
 
@@ -1,19 +1,38 @@
 import streamlit as st
-import openai
 import json
-import re
 from datetime import datetime
+from uuid import uuid4
 import os
-from typing import List, Tuple, Iterator
+from typing import List, Optional, Tuple, Iterator, Generator
 from dotenv import load_dotenv
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
 from agno.team.team import Team
 from agno.tools.reasoning import ReasoningTools
-from agno.run.response import RunResponse
-from agno.tools.googlesearch import GoogleSearchTools
-import streamlit_authenticator as stauth
-from supabase import create_client, Client
+from llm_cache import make_team_model
+from search_cache import CachedGoogleSearchTools, search_cache_stats
+from auth import get_authenticator
+from llm import (
+    ChatCompletionResult, stream_chat_completion, get_http_client, http_pool_stats,
+    append_current_date, PROMPT_CACHE_LAYOUT,
+)
+from db import probe_database
+from storage import STORAGE_BACKEND, get_supabase_storage, get_sqlite_storage
+from team_leads import get_team_lead_repository
+from team_cache import get_team_pool, make_team_key
+from jobs import get_job_manager, follow_job, format_job_wait, JOB_ERROR, PRIORITY_INTERACTIVE
+from team_events import (
+    iter_team_events, event_to_text, format_tool_event, TranscriptSegments,
+    MemberContent, LeaderContent, ToolCall, ToolResult, RunError, RunMetrics, format_cache_report,
+)
+from stream_render import MarkdownStreamRenderer
+from chat_context import ChatContextBuilder, CHAT_AGNO_HISTORY, agno_history_options
+from talk_seq import allocate_talk_seq
+from write_queue import insert_rows, flush_pending_writes
+from transcript_store import get_transcript_store
+from perf_metrics import (
+    start_run, resume_run, finish_run, perf_span, current_run, observe_events, render_perf_panel,
+)
+from usage import UsageMeter, record_usage, budget_model, budget_message, render_usage_panel
 
 # 환경 변수 로드
 load_dotenv()
@@ -22,32 +41,9 @@ load_dotenv()
 st.set_page_config(page_title="팀토론 시뮬레이터", page_icon="💬", layout="wide")
 
 # ======================== 인증 시스템 ========================
-# Authentication setup using environment variables for streamlit-authenticator 0.1.5
-# Get credentials from environment variables (supports both local .env and Streamlit Cloud secrets)
-try:
-    # Try Streamlit Cloud secrets first, then fallback to environment variables
-    auth_username = st.secrets.get("AUTH_USERNAME", os.getenv("AUTH_USERNAME", "YOUR-ID"))
-    auth_password = st.secrets.get("AUTH_PASSWORD", os.getenv("AUTH_PASSWORD", "YOUR-PASSWORD"))
-    auth_name = st.secrets.get("AUTH_NAME", os.getenv("AUTH_NAME", "KS"))
-except Exception:
-    # Fallback to environment variables only (for local development)
-    auth_username = os.getenv("AUTH_USERNAME", "YOUR-ID")
-    auth_password = os.getenv("AUTH_PASSWORD", "YOUR-PASSWORD")
-    auth_name = os.getenv("AUTH_NAME", "YOUR-NAME")
-
-names = [auth_name]
-usernames = [auth_username]
-passwords = [auth_password]
-hashed_passwords = stauth.Hasher(passwords).generate()
-
-# authenticator 생성
-authenticator = stauth.Authenticate(
-    names,
-    usernames,
-    hashed_passwords,
-    'ks_auth_cookie',
-    'ks_auth_key'
-)
+# Authentication setup for streamlit-authenticator 0.1.5
+# 계정 로딩/해싱은 auth.py에서 처리 (bcrypt 해싱은 계정 세트당 1회만 수행)
+authenticator = get_authenticator()
 
 # 로그인 처리
 name, authentication_status, username = authenticator.login('KS 시뮬레이터 로그인', 'main')
@@ -69,17 +65,22 @@ if 'supabase_url' not in st.session_state:
     st.session_state.supabase_url = os.getenv('SUPABASE_URL', '')
 if 'supabase_anon_key' not in st.session_state:
     st.session_state.supabase_anon_key = os.getenv('SUPABASE_ANON_KEY', '')
-if 'supabase_client' not in st.session_state:
-    st.session_state.supabase_client = None
+if 'storage' not in st.session_state:
+    st.session_state.storage = None
 
 def init_supabase_from_env():
-    """환경변수에서 Supabase 설정을 읽어 자동 연결"""
+    """환경변수에서 Supabase 설정을 읽어 자동 연결 (STORAGE_BACKEND=sqlite면 내장 DB 사용)"""
+    if STORAGE_BACKEND == "sqlite":
+        if not st.session_state.storage:
+            st.session_state.storage = get_sqlite_storage()
+        return True
+
     url = os.getenv('SUPABASE_URL') or st.secrets.get('SUPABASE_URL')
     key = os.getenv('SUPABASE_ANON_KEY') or st.secrets.get('SUPABASE_ANON_KEY')
     
-    if url and key and not st.session_state.supabase_client:
+    if url and key and not st.session_state.storage:
         try:
-            st.session_state.supabase_client = create_client(url, key)
+            st.session_state.storage = get_supabase_storage(url, key)
             st.session_state.supabase_url = url
             st.session_state.supabase_anon_key = key
             return True
@@ -121,8 +122,9 @@ def init_supabase():
             if st.button("수동 연결"):
                 if manual_url and manual_key:
                     try:
-                        client = create_client(manual_url, manual_key)
-                        st.session_state.supabase_client = client
+                        st.session_state.storage = get_supabase_storage(manual_url, manual_key)
+                        st.session_state.supabase_url = manual_url
+                        st.session_state.supabase_anon_key = manual_key
                         st.success("✅ Supabase에 연결되었습니다!")
                         st.rerun()
                     except Exception as e:
@@ -131,10 +133,10 @@ def init_supabase():
                     st.error("URL과 Key를 모두 입력해주세요")
 
 # Supabase 초기화 (자동 연결이 실패한 경우에만 UI 표시)
-if 'supabase_client' not in st.session_state or not st.session_state.supabase_client:
+if not st.session_state.storage:
     if not auto_connected:
         init_supabase()
-    if 'supabase_client' not in st.session_state or not st.session_state.supabase_client:
+    if not st.session_state.storage:
         st.warning("데이터베이스에 연결해주세요")
         st.stop()
 
@@ -153,6 +155,8 @@ if 'subject_seq_initialized' not in st.session_state:
     st.session_state.subject_seq_initialized = False
 if 'messages' not in st.session_state:
     st.session_state.messages = []
+if 'chat_job' not in st.session_state:
+    st.session_state.chat_job = None   # 진행 중인 채팅 작업 {id, subject_seq, topic, perf} (rerun 후 다시 연결)
 if 'preliminary_info' not in st.session_state:
     st.session_state.preliminary_info = ""
 if 'topic' not in st.session_state:
@@ -169,31 +173,33 @@ if 'agent_frameworks' not in st.session_state:
 # Database initialization
 def init_database():
     """데이터베이스 테이블 확인 (Supabase에서는 이미 생성됨)"""
-    if 'supabase_client' not in st.session_state:
+    if 'storage' not in st.session_state:
         st.error("데이터베이스에 연결되지 않았습니다.")
         return False
     
     try:
-        # team_leads 테이블 존재 확인
-        response = st.session_state.supabase_client.table('team_leads').select('*').limit(1).execute()
-        return True
+        if st.session_state.storage.backend == "sqlite":
+            st.session_state.storage.ping()
+            return True
+        # team_leads 테이블 존재 확인 (프로세스 공용 캐시, TTL 내에는 추가 요청 없음)
+        return probe_database(st.session_state.supabase_url, st.session_state.supabase_anon_key)
     except Exception as e:
         st.error(f"데이터베이스 테이블 확인 실패: {str(e)}")
         return False
 
 def add_team_lead(name: str, role: str, personality: str, strategic_focus: str):
     """team_leads 테이블에 데이터 추가"""
-    if 'supabase_client' not in st.session_state:
+    if 'storage' not in st.session_state:
         st.error("데이터베이스에 연결되지 않았습니다.")
         return False
     
     try:
-        response = st.session_state.supabase_client.table('team_leads').insert({
+        get_team_lead_repo().insert_many([{
             'name': name,
             'role': role,
             'personality': personality,
             'strategic_focus': strategic_focus
-        }).execute()
+        }])
         return True
     except Exception as e:
         st.error(f"팀장 데이터 추가 실패: {str(e)}")
@@ -201,13 +207,13 @@ def add_team_lead(name: str, role: str, personality: str, strategic_focus: str):
 
 def clear_team_leads():
     """team_leads 테이블 데이터 초기화"""
-    if 'supabase_client' not in st.session_state:
+    if 'storage' not in st.session_state:
         st.error("데이터베이스에 연결되지 않았습니다.")
         return False
     
     try:
         # 모든 team_leads 데이터 삭제
-        response = st.session_state.supabase_client.table('team_leads').delete().neq('id', 0).execute()
+        get_team_lead_repo().clear()
         return True
     except Exception as e:
         st.error(f"팀장 데이터 초기화 실패: {str(e)}")
@@ -216,61 +222,48 @@ def clear_team_leads():
 # 샘플 데이터 삽입 함수는 index3.py에서 제거됨 (사용자 요청에 따라)
 # index.py의 team_leads 테이블을 공유하여 사용
 
+def get_team_lead_repo():
+    """팀장 정보 저장소 (프로세스 공용 캐시, 쓰기 시 자동 무효화)"""
+    return get_team_lead_repository(st.session_state.storage, st.session_state.storage.location)
+
 def get_team_leads():
     """team_leads 테이블에서 모든 데이터 가져오기"""
-    if 'supabase_client' not in st.session_state:
+    if 'storage' not in st.session_state:
         st.error("데이터베이스에 연결되지 않았습니다.")
         return []
     
     try:
-        response = st.session_state.supabase_client.table('team_leads')\
-            .select('id, name, role, personality, strategic_focus')\
-            .order('id')\
-            .execute()
-        
-        # 튜플 형태로 반환 (기존 SQLite 형식과 동일)
-        return [(row['id'], row['name'], row['role'], row['personality'], row['strategic_focus']) 
-                for row in response.data]
+        # TeamLead 레코드 목록 (id 순, TTL 동안 캐시)
+        with perf_span("db"):
+            return get_team_lead_repo().all()
     except Exception as e:
         st.error(f"팀장 데이터 조회 실패: {str(e)}")
         return []
 
-def get_team_lead_by_name(name: str):
-    """이름으로 특정 team_lead 정보 가져오기"""
-    if 'supabase_client' not in st.session_state:
+def get_team_leads_by_name(names) -> dict:
+    """이름 목록으로 team_lead 정보 일괄 조회 → {이름: TeamLead}"""
+    if 'storage' not in st.session_state:
         st.error("데이터베이스에 연결되지 않았습니다.")
-        return None
+        return {}
     
     try:
-        response = st.session_state.supabase_client.table('team_leads')\
-            .select('id, name, role, personality, strategic_focus')\
-            .eq('name', name)\
-            .execute()
-        
-        if response.data:
-            row = response.data[0]
-            return (row['id'], row['name'], row['role'], row['personality'], row['strategic_focus'])
-        return None
+        return get_team_lead_repo().get_many_by_name(names)
     except Exception as e:
         st.error(f"팀장 정보 조회 실패: {str(e)}")
-        return None
+        return {}
+
+def get_team_lead_by_name(name: str):
+    """이름으로 특정 team_lead 정보 가져오기"""
+    return get_team_leads_by_name([name]).get(name)
 
 def update_team_lead(lead_id: int, name: str, role: str, personality: str, strategic_focus: str):
     """team_leads 테이블 정보 업데이트"""
-    if 'supabase_client' not in st.session_state:
+    if 'storage' not in st.session_state:
         st.error("데이터베이스에 연결되지 않았습니다.")
         return False
     
     try:
-        response = st.session_state.supabase_client.table('team_leads')\
-            .update({
-                'name': name,
-                'role': role,
-                'personality': personality,
-                'strategic_focus': strategic_focus
-            })\
-            .eq('id', lead_id)\
-            .execute()
+        get_team_lead_repo().update(lead_id, name, role, personality, strategic_focus)
         return True
     except Exception as e:
         st.error(f"팀장 정보 업데이트 실패: {str(e)}")
@@ -278,81 +271,93 @@ def update_team_lead(lead_id: int, name: str, role: str, personality: str, strat
 
 def get_last_subject_seq() -> int:
     """마지막 subject_seq 반환"""
-    if 'supabase_client' not in st.session_state:
+    if 'storage' not in st.session_state:
         st.error("데이터베이스에 연결되지 않았습니다.")
         return 0
     
     try:
-        # subject_talk 테이블이 존재하지 않을 수 있으므로 생성 필요
-        # 우선 간단히 0을 반환하고 필요시 테이블 생성 로직 추가
-        response = st.session_state.supabase_client.table('subject_talk')\
-            .select('subject_seq')\
-            .order('subject_seq', desc=True)\
-            .limit(1)\
-            .execute()
-        
-        if response.data:
-            return response.data[0]['subject_seq']
-        return 0
+        return st.session_state.storage.last_subject_seq('subject_talk')
     except Exception as e:
         # 테이블이 없을 경우 0 반환
         return 0
 
-def save_conversation(subject_title: str, subject_seq: int, talk_seq: int, from_to: str, content: str):
-    """대화 내용을 데이터베이스에 저장"""
-    if 'supabase_client' not in st.session_state:
+def save_turn(subject_title: str, subject_seq: int, question: Optional[str], answer: Optional[str] = None):
+    """
+    한 턴(질문 + 답변)을 한 번의 insert로 저장 (question/answer 중 None은 건너뜀)
+    - talk_seq는 턴에 필요한 개수만큼 한 번에 발급 (allocate_talk_seq)
+    """
+    if 'storage' not in st.session_state:
         st.error("데이터베이스에 연결되지 않았습니다.")
         return False
     
     try:
-        response = st.session_state.supabase_client.table('subject_talk').insert({
-            'subject_title': subject_title,
-            'subject_seq': subject_seq,
-            'talk_seq': talk_seq,
-            'from_to': from_to,
-            'talk_history': content
-        }).execute()
+        turns = [(from_to, content) for from_to, content in (('Q', question), ('A', answer)) if content is not None]
+        first_seq = allocate_talk_seq(
+            st.session_state.storage, 'subject_talk', subject_seq, len(turns),
+            read_next=lambda: get_next_talk_seq(subject_seq)
+        )
+        print(f"[DEBUG] 대화 저장 - talk_seq {first_seq}~{first_seq + len(turns) - 1}")
+        # 백그라운드에서 모아 저장 (응답 시간에 DB 쓰기 지연이 더해지지 않음)
+        insert_rows(st.session_state.storage, 'subject_talk', [
+            {
+                'subject_title': subject_title,
+                'subject_seq': subject_seq,
+                'talk_seq': first_seq + i,
+                'from_to': from_to,
+                'talk_history': content
+            }
+            for i, (from_to, content) in enumerate(turns)
+        ])
+        # 대화 사본에도 바로 추가 (다음 턴에 DB를 다시 읽지 않음)
+        get_transcript_store().append(
+            ('subject_talk', '', subject_seq),
+            [(first_seq + i, from_to, content) for i, (from_to, content) in enumerate(turns)]
+        )
         return True
     except Exception as e:
         st.error(f"대화 저장 실패: {str(e)}")
         return False
 
-def get_conversation_history(subject_seq: int) -> List[Tuple]:
-    """대화 내역 가져오기"""
-    if 'supabase_client' not in st.session_state:
+def load_transcript(subject_seq: int) -> Optional[Tuple[List[Tuple[int, str, str]], None]]:
+    """
+    DB에서 대화 전체 읽기 → ([(talk_seq, from_to, 내용)], None) (대화 사본을 처음 만들 때만)
+    - 읽지 못하면 None (빈 이력으로 사본에 남기지 않고 다음에 다시 읽음)
+    """
+    if 'storage' not in st.session_state:
         st.error("데이터베이스에 연결되지 않았습니다.")
-        return []
+        return None
     
     try:
-        response = st.session_state.supabase_client.table('subject_talk')\
-            .select('from_to, talk_history')\
-            .eq('subject_seq', subject_seq)\
-            .order('talk_seq')\
-            .execute()
+        with perf_span("db"):
+            # 대기 중인 저장이 있으면 먼저 반영
+            flush_pending_writes()
+            
+            rows = st.session_state.storage.talk_rows('subject_talk', subject_seq)
         
-        # 튜플 형태로 반환 (기존 SQLite 형식과 동일)
-        return [(row['from_to'], row['talk_history']) for row in response.data]
+        return [(row['talk_seq'], row['from_to'], row['talk_history']) for row in rows], None
     except Exception as e:
         st.error(f"대화 내역 조회 실패: {str(e)}")
-        return []
+        return None
+
+def get_conversation_history(subject_seq: int) -> List[Tuple]:
+    """대화 내역 [(from_to, 내용)] (대화 사본에서 - 처음 한 번만 DB 조회)"""
+    transcript = get_transcript_store().get(
+        ('subject_talk', '', subject_seq),
+        lambda: load_transcript(subject_seq)
+    )
+    return transcript.history()
 
 def get_next_talk_seq(subject_seq: int) -> int:
-    """다음 talk_seq 값 계산"""
-    if 'supabase_client' not in st.session_state:
+    """다음 talk_seq 값 계산 (서버 발급을 못 쓸 때 처음 한 번만 사용)"""
+    if 'storage' not in st.session_state:
         st.error("데이터베이스에 연결되지 않았습니다.")
         return 1
     
+    # 대기 중인 저장이 있으면 먼저 반영
+    flush_pending_writes()
+    
     try:
-        response = st.session_state.supabase_client.table('subject_talk')\
-            .select('talk_seq')\
-            .eq('subject_seq', subject_seq)\
-            .order('talk_seq', desc=True)\
-            .limit(1)\
-            .execute()
-        
-        if response.data:
-            return response.data[0]['talk_seq'] + 1
-        return 1
+        return st.session_state.storage.last_talk_seq('subject_talk', subject_seq) + 1
     except Exception as e:
         # 테이블이 없거나 오류가 발생한 경우 1 반환
         return 1
@@ -572,43 +577,55 @@ IW = (K + U + W + C + A) × H × E
 """
 }
 
-def create_team_from_leads(team_leads, selected_names, mode: str = "개인의견 취합", depth: str = "보통"):
+TEAM_MODEL_ID = "gpt-4o"
+
+def create_team_from_leads(selected_names, mode: str = "개인의견 취합", depth: str = "보통",
+                           model_id: str = TEAM_MODEL_ID):
     """선택된 팀장 정보로 Agno Team 구성"""
     agents = []
 
     # 에이전트 프레임워크 설정 가져오기
     cfg_fw = st.session_state.get("agent_frameworks", {})
 
+    # 참석자 정보를 한 번에 조회 (참석자별 개별 쿼리 없음)
+    leads_by_name = get_team_leads_by_name(selected_names)
+
     for name in selected_names:
         # 이름으로 팀장 정보 찾기
-        lead = get_team_lead_by_name(name)
+        lead = leads_by_name.get(name)
         if not lead:
             continue
             
-        lead_id, lead_name, lead_role, personality, strategic_focus = lead
+        lead_id, lead_name, lead_role = lead.id, lead.name, lead.role
+        personality, strategic_focus = lead.personality, lead.strategic_focus
 
         # 기본 지시사항 구성
-        base_instructions = []
-        if personality:
-            base_instructions.extend(personality.splitlines())
+        personality_lines = personality.splitlines() if personality else []
 
-        # 깊이 지시 추가
-        base_instructions.extend(build_depth_instruction(depth))
+        # 깊이 지시
+        depth_lines = build_depth_instruction(depth)
         
-        # 프레임워크 텍스트 추가
+        # 프레임워크 텍스트
+        fw_lines = []
         fw_key = cfg_fw.get(lead_id, "none")
         if fw_key != "none":
             fw_text = FRAMEWORKS_TEXT.get(fw_key, "").strip()
             if fw_text:
-                base_instructions.extend(fw_text.splitlines())
+                fw_lines = fw_text.splitlines()
+
+        # 프롬프트 캐시 배치: 공통(깊이/프레임) 지시를 앞에, 팀장별 성향은 뒤에
+        if PROMPT_CACHE_LAYOUT:
+            base_instructions = depth_lines + fw_lines + personality_lines
+        else:
+            base_instructions = personality_lines + depth_lines + fw_lines
 
         agents.append(Agent(
             name=lead_name,
             role=f"당신은 한국 패션 아웃도어 브랜드의 {lead_role} 역할입니다.",
-            model=OpenAIChat(id="gpt-4o"),
+            model=make_team_model(model_id, http_client=get_http_client()),
             instructions=base_instructions,
             goal=strategic_focus,
-            tools=[GoogleSearchTools()],
+            tools=[CachedGoogleSearchTools()],
         ))
 
     # 팀 모드 설정
@@ -618,100 +635,179 @@ def create_team_from_leads(team_leads, selected_names, mode: str = "개인의견
     team = Team(
         name="토론팀",
         mode=agno_mode,
-        model=OpenAIChat(id="gpt-4o"),
+        model=make_team_model(model_id, http_client=get_http_client()),
         members=agents,
         tools=[ReasoningTools(add_instructions=True)],
         instructions=team_instructions,
         markdown=True,
-        add_datetime_to_instructions=True,
+        # 캐시 배치에서는 날짜를 지침 대신 메시지 끝에 붙임 (append_current_date)
+        add_datetime_to_instructions=not PROMPT_CACHE_LAYOUT,
         show_members_responses=True,
         debug_mode=True,
+        # CHAT_AGNO_HISTORY면 최근 대화를 Agno 세션 저장소에서 읽어 넣음
+        **agno_history_options(),
     )
 
     return team
 
-def run_team_debate_stream(team, topic: str) -> Iterator[str]:
-    """Team 객체를 기반으로 주제에 대해 스트리밍 토론 실행"""
-    response_stream: Iterator[RunResponse] = team.run(topic, stream=True)
-    for chunk in response_stream:
-        content = chunk.content
+def acquire_team(selected_names, mode: str = "개인의견 취합", depth: str = "보통", model_id: str = TEAM_MODEL_ID):
+    """팀 풀에서 구성된 Team을 빌려옴 (없으면 새로 구성) → (key, team), 사용 후 반납 필요"""
+    leads_by_name = get_team_leads_by_name(selected_names)
+    leads = [leads_by_name[n] for n in selected_names if n in leads_by_name]
+    cfg_fw = st.session_state.get("agent_frameworks", {})
+    key = make_team_key(leads, mode, depth, cfg_fw, model_id)
+    team = get_team_pool().acquire(key, lambda: create_team_from_leads(selected_names, mode, depth, model_id))
+    return key, team
 
-        # 기본 체크
-        if not content or not isinstance(content, str):
-            continue
+def get_agno_session_id() -> str:
+    """브라우저 세션별 Agno session_id (재사용되는 Team의 실행 상태를 세션마다 분리)"""
+    return st.session_state.setdefault("agno_session_id", str(uuid4()))
 
-        # 로그 메시지 감지
-        if re.match(r".*\)\s+completed in \d+\.\d+s.*", content):
-            # 로그 메시지는 구분되게 마크다운 포맷으로 반환
-            yield f"\n\n`{content.strip()}`\n\n"
-        else:
-            yield content
+def run_team_debate_stream(team, topic: str, session_id: str = None) -> Iterator[str]:
+    """Team 객체를 기반으로 주제에 대해 스트리밍 토론 실행 (팀장 구분 제목/도구 완료 로그 포함)"""
+    for event in iter_team_events(team, topic, session_id=session_id):
+        text = event_to_text(event)
+        if text:
+            yield text
 
+def get_chat_session_id(subject_seq: int) -> str:
+    """채팅 실행용 session_id (Agno 세션 기록을 쓰면 토론(subject_seq)마다 하나)"""
+    if CHAT_AGNO_HISTORY:
+        return f"subject-{subject_seq}"
+    return get_agno_session_id()
 
+def get_usage_stream_id(subject_seq: int) -> str:
+    """사용량 집계 단위 - 토론(subject_talk) 하나"""
+    return f"subject_talk:{subject_seq}"
 
+def submit_chat_job(team_key, team, message: str, session_id: str = None, meter: UsageMeter = None):
+    """
+    채팅 한 턴을 스케줄러에 등록 (회의보다 높은 우선순위)
+    - 실행이 끝나면(실패/취소 포함) 작업 스레드에서 Team을 풀에 반납하고 사용량(meter) 저장
+    """
+    session_id = session_id or get_agno_session_id()
+    pool = get_team_pool()
+    timer = current_run()
+    storage = st.session_state.storage
+    def events():
+        stream = iter_team_events(team, message, session_id=session_id)
+        return meter.observe_events(stream) if meter is not None else stream
 
-def stream_gpt_response(prompt: str):
-    """GPT API를 통한 스트리밍 응답"""
-    try:
-        # 디버깅: 함수 시작 시 프롬프트 길이 정보 출력
-        print(f"\n[DEBUG] stream_gpt_response 함수 호출됨")
-        print(f"[DEBUG] 프롬프트 길이: {len(prompt)} 문자")
-        print(f"[DEBUG] 프롬프트 첫 100자: {prompt[:100]}...")
-        
-        # OpenAI API 키 확인 (환경변수 또는 Streamlit secrets)
-        api_key = os.getenv('OPENAI_API_KEY') or st.secrets.get('OPENAI_API_KEY')
-        if not api_key:
-            return "❌ OpenAI API 키가 설정되지 않았습니다. 환경변수 OPENAI_API_KEY를 설정해주세요."
-        
-        client = openai.OpenAI(api_key=api_key)
-        
-        # response = client.chat.completions.create(
-        #     model="gpt-4o",  # 또는 사용 가능한 모델
-        #     messages=[{"role": "user", "content": prompt}],
-        #     stream=True,
-        #     max_tokens=2000,
-        #     temperature=0.7
-        # )
-
-        # 디버깅: API 호출 정보 출력
-        print(f"[DEBUG] OpenAI API 호출 시작 - 모델: gpt-4o")
-        print(f"[DEBUG] API 요청 파라미터:")
-        print(f"  - model: gpt-4o")
-        print(f"  - stream: True")
-        print(f"  - max_tokens: 2000")
-        print(f"  - temperature: 0.7")
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",  # GPT-5 대신 사용 가능한 모델로 변경
-            messages=[{"role": "user", "content": prompt}],
-            stream=True,
-            max_tokens=2000,  # max_completion_tokens 대신 max_tokens 사용
-            temperature=0.7   # temperature 파라미터 추가
-        )
-        
-        print(f"[DEBUG] API 응답 스트리밍 시작")
-        
-        full_response = ""
-        chunk_count = 0
-        for chunk in response:
-            chunk_count += 1
-            
-            # 일부 청크에는 content가 없을 수 있으니 방어 코딩
-            if hasattr(chunk, "choices") and chunk.choices:
-                delta = getattr(chunk.choices[0], "delta", None)
-                if delta and getattr(delta, "content", None):
-                    piece = delta.content
-                    full_response += piece
-        
-        # print(f"[DEBUG] API 응답 완료")
-        # print(f"[DEBUG] 총 청크 수: {chunk_count}")
-        # print(f"[DEBUG] 응답 길이: {len(full_response)} 문자")
-        # print(f"[DEBUG] 응답 첫 200자: {full_response[:200]}...")
-        
-        return full_response
-                
-    except Exception as e:
-        return f"❌ 오류가 발생했습니다: {str(e)}"
+    def cleanup():
+        pool.release(team_key, team)
+        record_usage(storage, meter)
+
+    return get_job_manager().submit(
+        lambda: observe_events(events(), timer),
+        cleanup=cleanup,
+        label=f"chat:{message[-30:]}",
+        user=username or "",
+        priority=PRIORITY_INTERACTIVE,
+    )
+
+def follow_chat_job(container, show_question: bool = False):
+    """
+    진행 중인 채팅 작업에 연결해 응답을 표시하고, 끝나면 답변을 저장한 뒤 rerun
+    - rerun으로 표시가 끊겨도 작업은 계속 진행 → 다음 실행에서 버퍼를 처음부터 다시 그림
+    - 질문은 작업을 등록하기 전에 이미 저장됨
+    """
+    pending = st.session_state.chat_job
+    resume_run(pending.get("perf"))
+    job = get_job_manager().get(pending["id"])
+    ai_response = None
+    if job is None:
+        st.session_state["chat_notice"] = "❌ 이전 질문의 응답을 찾을 수 없습니다. 다시 질문해주세요."
+    else:
+        with container:
+            if show_question:
+                st.markdown(f"**👤 사용자:** {pending['question']}")
+            st.markdown("**🤖 AI 팀:**")
+            response_area = st.container()
+        try:
+            # 도착하는 대로 스트리밍 표시 (완료 후 전체 응답 반환)
+            ai_response = stream_team_response(response_area, job)
+            print(f"[DEBUG] OpenAI HTTP 풀: {http_pool_stats()}")
+            print(f"[DEBUG] 검색 캐시: {search_cache_stats()}")
+        except Exception as e:
+            st.session_state["chat_notice"] = f"❌ 토론 실행 중 오류가 발생했습니다: {str(e)}"
+            print(f"[ERROR] Agno team execution failed: {e}")
+
+    if ai_response is not None:
+        st.session_state.messages.append({"role": "assistant", "content": ai_response})
+        with perf_span("db"):
+            save_turn(pending["topic"], pending["subject_seq"], None, ai_response)
+    st.session_state.chat_job = None
+    finish_run(pending.get("perf"))
+    st.rerun()
+
+def stream_team_response(container, job) -> str:
+    """
+    Team 실행 결과를 채팅 영역에 도착하는 대로 표시하고, 저장용 전체 응답(마크다운) 반환
+    - 발화자(팀장/리더)가 바뀔 때마다 새 구간을 열어 제목과 함께 이어서 그림
+    - 도구 호출 상황/대기열 순번은 구간 위쪽 한 줄로만 갱신
+    """
+    jobs = get_job_manager()
+    transcript = TranscriptSegments()
+    tool_status = container.empty()
+    renderer = None
+    speaker = ()
+
+    def on_idle(job):
+        with perf_span("render"):
+            if renderer is not None and renderer.has_pending:
+                renderer.flush()
+            if renderer is None:
+                tool_status.caption(format_job_wait(jobs, job))
+
+    for event in follow_job(job, on_idle):
+        transcript.add(event)
+        with perf_span("render"):
+            if isinstance(event, (MemberContent, LeaderContent)):
+                if event.member != speaker:
+                    if renderer is not None:
+                        renderer.finish()
+                    speaker = event.member
+                    if speaker:
+                        container.markdown(f"#### 🧑‍💼 {speaker}")
+                    renderer = MarkdownStreamRenderer(container.container())
+                renderer.write(event.text)
+            elif isinstance(event, (ToolCall, ToolResult)):
+                tool_status.caption(format_tool_event(event))
+            elif isinstance(event, RunError):
+                container.error(f"❌ {event.message}")
+            elif isinstance(event, RunMetrics) and format_cache_report(event):
+                print(f"[DEBUG] 프롬프트 캐시 (캐시/입력 토큰): {format_cache_report(event)}")
+    with perf_span("render"):
+        if renderer is not None:
+            renderer.finish()
+        tool_status.empty()
+    jobs.discard(job.id)
+    if job.status == JOB_ERROR:
+        raise RuntimeError(job.error)
+    return transcript.to_markdown()
+
+
+
+
+def stream_gpt_response(prompt: str) -> Generator[str, None, ChatCompletionResult]:
+    """GPT API를 통한 스트리밍 응답 (조각을 도착하는 대로 yield, 끝나면 ChatCompletionResult 반환)"""
+    # 디버깅: 함수 시작 시 프롬프트 길이 정보 출력
+    print(f"\n[DEBUG] stream_gpt_response 함수 호출됨")
+    print(f"[DEBUG] 프롬프트 길이: {len(prompt)} 문자")
+    print(f"[DEBUG] 프롬프트 첫 100자: {prompt[:100]}...")
+    
+    # 클라이언트는 프로세스 공용 (llm.get_openai_client)
+    result = yield from stream_chat_completion(
+        [{"role": "user", "content": prompt}],
+        model="gpt-4o",
+        max_tokens=2000,
+        temperature=0.7
+    )
+    
+    ttft = f"{result.ttft:.2f}s" if result.ttft is not None else "-"
+    print(f"[DEBUG] 응답 완료 - 첫 토큰 {ttft}, 전체 {result.elapsed:.2f}s, 사용량 {result.usage}, 캐시 {result.cached}")
+    print(f"[DEBUG] 프롬프트 캐시 적중 토큰: {result.cached_tokens}")
+    return result
 
 # 데이터베이스 초기화
 init_database()
@@ -735,7 +831,7 @@ with st.sidebar:
         st.warning("⚠️ 팀장 정보가 없습니다. 'DB초기화' 버튼을 눌러주세요.")
     else:
         for team_lead in team_leads:
-            member_id, member_name, member_role, _, _ = team_lead
+            member_id, member_name, member_role = team_lead.id, team_lead.name, team_lead.role
             display_name = f"{member_name} ({member_role})"
             
             # 현재 선택된 상태 확인
@@ -809,14 +905,22 @@ with st.sidebar:
         st.warning("⚠️ OpenAI API Key가 설정되지 않았습니다")
     
     # 데이터베이스 연결 상태
-    if 'supabase_client' in st.session_state and st.session_state.supabase_client:
-        st.success("✅ 데이터베이스 연결됨")
+    if st.session_state.get('storage'):
+        st.success(f"✅ 데이터베이스 연결됨 ({st.session_state.storage.backend})")
         if st.button("데이터베이스 연결 해제", key="disconnect_index3"):
-            st.session_state.supabase_client = None
+            st.session_state.storage = None
             st.rerun()
     else:
         st.error("❌ 데이터베이스 연결 안됨")
     
+    # 최근 채팅 응답 시간 분석 (p50/p95)
+    render_perf_panel("index3")
+    
+    # 토큰/비용 (이번 기간 한도, 토론별/사용자별 집계)
+    if st.session_state.get('storage'):
+        render_usage_panel(st.session_state.storage, username or "",
+                           stream_id=get_usage_stream_id(st.session_state.subject_seq))
+    
     
 
 # 메인 영역 구성
@@ -859,7 +963,8 @@ if st.session_state.participant_order:
         current_lead = get_team_lead_by_name(st.session_state.editing_participant)
         
         if current_lead:
-            lead_id, current_name, current_role, current_personality, current_strategic_focus = current_lead
+            lead_id, current_name, current_role = current_lead.id, current_lead.name, current_lead.role
+            current_personality, current_strategic_focus = current_lead.personality, current_lead.strategic_focus
             
             # 편집 폼
             with st.form(key=f"edit_form_{lead_id}"):
@@ -960,26 +1065,23 @@ if st.session_state.is_chat_started:
                 st.markdown(f"**👤 사용자:** {message['content']}")
             else:
                 st.markdown(f"**🤖 AI 팀:** {message['content']}")
+        # 직전 요청이 사용 한도로 막힌 경우 안내 (rerun 후에도 보이도록 세션에 보관)
+        if st.session_state.get("chat_notice"):
+            st.error(st.session_state.pop("chat_notice"))
+    
+    # 사용자 입력 (st.chat_input 사용으로 무한루프 방지, 응답을 받는 중에는 잠금)
+    user_input = st.chat_input("메시지를 입력하세요...", disabled=st.session_state.chat_job is not None)
     
-    # 사용자 입력 (st.chat_input 사용으로 무한루프 방지)
-    user_input = st.chat_input("메시지를 입력하세요...")
+    # rerun으로 끊긴 채팅 작업이 있으면 다시 연결 (끝나면 저장 후 rerun)
+    if st.session_state.chat_job is not None:
+        follow_chat_job(chat_container)
     
     if user_input:
         # 사용자 메시지 추가
         st.session_state.messages.append({"role": "user", "content": user_input})
         
-        # talk_seq 계산
-        talk_seq = get_next_talk_seq(st.session_state.subject_seq)
-        print(f"[DEBUG] 사용자 입력 - talk_seq: {talk_seq}")
-        
-        # 사용자 입력 DB 저장
-        save_conversation(
-            st.session_state.topic,
-            st.session_state.subject_seq,
-            talk_seq,
-            'Q',
-            user_input
-        )
+        # 응답 시간 측정 (DB/컨텍스트·팀 구성/팀장별 TTFT·토큰 속도/도구/표시)
+        perf_timer = start_run("index3", "chat", user=username or "", label=st.session_state.topic[:30])
         
         # 토론 컨텍스트 구성
         context_parts = []
@@ -990,20 +1092,22 @@ if st.session_state.is_chat_started:
         if st.session_state.discussion_content.strip():
             context_parts.append(f"토론의 관점과 포인트: {st.session_state.discussion_content}")
         
-        # 대화 이력 추가
+        # 대화 이력 (현재 질문은 응답과 함께 마지막에 저장)
         conversation_history = get_conversation_history(st.session_state.subject_seq)
-        if conversation_history:
-            history_text = "\n이전 대화 이력:\n"
-            for from_to, content in conversation_history:
-                speaker = "사용자" if from_to == "Q" else "AI 팀"
-                history_text += f"{speaker}: {content}\n"
-            context_parts.append(history_text)
         
-        # 현재 질문 추가
-        context_parts.append(f"현재 질문: {user_input}")
+        # 토큰 예산 안에서 최근 대화 원문 + 오래된 대화 요약 + 현재 질문으로 구성 (요약은 토론별로 유지)
+        summary_state = st.session_state.setdefault("chat_summaries", {}).setdefault(st.session_state.subject_seq, {})
+        with perf_span("prompt"):
+            full_context = ChatContextBuilder(summary_state).build(
+                context_parts, conversation_history, user_input, recent_in_session=CHAT_AGNO_HISTORY
+            )
+        # 캐시 배치에서는 날짜를 맨 끝에
+        if PROMPT_CACHE_LAYOUT:
+            full_context = append_current_date(full_context)
         
-        # 전체 컨텍스트 구성
-        full_context = "\n\n".join(context_parts)
+        # 질문은 먼저 저장 (응답 중 rerun/세션 종료가 있어도 남도록, 답변은 작업이 끝난 뒤 저장)
+        with perf_span("db"):
+            save_turn(st.session_state.topic, st.session_state.subject_seq, user_input)
         
         # Agno 팀 생성 및 실행
         if not st.session_state.participant_order:
@@ -1012,46 +1116,54 @@ if st.session_state.is_chat_started:
             try:
                 # 팀장 정보 가져오기
                 team_leads = get_team_leads()
+                # 사용 한도 확인 (초과 시 막거나 낮은 모델로)
+                model_id = budget_model(st.session_state.storage, username or "", TEAM_MODEL_ID)
                 if not team_leads:
                     st.error("❌ 팀장 정보가 없습니다. 'DB초기화' 버튼을 눌러주세요!")
+                elif model_id is None:
+                    st.session_state["chat_notice"] = budget_message(username or "")
                 else:
-                    with st.spinner("AI 팀이 토론 중입니다..."):
-                        # Agno 팀 생성
-                        team = create_team_from_leads(
-                            team_leads,
+                    if model_id != TEAM_MODEL_ID:
+                        st.warning(f"사용 한도를 넘어 {model_id} 모델로 진행합니다.")
+                    # Agno 팀 준비 (풀에 같은 구성이 있으면 재사용)
+                    with perf_span("prompt"):
+                        team_key, team = acquire_team(
                             st.session_state.participant_order,
                             st.session_state.team_mode,
-                            st.session_state.reasoning_depth
+                            st.session_state.reasoning_depth,
+                            model_id=model_id
+                        )
+                    
+                    if not team.members:
+                        get_team_pool().release(team_key, team)
+                        st.error("❌ 유효한 팀 멤버가 없습니다. 참석자 정보를 확인해주세요!")
+                    else:
+                        # 스케줄러에 등록 (Team 반납은 실행이 끝난 뒤 작업 스레드에서)
+                        meter = UsageMeter("index3", username or "", model_id,
+                                           get_usage_stream_id(st.session_state.subject_seq),
+                                           st.session_state.subject_seq)
+                        job = submit_chat_job(
+                            team_key, team, full_context,
+                            session_id=get_chat_session_id(st.session_state.subject_seq),
+                            meter=meter
                         )
                         
-                        if not team.members:
-                            st.error("❌ 유효한 팀 멤버가 없습니다. 참석자 정보를 확인해주세요!")
-                        else:
-                            # 스트리밍 응답 처리
-                            ai_response = ""
-                            
-                            # 실시간 스트리밍 없이 전체 응답 받기
-                            for chunk in run_team_debate_stream(team, full_context):
-                                ai_response += chunk
-                            
-                            # AI 응답 추가
-                            st.session_state.messages.append({"role": "assistant", "content": ai_response})
-                            
-                            # AI 응답 DB 저장 (새로운 talk_seq 계산)
-                            ai_talk_seq = get_next_talk_seq(st.session_state.subject_seq)
-                            print(f"[DEBUG] AI 응답 - talk_seq: {ai_talk_seq}")
-                            save_conversation(
-                                st.session_state.topic,
-                                st.session_state.subject_seq,
-                                ai_talk_seq,
-                                'A',
-                                ai_response
-                            )
+                        # 작업 id를 세션에 보관 → 표시 중 rerun되어도 다음 실행에서 다시 연결해 답변 저장
+                        st.session_state.chat_job = {
+                            "id": job.id,
+                            "question": user_input,
+                            "subject_seq": st.session_state.subject_seq,
+                            "topic": st.session_state.topic,
+                            "perf": perf_timer,
+                        }
+                        follow_chat_job(chat_container, show_question=True)
             
             except Exception as e:
-                st.error(f"❌ 토론 실행 중 오류가 발생했습니다: {str(e)}")
+                st.session_state["chat_notice"] = f"❌ 토론 실행 중 오류가 발생했습니다: {str(e)}"
                 print(f"[ERROR] Agno team execution failed: {e}")
         
+        finish_run(perf_timer)
+        
         # 페이지 새로고침 (st.chat_input은 자동으로 초기화되므로 무한루프 없음)
         st.rerun()
 
@@ -0,0 +1,296 @@
+import os
+import time
+import itertools
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+import streamlit as st
+
+# 동시에 실행할 Team 작업 수(전체/사용자별), UI 폴링 간격(초), 끝난 작업 보관 시간(초)
+MEETING_JOB_WORKERS = int(os.getenv("MEETING_JOB_WORKERS", "4"))
+MEETING_JOBS_PER_USER = int(os.getenv("MEETING_JOBS_PER_USER", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.25"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "3600"))
+
+# 우선순위 (작을수록 먼저) - 채팅 한 턴은 긴 회의보다 먼저 자리를 받음
+PRIORITY_INTERACTIVE = 0
+PRIORITY_MEETING = 10
+
+# 완료 기록이 없을 때 쓰는 예상 소요 시간(초)
+DEFAULT_JOB_SECONDS = {PRIORITY_INTERACTIVE: 60.0, PRIORITY_MEETING: 240.0}
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+JOB_CANCELLED = "cancelled"
+JOB_FINISHED = (JOB_DONE, JOB_ERROR, JOB_CANCELLED)
+
+
+class Job:
+    """
+    백그라운드 작업 하나 (회의 실행 등)
+    - 작업 스레드가 만들어낸 이벤트를 순서대로 쌓아 두는 버퍼를 가짐
+    - UI는 cursor(이미 본 개수) 이후의 이벤트만 읽어 감 → rerun되면 0부터 다시 읽어 화면 복원
+    """
+
+    def __init__(self, label: str = "", user: str = "", priority: int = PRIORITY_MEETING):
+        self.id = uuid4().hex
+        self.label = label
+        self.user = user
+        self.priority = priority
+        self.seq = 0
+        self.status = JOB_QUEUED
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._events: List = []
+        self._cond = threading.Condition()
+        self._cancel = threading.Event()
+        self._source: Optional[Callable[[], Iterable]] = None
+        self._cleanup: Optional[Callable[[], None]] = None
+
+    # ---------- 작업 스레드 쪽 ----------
+    def _set_status(self, status: str, error: Optional[str] = None):
+        with self._cond:
+            self.status = status
+            if status == JOB_RUNNING:
+                self.started_at = time.time()
+            elif status in JOB_FINISHED:
+                self.finished_at = time.time()
+                self.error = error
+            self._cond.notify_all()
+
+    def _append(self, event):
+        with self._cond:
+            self._events.append(event)
+            self._cond.notify_all()
+
+    # ---------- UI 쪽 ----------
+    @property
+    def finished(self) -> bool:
+        return self.status in JOB_FINISHED
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """중단 요청 (작업 스레드는 다음 이벤트 사이에서 멈춤)"""
+        self._cancel.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def events_since(self, cursor: int) -> Tuple[List, int]:
+        with self._cond:
+            events = self._events[cursor:]
+            return events, cursor + len(events)
+
+    def wait(self, cursor: int, timeout: float = JOB_POLL_INTERVAL) -> bool:
+        """새 이벤트가 생기거나 작업이 끝날 때까지 최대 timeout초 대기"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: len(self._events) > cursor or self.finished,
+                timeout=timeout,
+            )
+
+    def __repr__(self) -> str:
+        return (f"Job(id={self.id!r}, label={self.label!r}, user={self.user!r}, "
+                f"priority={self.priority!r}, status={self.status!r}, events={len(self._events)})")
+
+
+class JobManager:
+    """
+    스레드 풀 기반 백그라운드 실행기 + 스케줄러
+    - Streamlit 스크립트 스레드와 분리되어 rerun/재접속에도 실행이 이어짐
+    - 전체 동시 실행 수와 사용자별 동시 실행 수를 제한하고, 나머지는 대기열에 둠
+    - 대기열 순서: 우선순위 → 현재 실행 중인 작업이 적은 사용자 → 먼저 온 순서
+    - Agno Team 객체는 피클링이 안 되므로 프로세스 풀이 아닌 스레드 풀 사용
+    """
+
+    def __init__(self, workers: int = MEETING_JOB_WORKERS, per_user: int = MEETING_JOBS_PER_USER,
+                 retention: float = JOB_RETENTION):
+        self.workers = workers
+        self.per_user = per_user
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="meeting-job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._pending: List[Job] = []
+        self._running: Dict[str, Job] = {}
+        self._running_by_user: Dict[str, int] = defaultdict(int)
+        self._seq = itertools.count(1)
+        # 우선순위별 평균 소요 시간 (지수이동평균, ETA 계산용)
+        self._avg_seconds: Dict[int, float] = dict(DEFAULT_JOB_SECONDS)
+
+    def submit(self, source: Callable[[], Iterable], cleanup: Optional[Callable[[], None]] = None,
+               label: str = "", user: str = "", priority: int = PRIORITY_MEETING) -> Job:
+        """
+        source()가 내놓는 이벤트를 작업 버퍼에 쌓는 작업 등록 (자리가 없으면 대기열에서 기다림)
+        - cleanup은 성공/실패/중단(대기 중 취소 포함)과 관계없이 마지막에 한 번 호출
+        """
+        self._purge()
+        job = Job(label, user, priority)
+        job._source, job._cleanup = source, cleanup
+        with self._lock:
+            job.seq = next(self._seq)
+            self._jobs[job.id] = job
+            self._pending.append(job)
+        self._dispatch()
+        return job
+
+    # ---------- 스케줄링 ----------
+    def _order_key(self, job: Job) -> Tuple:
+        return (job.priority, self._running_by_user[job.user], job.seq)
+
+    def _dispatch(self):
+        """빈 자리만큼 대기열에서 꺼내 실행 (사용자별 한도를 넘는 작업은 건너뜀)"""
+        started = []
+        with self._lock:
+            while len(self._running) < self.workers:
+                eligible = [job for job in self._pending if self._running_by_user[job.user] < self.per_user]
+                if not eligible:
+                    break
+                job = min(eligible, key=self._order_key)
+                self._pending.remove(job)
+                self._running[job.id] = job
+                self._running_by_user[job.user] += 1
+                started.append(job)
+        for job in started:
+            self._executor.submit(self._run, job)
+
+    def _run(self, job: Job):
+        try:
+            if job.cancelled:
+                job._set_status(JOB_CANCELLED)
+                return
+            job._set_status(JOB_RUNNING)
+            for event in job._source():
+                if job.cancelled:
+                    break
+                job._append(event)
+            job._set_status(JOB_CANCELLED if job.cancelled else JOB_DONE)
+        except Exception as e:
+            print(f"[ERROR] 백그라운드 작업 실패 ({job.label}): {e}")
+            job._set_status(JOB_ERROR, str(e))
+        finally:
+            self._finish(job)
+            self._dispatch()
+
+    def _finish(self, job: Job):
+        with self._lock:
+            if self._running.pop(job.id, None) is not None:
+                self._running_by_user[job.user] -= 1
+                if self._running_by_user[job.user] <= 0:
+                    del self._running_by_user[job.user]
+            if job.status == JOB_DONE and job.started_at:
+                took = job.finished_at - job.started_at
+                avg = self._avg_seconds.get(job.priority, took)
+                self._avg_seconds[job.priority] = 0.8 * avg + 0.2 * took
+        cleanup, job._cleanup, job._source = job._cleanup, None, None
+        if cleanup is not None:
+            try:
+                cleanup()
+            except Exception as e:
+                print(f"[ERROR] 작업 정리 실패 ({job.label}): {e}")
+
+    def queue_position(self, job: Job) -> Tuple[int, float]:
+        """
+        대기 중인 작업의 (앞에 있는 작업 수, 예상 대기 시간(초))
+        - ETA는 앞선 작업 수를 동시 실행 수로 나눈 '차례' × 평균 소요 시간으로 어림
+        """
+        with self._lock:
+            if job.status != JOB_QUEUED or job not in self._pending:
+                return 0, 0.0
+            ahead = sorted(self._pending, key=self._order_key).index(job)
+            now = time.time()
+            # 가장 먼저 끝날 것으로 보이는 실행 중 작업의 남은 시간
+            remaining = [
+                max(self._avg_seconds.get(running.priority, 0.0) - (now - (running.started_at or now)), 0.0)
+                for running in self._running.values()
+            ]
+            first_slot = min(remaining) if len(remaining) >= self.workers else 0.0
+            avg = self._avg_seconds.get(job.priority, DEFAULT_JOB_SECONDS[PRIORITY_MEETING])
+            return ahead, first_slot + (ahead // self.workers) * avg
+
+    # ---------- 조회/정리 ----------
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id: Optional[str]):
+        """결과를 가져간 작업 제거 (실행 중이면 중단 요청, 대기 중이면 바로 취소)"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None) if job_id else None
+            queued = job is not None and job in self._pending
+            if queued:
+                self._pending.remove(job)
+        if job is None or job.finished:
+            return
+        job.cancel()
+        if queued:
+            job._set_status(JOB_CANCELLED)
+            self._finish(job)
+
+    def _purge(self):
+        """보관 시간이 지난 끝난 작업 정리 (결과를 가져가지 않고 떠난 세션 대비)"""
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished and now - (job.finished_at or now) > self.retention
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+            stats = {"pending": len(self._pending), "running": len(self._running),
+                     "workers": self.workers, "per_user": self.per_user}
+        for status in (JOB_DONE, JOB_ERROR, JOB_CANCELLED):
+            stats[status] = sum(1 for job in jobs if job.status == status)
+        return stats
+
+
+def format_job_wait(manager: JobManager, job: Job) -> str:
+    """대기 중이면 대기열 순번/예상 대기 시간, 실행 중이면 경과 시간 (한 줄)"""
+    if job.status == JOB_QUEUED:
+        ahead, eta = manager.queue_position(job)
+        minutes, seconds = divmod(int(eta), 60)
+        eta_text = f"{minutes}분 {seconds}초" if minutes else f"{seconds}초"
+        return f"⏳ 대기열 {ahead + 1}번째 · 예상 대기 약 {eta_text}"
+    elapsed = int(time.time() - (job.started_at or job.created_at))
+    return f"⏱️ {elapsed}초"
+
+
+def follow_job(job: Job, on_idle: Optional[Callable[[Job], None]] = None) -> Iterator:
+    """
+    작업 버퍼의 이벤트를 처음부터 순서대로 내놓음 (작업이 끝날 때까지)
+    - 새 이벤트가 없으면 잠깐 기다린 뒤 on_idle(job) 호출 (대기열/경과 시간 표시 등)
+    """
+    cursor = 0
+    while True:
+        # 종료 여부를 먼저 보고 버퍼를 읽어야 마지막 이벤트를 놓치지 않음
+        finished = job.finished
+        events, cursor = job.events_since(cursor)
+        yield from events
+        if events:
+            continue
+        if finished:
+            return
+        job.wait(cursor)
+        if on_idle is not None:
+            on_idle(job)
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_manager() -> JobManager:
+    """프로세스 공용 작업 실행기"""
+    return JobManager()
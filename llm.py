@@ -0,0 +1,264 @@
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Generator, List, Optional, Tuple
+
+import httpx
+import openai
+import streamlit as st
+
+from llm_cache import get_completion_cache, make_completion_key, replay_text
+
+# OpenAI 호출(Agno 팀 + 직접 호출)이 함께 쓰는 HTTP 커넥션 풀 설정
+OPENAI_HTTP_MAX_CONNECTIONS = int(os.getenv("OPENAI_HTTP_MAX_CONNECTIONS", "20"))
+OPENAI_HTTP_MAX_KEEPALIVE = int(os.getenv("OPENAI_HTTP_MAX_KEEPALIVE", "10"))
+OPENAI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_HTTP_KEEPALIVE_EXPIRY", "60"))
+OPENAI_HTTP_CONNECT_TIMEOUT = float(os.getenv("OPENAI_HTTP_CONNECT_TIMEOUT", "10"))
+OPENAI_HTTP_READ_TIMEOUT = float(os.getenv("OPENAI_HTTP_READ_TIMEOUT", "600"))
+OPENAI_HTTP_POOL_TIMEOUT = float(os.getenv("OPENAI_HTTP_POOL_TIMEOUT", "30"))
+
+# 프롬프트 캐시 친화 배치 - 매번 같은 부분(페르소나/지침)을 앞에, 바뀌는 부분(이력/입력/날짜)을 뒤에
+PROMPT_CACHE_LAYOUT = os.getenv("PROMPT_CACHE_LAYOUT", "true").lower() in ("1", "true", "yes", "on")
+
+
+# ======================== 공용 HTTP 클라이언트 ========================
+
+class HttpPoolStats:
+    """공용 HTTP 클라이언트 사용 통계 (요청 수, 새 TCP 연결/TLS 핸드셰이크 수)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.tcp_connects = 0
+        self.tls_handshakes = 0
+
+    def _trace(self, event_name: str, info: Dict):
+        # httpcore trace 확장 - 새 연결이 만들어질 때만 호출됨 (재사용 시에는 없음)
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.tcp_connects += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def on_request(self, request: httpx.Request):
+        with self._lock:
+            self.requests += 1
+        request.extensions.setdefault("trace", self._trace)
+
+    def on_response(self, response: httpx.Response):
+        if response.status_code >= 400:
+            with self._lock:
+                self.errors += 1
+
+
+class SharedHttpClient(httpx.Client):
+    """
+    프로세스 공용 httpx 클라이언트
+    - Agno가 모델 설정을 deepcopy해도 같은 커넥션 풀을 그대로 가리키도록 함
+    """
+
+    def __init__(self, **kwargs):
+        self.pool_stats = HttpPoolStats()
+        kwargs["event_hooks"] = {
+            "request": [self.pool_stats.on_request],
+            "response": [self.pool_stats.on_response],
+        }
+        super().__init__(**kwargs)
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+@st.cache_resource(show_spinner=False)
+def get_http_client() -> SharedHttpClient:
+    """keep-alive 커넥션 풀을 가진 공용 HTTP 클라이언트 (OpenAI SDK/Agno에 주입)"""
+    return SharedHttpClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=OPENAI_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            OPENAI_HTTP_READ_TIMEOUT,
+            connect=OPENAI_HTTP_CONNECT_TIMEOUT,
+            pool=OPENAI_HTTP_POOL_TIMEOUT,
+        ),
+    )
+
+
+def http_pool_stats() -> Dict[str, int]:
+    """공용 HTTP 클라이언트의 요청/연결 통계와 현재 풀 상태"""
+    client = get_http_client()
+    stats = client.pool_stats
+    # httpx 내부 커넥션 풀 (버전에 따라 없을 수 있음)
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return {
+        "requests": stats.requests,
+        "errors": stats.errors,
+        "tcp_connects": stats.tcp_connects,
+        "tls_handshakes": stats.tls_handshakes,
+        "reused": max(stats.requests - stats.tcp_connects, 0),
+        "connections": len(connections),
+        "idle": idle,
+        "max_connections": OPENAI_HTTP_MAX_CONNECTIONS,
+    }
+
+
+# ======================== 프롬프트 캐시 ========================
+
+def append_current_date(message: str) -> str:
+    """
+    날짜를 지침(앞부분)이 아닌 메시지 끝에 붙임
+    - 지침에 시각이 들어가면 호출마다 앞부분이 달라져 프롬프트 캐시가 적중하지 않음
+    """
+    return f"{message}\n\n(오늘 날짜: {datetime.now().strftime('%Y-%m-%d')})"
+
+
+def usage_cached_tokens(usage: Optional[Dict]) -> Tuple[int, int]:
+    """OpenAI usage → (입력 토큰, 그중 캐시 적중 토큰)"""
+    usage = usage or {}
+    details = usage.get("prompt_tokens_details") or {}
+    return usage.get("prompt_tokens", 0) or 0, details.get("cached_tokens", 0) or 0
+
+
+# ======================== OpenAI 직접 호출 ========================
+
+def get_openai_api_key() -> Optional[str]:
+    """OpenAI API 키 (환경변수 우선, 없으면 Streamlit secrets - secrets.toml이 없으면 None)"""
+    key = os.getenv('OPENAI_API_KEY')
+    if key:
+        return key
+    try:
+        return st.secrets.get('OPENAI_API_KEY')
+    except Exception:
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def get_openai_client(api_key: str) -> openai.OpenAI:
+    """API 키당 프로세스에서 하나의 OpenAI 클라이언트를 공유 (호출마다 새로 만들지 않음)"""
+    return openai.OpenAI(api_key=api_key, http_client=get_http_client())
+
+
+class ChatCompletionResult:
+    """스트리밍 완료 후 결과 (전체 텍스트 + 사용량/시간)"""
+
+    __slots__ = ('text', 'model', 'usage', 'ttft', 'elapsed', 'finish_reason', 'error', 'cached')
+
+    def __init__(self, text: str = "", model: str = "", usage: Optional[Dict] = None,
+                 ttft: Optional[float] = None, elapsed: float = 0.0,
+                 finish_reason: Optional[str] = None, error: bool = False, cached: bool = False):
+        self.text = text
+        self.model = model
+        self.usage = usage or {}
+        self.ttft = ttft                  # 첫 토큰까지 걸린 시간(초)
+        self.elapsed = elapsed            # 전체 소요 시간(초)
+        self.finish_reason = finish_reason
+        self.error = error
+        self.cached = cached              # 캐시에서 재생한 응답인지
+
+    @property
+    def cached_tokens(self) -> int:
+        """OpenAI 프롬프트 캐시에 적중한 입력 토큰 수"""
+        return usage_cached_tokens(self.usage)[1]
+
+    def __repr__(self) -> str:
+        return (f"ChatCompletionResult(model={self.model!r}, chars={len(self.text)}, "
+                f"usage={self.usage!r}, ttft={self.ttft!r}, elapsed={self.elapsed:.2f}, cached={self.cached!r})")
+
+
+def _usage_to_dict(usage) -> Dict:
+    if usage is None:
+        return {}
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump(exclude_none=True)
+    return dict(usage)
+
+
+def stream_chat_completion(messages: List[Dict], model: str = "gpt-4o",
+                           max_tokens: int = 2000, temperature: float = 0.7,
+                           client: Optional[openai.OpenAI] = None, use_cache: bool = True
+                           ) -> Generator[str, None, ChatCompletionResult]:
+    """
+    Chat Completions 스트리밍 제너레이터
+    - 텍스트 조각(delta)을 도착하는 대로 yield
+    - 끝나면 ChatCompletionResult를 return (StopIteration.value, consume_chat_stream 참고)
+    - 완성 응답 캐시가 켜져 있고 use_cache면 같은 요청의 저장된 응답을 조각으로 재생
+    """
+    started = time.perf_counter()
+    cache = get_completion_cache()
+    cache_key = None
+    if cache.enabled and use_cache:
+        cache_key = make_completion_key(model, messages, {"max_tokens": max_tokens, "temperature": temperature})
+        cached = cache.get(cache_key)
+        if cached is not None:
+            result = ChatCompletionResult(cached["text"], model, cached.get("usage"),
+                                          finish_reason=cached.get("finish_reason"), cached=True)
+            for piece in replay_text(result.text):
+                if result.ttft is None:
+                    result.ttft = time.perf_counter() - started
+                yield piece
+            result.elapsed = time.perf_counter() - started
+            return result
+
+    if client is None:
+        api_key = get_openai_api_key()
+        if not api_key:
+            message = "❌ OpenAI API 키가 설정되지 않았습니다. 환경변수 OPENAI_API_KEY를 설정해주세요."
+            yield message
+            return ChatCompletionResult(message, model, error=True)
+        client = get_openai_client(api_key)
+
+    pieces: List[str] = []
+    result = ChatCompletionResult(model=model)
+    try:
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream_options={"include_usage": True},   # 마지막 청크에 usage 포함
+        )
+        for chunk in response:
+            # 마지막 usage 청크는 choices가 비어 있음
+            if getattr(chunk, "usage", None) is not None:
+                result.usage = _usage_to_dict(chunk.usage)
+            if not getattr(chunk, "choices", None):
+                continue
+            choice = chunk.choices[0]
+            if choice.finish_reason:
+                result.finish_reason = choice.finish_reason
+            piece = getattr(choice.delta, "content", None) if choice.delta else None
+            if piece:
+                if result.ttft is None:
+                    result.ttft = time.perf_counter() - started
+                pieces.append(piece)
+                yield piece
+    except Exception as e:
+        message = f"❌ 오류가 발생했습니다: {str(e)}"
+        pieces.append(message)
+        result.error = True
+        yield message
+
+    result.text = "".join(pieces)
+    result.elapsed = time.perf_counter() - started
+    # 정상적으로 끝난 응답만 저장 (오류/잘림은 다시 요청하도록)
+    if cache_key is not None and not result.error and result.finish_reason == "stop":
+        cache.put(cache_key, model, {"text": result.text, "usage": result.usage,
+                                     "finish_reason": result.finish_reason})
+    return result
+
+
+def consume_chat_stream(stream: Generator[str, None, ChatCompletionResult], write) -> ChatCompletionResult:
+    """스트림의 각 조각을 write(조각)으로 넘기고 최종 결과 반환"""
+    while True:
+        try:
+            write(next(stream))
+        except StopIteration as stop:
+            return stop.value
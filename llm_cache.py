@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+import streamlit as st
+from agno.models.openai import OpenAIChat
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+# 완성 응답 캐시 (기본 꺼짐) - 같은 프롬프트/모델/파라미터면 저장된 응답을 스트림처럼 재생
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() in ("1", "true", "yes", "on")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# 캐시 재생 시 한 번에 내보낼 글자 수
+LLM_CACHE_REPLAY_CHARS = int(os.getenv("LLM_CACHE_REPLAY_CHARS", "24"))
+
+
+def make_completion_key(model: str, messages: List[Dict], params: Optional[Dict] = None) -> str:
+    """메시지 + 모델 + 요청 파라미터 전체를 해시한 캐시 키"""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params or {}},
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    LLM 완성 응답 저장소 (SQLite)
+    - 전체 크기가 max_bytes를 넘으면 가장 오래 안 쓴 항목부터 삭제 (LRU)
+    - 값은 JSON 문자열 (직접 호출: 텍스트+usage, Agno: ChatCompletion/청크 목록)
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 enabled: bool = LLM_CACHE_ENABLED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)")
+        self._conn.commit()
+
+    def __deepcopy__(self, memo):
+        # Agno가 모델 설정을 복사해도 같은 저장소를 공유
+        return self
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, model: str, value: Any):
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, value, size, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, data, size, now, now),
+            )
+            self.stores += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """전체 크기가 한도를 넘으면 오래 안 쓴 순서로 삭제 (한도의 90%까지)"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used"):
+            victims.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": size,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_completion_cache() -> CompletionCache:
+    """프로세스 공용 완성 응답 캐시"""
+    return CompletionCache()
+
+
+def replay_text(text: str, size: int = LLM_CACHE_REPLAY_CHARS) -> Iterator[str]:
+    """저장된 응답을 스트리밍과 같은 모양(작은 조각)으로 재생"""
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+# ======================== Agno 모델 ========================
+
+def _without_usage(data: Dict) -> Dict:
+    """재생용 응답/청크에서 usage 제거 - API 호출이 없으므로 Agno 지표(사용량/비용)에 잡히지 않게 함"""
+    return {k: v for k, v in data.items() if k != "usage"}
+
+
+@dataclass
+class CachedOpenAIChat(OpenAIChat):
+    """
+    완성 응답 캐시를 쓰는 OpenAIChat
+    - 메시지/도구/요청 파라미터가 모두 같을 때만 저장된 응답(또는 스트림 청크)을 그대로 재생
+    - 재생할 때는 usage를 빼서 토큰/비용을 기록하지 않음 (직접 호출의 add_completion과 같은 기준)
+    """
+
+    completion_cache: Optional[CompletionCache] = None
+
+    def _cache_key(self, messages, response_format=None, tools=None, tool_choice=None, stream=False) -> str:
+        params = self.get_request_params(response_format=response_format, tools=tools, tool_choice=tool_choice)
+        params = {k: v for k, v in params.items() if k not in ("extra_headers", "extra_query")}
+        params["stream"] = stream
+        return make_completion_key(self.id, [self._format_message(m) for m in messages], params)
+
+    def _active_cache(self) -> Optional[CompletionCache]:
+        cache = self.completion_cache
+        return cache if cache is not None and cache.enabled else None
+
+    def invoke(self, messages, response_format=None, tools=None, tool_choice=None) -> ChatCompletion:
+        cache = self._active_cache()
+        if cache is None:
+            return super().invoke(messages, response_format=response_format, tools=tools, tool_choice=tool_choice)
+        key = self._cache_key(messages, response_format, tools, tool_choice)
+        cached = cache.get(key)
+        if cached is not None:
+            return ChatCompletion.model_validate(_without_usage(cached))
+        response = super().invoke(messages, response_format=response_format, tools=tools, tool_choice=tool_choice)
+        cache.put(key, self.id, response.model_dump(mode="json", exclude_none=True))
+        return response
+
+    def invoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> Iterator[ChatCompletionChunk]:
+        cache = self._active_cache()
+        if cache is None:
+            yield from super().invoke_stream(messages, response_format=response_format, tools=tools, tool_choice=tool_choice)
+            return
+        key = self._cache_key(messages, response_format, tools, tool_choice, stream=True)
+        cached = cache.get(key)
+        if cached is not None:
+            for chunk in cached:
+                yield ChatCompletionChunk.model_validate(_without_usage(chunk))
+            return
+        chunks = []
+        for chunk in super().invoke_stream(messages, response_format=response_format, tools=tools, tool_choice=tool_choice):
+            chunks.append(chunk.model_dump(mode="json", exclude_none=True))
+            yield chunk
+        # 끝까지 받은 스트림만 저장 (중간에 끊기면 예외/GeneratorExit로 여기까지 오지 않음)
+        cache.put(key, self.id, chunks)
+
+
+def make_team_model(model_id: str, http_client=None) -> OpenAIChat:
+    """Team/Agent용 모델 (캐시가 켜져 있으면 CachedOpenAIChat)"""
+    cache = get_completion_cache()
+    if cache.enabled:
+        return CachedOpenAIChat(id=model_id, http_client=http_client, completion_cache=cache)
+    return OpenAIChat(id=model_id, http_client=http_client)
@@ -0,0 +1,440 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterable, Iterator, List, Optional
+
+import streamlit as st
+
+from team_events import MemberContent, LeaderContent, MemberStarted, MemberFinished, ToolResult, RunMetrics
+
+# 실행(회의/채팅 한 턴)별 구간 시간 기록 - false면 측정/저장 모두 하지 않음
+PERF_METRICS_ENABLED = os.getenv("PERF_METRICS_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+# 실행 기록을 한 줄씩 덧붙이는 파일 (JSON Lines), 비우면 저장하지 않음
+PERF_METRICS_PATH = os.getenv("PERF_METRICS_PATH", os.path.join(".cache", "perf_metrics.jsonl"))
+# Prometheus 텍스트 형식 파일 (node_exporter textfile collector 등), 비우면 쓰지 않음
+PERF_METRICS_PROM_PATH = os.getenv("PERF_METRICS_PROM_PATH", "")
+# p50/p95 계산에 쓰는 최근 실행 수 (시작 시 JSONL 끝부분에서 다시 채움)
+PERF_METRICS_WINDOW = int(os.getenv("PERF_METRICS_WINDOW", "200"))
+
+# 구간 이름 (패널/내보내기 표시 순서)
+SPAN_NAMES = ("db", "prompt", "llm", "render", "total")
+SPAN_LABELS = {"db": "DB", "prompt": "프롬프트/팀 구성", "llm": "모델 응답", "render": "화면 표시", "total": "전체"}
+LEADER = "리더"
+
+_current_run: contextvars.ContextVar = contextvars.ContextVar("perf_run", default=None)
+
+
+def _first(value) -> Optional[float]:
+    """Agno 지표 값 (리스트면 합계)"""
+    if isinstance(value, list):
+        values = [v for v in value if isinstance(v, (int, float))]
+        return float(sum(values)) if values else None
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+class AgentTiming:
+    """에이전트(팀장/리더/본부장) 하나의 응답 시간"""
+
+    __slots__ = ('started', 'first_token', 'last_token', 'chunks', 'output_tokens')
+
+    def __init__(self, started: float):
+        self.started = started
+        self.first_token: Optional[float] = None
+        self.last_token: Optional[float] = None
+        self.chunks = 0
+        self.output_tokens: Optional[int] = None
+
+    def to_dict(self, run_started: float) -> Dict:
+        ttft = self.first_token - self.started if self.first_token is not None else None
+        duration = (self.last_token - self.first_token) if self.first_token is not None else None
+        tokens = self.output_tokens if self.output_tokens else self.chunks
+        return {
+            "ttft": round(ttft, 3) if ttft is not None else None,
+            # 실행 시작부터 첫 토큰까지 (순차 위임에서는 앞 팀장 시간이 포함됨)
+            "first_token_at": round(self.first_token - run_started, 3) if self.first_token is not None else None,
+            "duration": round(duration, 3) if duration is not None else None,
+            "tokens": tokens,
+            # 한 번에 몰아서 도착한 경우(캐시 적중 등)는 속도 계산에서 제외
+            "tokens_per_sec": round(tokens / duration, 1) if duration and duration >= 0.05 and tokens else None,
+        }
+
+
+class RunTimer:
+    """
+    실행 하나의 구간 시간 (DB/프롬프트/모델 응답/화면 표시) + 에이전트별 TTFT·토큰 속도 + 도구 시간
+    - span(): 같은 이름은 누적 (여러 번 조회한 DB 시간 합계 등), 안쪽 구간 시간은 바깥 구간에서 뺌
+    - Team 이벤트는 observe_events로 작업 스레드에서 기록, 화면 표시 시간은 스크립트 스레드에서 기록
+    """
+
+    def __init__(self, app: str, kind: str, user: str = "", label: str = ""):
+        self.app = app
+        self.kind = kind
+        self.user = user
+        self.label = label
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.agents: Dict[str, AgentTiming] = {}
+        self.tools: List[Dict] = []
+        self.members: Dict[str, Dict] = {}
+        self.finished = False
+        self._lock = threading.Lock()
+        # 열린 구간별 안쪽 구간 시간 합계 (span은 스크립트 스레드에서만 사용)
+        self._stack: List[List[float]] = []
+
+    # ---------- 구간 ----------
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    @contextmanager
+    def span(self, name: str):
+        nested = [0.0]
+        self._stack.append(nested)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][0] += elapsed
+            self.add(name, elapsed - nested[0])
+
+    # ---------- 에이전트 ----------
+    def _agent(self, who: str, now: float) -> AgentTiming:
+        agent = self.agents.get(who)
+        if agent is None:
+            agent = self.agents[who] = AgentTiming(now)
+        return agent
+
+    def agent_started(self, who: str):
+        with self._lock:
+            self._agent(who, time.perf_counter())
+
+    def agent_chunk(self, who: str):
+        now = time.perf_counter()
+        with self._lock:
+            agent = self._agent(who, now)
+            if agent.first_token is None:
+                agent.first_token = now
+            agent.last_token = now
+            agent.chunks += 1
+
+    def add_completion(self, who: str, result, render_seconds: float = 0.0):
+        """
+        직접 호출 결과(ChatCompletionResult) → TTFT/출력 토큰/모델 응답 시간
+        - 스트림을 읽는 사이 화면에 그린 시간(render_seconds)은 모델 응답 시간에서 뺌
+        """
+        with self._lock:
+            started = time.perf_counter() - result.elapsed
+            agent = self.agents[who] = AgentTiming(started)
+            if result.ttft is not None:
+                agent.first_token = started + result.ttft
+                agent.last_token = started + result.elapsed
+            agent.output_tokens = (result.usage or {}).get("completion_tokens")
+            self.spans["llm"] = self.spans.get("llm", 0.0) + max(result.elapsed - render_seconds, 0.0)
+
+    def observe(self, event):
+        """Team 이벤트 하나 기록 (리더/팀장 발화, 도구 완료, Agno 지표)"""
+        if isinstance(event, MemberStarted):
+            self.agent_started(event.member)
+        elif isinstance(event, MemberContent):
+            self.agent_chunk(event.member)
+        elif isinstance(event, LeaderContent):
+            self.agent_chunk(LEADER)
+        elif isinstance(event, ToolResult):
+            with self._lock:
+                self.tools.append({"member": event.member or LEADER, "tool": event.tool_name,
+                                   "duration": round(event.duration, 3) if event.duration is not None else None,
+                                   "error": event.error})
+        elif isinstance(event, MemberFinished):
+            self._member_metrics(event.member, event.metrics)
+        elif isinstance(event, RunMetrics):
+            self._member_metrics(LEADER, event.metrics)
+            for member, metrics in event.member_metrics.items():
+                self._member_metrics(member, metrics)
+
+    def _member_metrics(self, who: str, metrics: Dict):
+        """Agno 실행 지표 (time, time_to_first_token, output_tokens)"""
+        if not metrics:
+            return
+        values = {
+            "time": _first(metrics.get("time")),
+            "ttft": _first(metrics.get("time_to_first_token")),
+            "output_tokens": _first(metrics.get("output_tokens")),
+        }
+        with self._lock:
+            self.members[who] = {k: round(v, 3) for k, v in values.items() if v is not None}
+            if values["output_tokens"] and who in self.agents:
+                self.agents[who].output_tokens = int(values["output_tokens"])
+
+    def observe_events(self, events: Iterable) -> Iterator:
+        """이벤트 스트림을 그대로 넘기면서 기록 (작업 스레드에서 실행, 모델 응답 시간 = 스트림 전체)"""
+        started = time.perf_counter()
+        try:
+            for event in events:
+                self.observe(event)
+                yield event
+        finally:
+            self.add("llm", time.perf_counter() - started)
+
+    # ---------- 결과 ----------
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = dict(self.spans)
+            spans.setdefault("total", time.perf_counter() - self.started)
+            return {
+                "ts": round(self.started_at, 3),
+                "app": self.app,
+                "kind": self.kind,
+                "user": self.user,
+                "label": self.label,
+                "spans": {k: round(v, 4) for k, v in spans.items()},
+                "agents": {who: agent.to_dict(self.started) for who, agent in self.agents.items()},
+                "members": dict(self.members),
+                "tools": list(self.tools),
+            }
+
+
+# ======================== 현재 실행 (스크립트 스레드) ========================
+
+def start_run(app: str, kind: str, user: str = "", label: str = "") -> Optional[RunTimer]:
+    """실행 측정 시작 - 이후 perf_span()이 이 실행에 기록됨 (꺼져 있으면 None)"""
+    if not PERF_METRICS_ENABLED:
+        return None
+    timer = RunTimer(app, kind, user, label)
+    _current_run.set(timer)
+    return timer
+
+
+def resume_run(timer: Optional[RunTimer]):
+    """rerun 후 이어지는 실행(백그라운드 회의)을 다시 현재 실행으로 지정"""
+    _current_run.set(timer)
+
+
+def current_run() -> Optional[RunTimer]:
+    timer = _current_run.get()
+    return timer if timer is not None and not timer.finished else None
+
+
+@contextmanager
+def perf_span(name: str):
+    """현재 실행에 구간 시간 누적 (측정 중인 실행이 없으면 아무것도 하지 않음)"""
+    timer = current_run()
+    if timer is None:
+        yield
+        return
+    with timer.span(name):
+        yield
+
+
+class TimedWriter:
+    """스트림 조각을 화면에 쓰는 함수 래퍼 - 쓴 시간을 현재 실행의 render 구간에 누적"""
+
+    def __init__(self, write):
+        self.write = write
+        self.seconds = 0.0
+
+    def __call__(self, piece: str):
+        started = time.perf_counter()
+        with perf_span("render"):
+            self.write(piece)
+        self.seconds += time.perf_counter() - started
+
+
+def record_completion(who: str, result, render_seconds: float = 0.0):
+    """현재 실행에 직접 호출 결과 기록 (측정 중이 아니면 무시)"""
+    timer = current_run()
+    if timer is not None:
+        timer.add_completion(who, result, render_seconds)
+
+
+def observe_events(events: Iterable, timer: Optional[RunTimer]) -> Iterable:
+    """Team 이벤트 스트림에 측정 연결 (timer가 없으면 그대로)"""
+    return timer.observe_events(events) if timer is not None else events
+
+
+def finish_run(timer: Optional[RunTimer]) -> Optional[Dict]:
+    """측정 종료 → 기록 저장, 세션에 마지막 실행으로 보관"""
+    _current_run.set(None)
+    if timer is None or timer.finished:
+        return None
+    timer.finished = True
+    timer.add("total", time.perf_counter() - timer.started)
+    record = timer.to_dict()
+    try:
+        get_perf_recorder().record(record)
+    except Exception as e:
+        print(f"[ERROR] 실행 지표 저장 실패: {e}")
+    st.session_state["perf_last_run"] = record
+    print(f"[DEBUG] 실행 지표 - {record['app']}/{record['kind']}: {record['spans']}")
+    return record
+
+
+# ======================== 기록/집계 ========================
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def record_series(record: Dict) -> Dict[str, List[float]]:
+    """실행 기록 하나 → {지표 이름: [값]} (구간별 시간, 에이전트 TTFT/토큰 속도, 도구 시간)"""
+    series: Dict[str, List[float]] = {f"span:{k}": [v] for k, v in record.get("spans", {}).items()}
+    for agent in record.get("agents", {}).values():
+        if agent.get("ttft") is not None:
+            series.setdefault("ttft", []).append(agent["ttft"])
+        if agent.get("tokens_per_sec"):
+            series.setdefault("tokens_per_sec", []).append(agent["tokens_per_sec"])
+    for tool in record.get("tools", []):
+        if tool.get("duration") is not None:
+            series.setdefault("tool", []).append(tool["duration"])
+    return series
+
+
+class PerfRecorder:
+    """
+    실행 기록 저장 + 최근 PERF_METRICS_WINDOW건의 p50/p95
+    - JSONL 파일에 한 줄씩 덧붙임 (장기 추세는 파일로 분석)
+    - PERF_METRICS_PROM_PATH가 있으면 앱/지표별 요약을 Prometheus 텍스트 형식으로 다시 씀
+    """
+
+    def __init__(self, path: str = PERF_METRICS_PATH, prom_path: str = PERF_METRICS_PROM_PATH,
+                 window: int = PERF_METRICS_WINDOW):
+        self.path = path
+        self.prom_path = prom_path
+        self._lock = threading.Lock()
+        self._records: Deque[Dict] = deque(maxlen=window)
+        self._load_tail()
+
+    def _load_tail(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in deque(f, maxlen=self._records.maxlen):
+                    if line.strip():
+                        self._records.append(json.loads(line))
+        except Exception as e:
+            print(f"[DEBUG] 이전 실행 지표 읽기 실패: {e}")
+
+    def record(self, record: Dict):
+        with self._lock:
+            self._records.append(record)
+            if self.path:
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if self.prom_path:
+                self._write_prometheus()
+
+    def summary(self, app: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """{지표: {p50, p95, count}} (app이면 해당 앱 실행만)"""
+        with self._lock:
+            records = [r for r in self._records if app is None or r.get("app") == app]
+        merged: Dict[str, List[float]] = {}
+        for record in records:
+            for name, values in record_series(record).items():
+                merged.setdefault(name, []).extend(values)
+        return {
+            name: {"p50": percentile(values, 50), "p95": percentile(values, 95), "count": len(values)}
+            for name, values in merged.items()
+        }
+
+    def _write_prometheus(self):
+        """앱별 요약을 Prometheus summary로 (임시 파일에 쓴 뒤 교체)"""
+        metrics = {
+            "span": ("ks_run_span_seconds", "실행 구간별 소요 시간"),
+            "ttft": ("ks_agent_ttft_seconds", "에이전트별 첫 토큰까지 시간"),
+            "tokens_per_sec": ("ks_agent_tokens_per_second", "에이전트별 출력 토큰 속도"),
+            "tool": ("ks_tool_seconds", "도구 호출 소요 시간"),
+        }
+        by_metric: Dict[str, List[str]] = {key: [] for key in metrics}
+        for app in sorted({r.get("app", "") for r in self._records}):
+            merged: Dict[str, List[float]] = {}
+            for record in self._records:
+                if record.get("app") == app:
+                    for name, values in record_series(record).items():
+                        merged.setdefault(name, []).extend(values)
+            for name, values in sorted(merged.items()):
+                key, _, span = name.partition(":")
+                metric = metrics[key][0]
+                labels = f'app="{app}"' + (f',span="{span}"' if span else "")
+                for q in (50, 95):
+                    by_metric[key].append(f'{metric}{{{labels},quantile="0.{q}"}} {percentile(values, q):.6f}')
+                by_metric[key].append(f"{metric}_sum{{{labels}}} {sum(values):.6f}")
+                by_metric[key].append(f"{metric}_count{{{labels}}} {len(values)}")
+
+        lines = []
+        for key, (metric, help_text) in metrics.items():
+            if by_metric[key]:
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} summary", *by_metric[key]]
+        if os.path.dirname(self.prom_path):
+            os.makedirs(os.path.dirname(self.prom_path), exist_ok=True)
+        tmp_path = f"{self.prom_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prom_path)
+
+
+@st.cache_resource(show_spinner=False)
+def get_perf_recorder() -> PerfRecorder:
+    """프로세스 공용 실행 지표 저장소"""
+    return PerfRecorder()
+
+
+# ======================== 사이드바 패널 ========================
+
+def _ms(seconds: Optional[float]) -> str:
+    return f"{seconds * 1000:,.0f} ms" if seconds is not None else "-"
+
+
+def render_perf_panel(app: str):
+    """사이드바 '응답 시간 분석' - 마지막 실행의 구간별 시간 + 최근 실행 p50/p95"""
+    if not PERF_METRICS_ENABLED:
+        return
+    with st.expander("⏱️ 응답 시간 분석", expanded=False):
+        last = st.session_state.get("perf_last_run")
+        if last and last.get("app") == app:
+            st.caption(f"마지막 실행 ({last['kind']})")
+            st.markdown("\n".join(
+                f"- {SPAN_LABELS[name]}: {_ms(last['spans'].get(name))}"
+                for name in SPAN_NAMES if name in last["spans"]
+            ))
+            if last["agents"]:
+                rows = ["| 에이전트 | TTFT | 토큰/s | 응답 시간 |", "|---|---|---|---|"]
+                for who, agent in last["agents"].items():
+                    tps = f"{agent['tokens_per_sec']:.0f}" if agent.get("tokens_per_sec") else "-"
+                    rows.append(f"| {who} | {_ms(agent.get('ttft'))} | {tps} | {_ms(agent.get('duration'))} |")
+                st.markdown("\n".join(rows))
+            if last["tools"]:
+                slowest = sorted((t for t in last["tools"] if t.get("duration") is not None),
+                                 key=lambda t: t["duration"], reverse=True)[:5]
+                st.markdown("\n".join(
+                    f"- 🔧 [{t['member']}] {t['tool']}: {_ms(t['duration'])}" for t in slowest
+                ))
+        else:
+            st.caption("이 화면에서 완료된 실행이 아직 없습니다.")
+
+        summary = get_perf_recorder().summary(app)
+        if summary:
+            st.caption(f"최근 실행 (최대 {PERF_METRICS_WINDOW}건)")
+            rows = ["| 지표 | p50 | p95 | 건수 |", "|---|---|---|---|"]
+            for name in [f"span:{n}" for n in SPAN_NAMES] + ["ttft", "tool"]:
+                if name in summary:
+                    s = summary[name]
+                    label = SPAN_LABELS.get(name.partition(":")[2], "TTFT" if name == "ttft" else "도구")
+                    rows.append(f"| {label} | {_ms(s['p50'])} | {_ms(s['p95'])} | {s['count']} |")
+            if "tokens_per_sec" in summary:
+                s = summary["tokens_per_sec"]
+                rows.append(f"| 토큰/s | {s['p50']:.0f} | {s['p95']:.0f} | {s['count']} |")
+            st.markdown("\n".join(rows))
@@ -0,0 +1,212 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from typing import Callable, Dict, Optional
+
+import streamlit as st
+from agno.tools.googlesearch import GoogleSearchTools
+
+# 검색 결과 캐시 위치/유지 시간(초) - SEARCH_CACHE_TTL=0이면 캐시 사용 안 함
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join(".cache", "search_cache.sqlite3"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600)))
+
+# 키 형식 버전 (정규화 방식이 바뀌면 올려서 이전 키의 결과를 쓰지 않게 함)
+SEARCH_KEY_VERSION = 2
+
+
+def normalize_query(query: str) -> str:
+    """
+    표기만 다른 같은 검색어를 하나로 묶기 위한 정규화 - 유니코드 정규화(NFKC), 소문자, 공백 정리
+    - 단어 순서와 따옴표는 그대로 둠 ("A vs B"와 "B vs A", 구절 검색과 단어 검색은 다른 검색)
+    """
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    return " ".join(text.split())
+
+
+def make_search_key(query: str, max_results: int, language: str) -> str:
+    raw = f"v{SEARCH_KEY_VERSION}\x1f{normalize_query(query)}\x1f{max_results}\x1f{language}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """
+    검색 결과 캐시 (SQLite, TTL) + 같은 검색의 동시 요청 합치기(single-flight)
+    - 여러 팀장이 동시에 같은 검색을 하면 실제 요청은 한 번만 보내고 결과를 나눠 씀
+    - 프로세스를 다시 띄워도 디스크에 남은 결과는 TTL 동안 재사용
+    """
+
+    def __init__(self, path: str = SEARCH_CACHE_PATH, ttl: float = SEARCH_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, "_Flight"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.errors = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_created ON search_cache(created_at)")
+        self._conn.commit()
+        self.purge_expired()
+
+    # ---------- 저장소 ----------
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                return None
+            self._conn.execute("UPDATE search_cache SET hits = hits + 1 WHERE key = ?", (key,))
+            self._conn.commit()
+            return row[0]
+
+    def _set(self, key: str, query: str, result: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, query, result, created_at, hits) VALUES (?, ?, ?, ?, 0)",
+                (key, query, result, time.time()),
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM search_cache WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    # ---------- 조회 ----------
+    def get_or_fetch(self, query: str, max_results: int, language: str, fetch: Callable[[], str]) -> str:
+        """
+        캐시에 있으면 바로 반환, 없으면 fetch() 결과를 저장 후 반환
+        - 같은 키의 요청이 진행 중이면 새로 요청하지 않고 그 결과를 기다림
+        """
+        if self.ttl <= 0:
+            return fetch()
+        key = make_search_key(query, max_results, language)
+        cached = self._get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return cached
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return flight.wait()
+
+        try:
+            result = fetch()
+            # 빈 결과는 일시적인 실패일 수 있으므로 저장하지 않음
+            if result and result.strip() not in ("[]", "{}"):
+                self._set(key, query, result)
+            flight.set_result(result)
+            return result
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            flight.set_error(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+            served = self.hits + self.shared
+            total = served + self.misses
+            return {
+                "hits": self.hits,
+                "shared": self.shared,
+                "misses": self.misses,
+                "errors": self.errors,
+                "entries": entries,
+                "hit_rate": round(served / total, 3) if total else 0.0,
+            }
+
+
+class _Flight:
+    """진행 중인 검색 하나 (같은 검색을 기다리는 요청들이 결과를 공유)"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result: Optional[str] = None
+        self._error: Optional[BaseException] = None
+
+    def set_result(self, result: str):
+        self._result = result
+        self._done.set()
+
+    def set_error(self, error: BaseException):
+        self._error = error
+        self._done.set()
+
+    def wait(self) -> str:
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+@st.cache_resource(show_spinner=False)
+def get_search_cache() -> SearchCache:
+    """프로세스 공용 검색 캐시"""
+    return SearchCache()
+
+
+class CachedGoogleSearchTools(GoogleSearchTools):
+    """GoogleSearchTools와 같은 도구(google_search)를 제공하되 결과를 캐시/공유함"""
+
+    def __init__(self, cache: Optional[SearchCache] = None, **kwargs):
+        self.cache = cache or get_search_cache()
+        super().__init__(**kwargs)
+
+    def google_search(self, query: str, max_results: int = 5, language: str = "en") -> str:
+        """
+        Use this function to search Google for a specified query.
+
+        Args:
+            query (str): The query to search for.
+            max_results (int, optional): The maximum number of results to return. Default is 5.
+            language (str, optional): The language of the search results. Default is "en".
+
+        Returns:
+            str: A JSON formatted string containing the search results.
+        """
+        max_results = self.fixed_max_results or max_results
+        language = self.fixed_language or language
+        return self.cache.get_or_fetch(
+            query, max_results, language,
+            lambda: super(CachedGoogleSearchTools, self).google_search(query, max_results, language),
+        )
+
+
+def search_cache_stats() -> Dict[str, float]:
+    """공용 검색 캐시 적중률 등 통계"""
+    return get_search_cache().stats()
@@ -0,0 +1,592 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+import streamlit as st
+
+from db import get_supabase_client
+
+# 저장소 종류 - supabase(기본) 또는 sqlite(외부 서비스 없이 단일 서버에서 실행/벤치마크)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+SQLITE_STORAGE_PATH = os.getenv("SQLITE_STORAGE_PATH", os.path.join(".cache", "ks.sqlite3"))
+
+TEAM_LEAD_COLUMNS = 'id, name, role, personality, strategic_focus'
+# 대화 테이블 - talk_latest(index2)는 사용자(name)별, subject_talk(index3)은 subject_seq만으로 구분
+TALK_TABLES = ('subject_talk', 'talk_latest')
+TALK_COLUMNS = 'id, talk_seq, from_to, talk_history'
+TALK_OLD_COLUMNS = 'id, level, seq_from, seq_to, talk_history'
+# 지연 쓰기(insert_talk) 대상 - 대화 테이블 + 호출별 토큰/비용 (usage.py)
+WRITE_TABLES = TALK_TABLES + ('talk_usage',)
+# talk_usage 집계 기준 컬럼
+USAGE_GROUPS = ('agent', 'name', 'stream_id', 'app')
+
+
+class Storage(ABC):
+    """
+    team_leads / subject_talk / talk_latest / talk_old / talk_usage 저장소 인터페이스
+    - 앱과 보조 모듈은 Supabase 클라이언트 대신 이 메서드만 사용
+    - name=None이면 이름 조건 없이 subject_seq로만 찾음 (subject_talk)
+    - allocate_talk_seq만 선택 구현 (없으면 talk_seq가 세션 발급으로 대체)
+    """
+
+    backend = ""
+    # 프로세스 공용 캐시의 키 (Supabase URL 또는 SQLite 파일 경로)
+    location = ""
+
+    # ---------- team_leads ----------
+    @abstractmethod
+    def team_leads(self) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def team_leads_by_name(self, names: List[str]) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_team_leads(self, rows: List[Dict]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_team_lead(self, lead_id: int, fields: Dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear_team_leads(self):
+        raise NotImplementedError
+
+    # ---------- 대화 (subject_talk / talk_latest) ----------
+    @abstractmethod
+    def last_subject_seq(self, table: str, name: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def last_talk_seq(self, table: str, subject_seq: int, name: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def talk_rows(self, table: str, subject_seq: int, name: Optional[str] = None,
+                  limit: Optional[int] = None) -> List[Dict]:
+        """talk_seq 오름차순 (limit이면 가장 오래된 limit건)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_talk(self, table: str, subject_seq: int, name: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_talk(self, table: str, rows: List[Dict]):
+        """행 저장 (write_key가 같은 행이 이미 있으면 무시, WRITE_TABLES만)"""
+        raise NotImplementedError
+
+    def allocate_talk_seq(self, table: str, subject_seq: int, count: int = 1,
+                          name: Optional[str] = None) -> int:
+        """talk_seq count개를 연속 발급하고 첫 번호 반환 (지원하지 않으면 NotImplementedError)"""
+        raise NotImplementedError
+
+    # ---------- talk_old ----------
+    @abstractmethod
+    def talk_summaries(self, name: str, subject_seq: int) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def archive_talk_latest(self, name: str, subject_seq: int, seq_to: int, summary: str) -> int:
+        """seq_to 이하 대화를 지우고 요약(0단계) 한 건으로 대체 (한 트랜잭션), 옮긴 건수 반환"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def merge_talk_old(self, name: str, subject_seq: int, ids: List[int], summary: str) -> int:
+        """같은 단계 요약(ids)을 한 단계 위 요약 한 건으로 대체 (한 트랜잭션)"""
+        raise NotImplementedError
+
+    # ---------- talk_usage ----------
+    @abstractmethod
+    def usage_rollup(self, group: str, stream_id: Optional[str] = None,
+                     since: Optional[datetime] = None) -> Dict[str, Dict]:
+        """
+        사용량 합계 group(USAGE_GROUPS)별 → {값: {input_tokens, cached_tokens, output_tokens, cost_usd}}
+        - 조건은 모두 선택, since는 UTC / 합계는 저장소에서 계산 (행 수 제한과 무관)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def usage_cost(self, name: str, since: datetime) -> float:
+        """사용자의 since(UTC) 이후 비용 합계(USD)"""
+        raise NotImplementedError
+
+    # ---------- 상태 ----------
+    @abstractmethod
+    def ping(self, table: str = 'team_leads'):
+        """테이블 접근 가능 여부 확인 (실패 시 예외)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def table_counts(self, tables: Iterable[str]) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+def _usage_totals(row: Dict) -> Dict:
+    return {
+        'input_tokens': int(row['input_tokens'] or 0),
+        'cached_tokens': int(row['cached_tokens'] or 0),
+        'output_tokens': int(row['output_tokens'] or 0),
+        'cost_usd': float(row['cost_usd'] or 0),
+    }
+
+
+def _write_key_missing(error: Exception) -> bool:
+    """upsert 대상(write_key 컬럼 또는 unique 인덱스)이 없는 오류인지 - 42P10 / PGRST204 / 42703"""
+    code = str(getattr(error, 'code', '') or '')
+    message = str(getattr(error, 'message', '') or error).lower()
+    return (code in ('42P10', 'PGRST204', '42703')
+            or 'no unique or exclusion constraint' in message
+            or ('write_key' in message and ('column' in message or 'does not exist' in message)))
+
+
+# ======================== Supabase ========================
+
+class SupabaseStorage(Storage):
+    """Supabase(PostgREST) 구현 - 원자적 처리는 supabase/migrations의 RPC 사용"""
+
+    backend = "supabase"
+
+    def __init__(self, client, url: str = ""):
+        self.client = client
+        self.location = url
+        # write_key 컬럼/unique 인덱스가 없는 테이블 (20261017000300 미적용) → 일반 insert
+        self._plain_insert_tables: Set[str] = set()
+
+    def _talk_query(self, query, table: str, subject_seq: int, name: Optional[str]):
+        query = query.eq('subject_seq', subject_seq)
+        if name is not None:
+            query = query.eq('name', name)
+        return query
+
+    # ---------- team_leads ----------
+    def team_leads(self) -> List[Dict]:
+        return self.client.table('team_leads').select(TEAM_LEAD_COLUMNS).order('id').execute().data
+
+    def team_leads_by_name(self, names: List[str]) -> List[Dict]:
+        return self.client.table('team_leads').select(TEAM_LEAD_COLUMNS).in_('name', names).execute().data
+
+    def insert_team_leads(self, rows: List[Dict]):
+        self.client.table('team_leads').insert(rows).execute()
+
+    def update_team_lead(self, lead_id: int, fields: Dict):
+        self.client.table('team_leads').update(fields).eq('id', lead_id).execute()
+
+    def clear_team_leads(self):
+        self.client.table('team_leads').delete().neq('id', 0).execute()
+
+    # ---------- 대화 ----------
+    def last_subject_seq(self, table: str, name: Optional[str] = None) -> int:
+        query = self.client.table(table).select('subject_seq')
+        if name is not None:
+            query = query.eq('name', name)
+        data = query.order('subject_seq', desc=True).limit(1).execute().data
+        return data[0]['subject_seq'] if data else 0
+
+    def last_talk_seq(self, table: str, subject_seq: int, name: Optional[str] = None) -> int:
+        query = self._talk_query(self.client.table(table).select('talk_seq'), table, subject_seq, name)
+        data = query.order('talk_seq', desc=True).limit(1).execute().data
+        return data[0]['talk_seq'] if data else 0
+
+    def talk_rows(self, table: str, subject_seq: int, name: Optional[str] = None,
+                  limit: Optional[int] = None) -> List[Dict]:
+        query = self._talk_query(self.client.table(table).select(TALK_COLUMNS), table, subject_seq, name)
+        query = query.order('talk_seq')
+        if limit:
+            query = query.limit(limit)
+        return query.execute().data
+
+    def count_talk(self, table: str, subject_seq: int, name: Optional[str] = None) -> int:
+        query = self._talk_query(self.client.table(table).select('id', count='exact', head=True),
+                                 table, subject_seq, name)
+        return query.execute().count or 0
+
+    def insert_talk(self, table: str, rows: List[Dict]):
+        if table not in self._plain_insert_tables:
+            try:
+                self.client.table(table).upsert(rows, on_conflict='write_key', ignore_duplicates=True).execute()
+                return
+            except Exception as e:
+                if not _write_key_missing(e):
+                    raise
+                print(f"[ERROR] {table}에 write_key가 없음 (20261017000300 마이그레이션 필요) - "
+                      f"중복 방지 없이 일반 insert로 저장: {e}")
+                self._plain_insert_tables.add(table)
+        self.client.table(table).insert([
+            {column: value for column, value in row.items() if column != 'write_key'} for row in rows
+        ]).execute()
+
+    def allocate_talk_seq(self, table: str, subject_seq: int, count: int = 1,
+                          name: Optional[str] = None) -> int:
+        response = self.client.rpc('allocate_talk_seq', {
+            'p_table': table,
+            'p_name': name or '',
+            'p_subject_seq': subject_seq,
+            'p_count': count
+        }).execute()
+        return int(response.data)
+
+    # ---------- talk_old ----------
+    def talk_summaries(self, name: str, subject_seq: int) -> List[Dict]:
+        return self.client.table('talk_old')\
+            .select(TALK_OLD_COLUMNS)\
+            .eq('name', name)\
+            .eq('subject_seq', subject_seq)\
+            .order('id')\
+            .execute().data
+
+    def archive_talk_latest(self, name: str, subject_seq: int, seq_to: int, summary: str) -> int:
+        return self.client.rpc('archive_talk_latest', {
+            'p_name': name,
+            'p_subject_seq': subject_seq,
+            'p_seq_to': seq_to,
+            'p_summary': summary
+        }).execute().data or 0
+
+    def merge_talk_old(self, name: str, subject_seq: int, ids: List[int], summary: str) -> int:
+        return self.client.rpc('merge_talk_old', {
+            'p_name': name,
+            'p_subject_seq': subject_seq,
+            'p_ids': ids,
+            'p_summary': summary
+        }).execute().data or 0
+
+    # ---------- talk_usage ----------
+    def usage_rollup(self, group: str, stream_id: Optional[str] = None,
+                     since: Optional[datetime] = None) -> Dict[str, Dict]:
+        data = self.client.rpc('usage_rollup', {
+            'p_group': group,
+            'p_stream_id': stream_id,
+            'p_since': since.isoformat() if since is not None else None
+        }).execute().data or []
+        return {row['grp'] or '-': _usage_totals(row) for row in data}
+
+    def usage_cost(self, name: str, since: datetime) -> float:
+        # PostgREST 응답은 max-rows(기본 1000)에서 잘리므로 합계는 서버에서 계산
+        return float(self.client.rpc('usage_cost', {
+            'p_name': name,
+            'p_since': since.isoformat()
+        }).execute().data or 0)
+
+    # ---------- 상태 ----------
+    def ping(self, table: str = 'team_leads'):
+        self.client.table(table).select('id').limit(1).execute()
+
+    def table_counts(self, tables: Iterable[str]) -> Dict[str, int]:
+        return {
+            table: self.client.table(table).select('id', count='exact', head=True).execute().count or 0
+            for table in tables
+        }
+
+
+# ======================== SQLite ========================
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS team_leads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    role TEXT,
+    personality TEXT,
+    strategic_focus TEXT,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_team_leads_name ON team_leads (name);
+
+CREATE TABLE IF NOT EXISTS subject_talk (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject_title TEXT,
+    subject_seq INTEGER NOT NULL,
+    talk_seq INTEGER NOT NULL,
+    from_to TEXT NOT NULL,
+    talk_history TEXT,
+    write_key TEXT UNIQUE,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_subject_talk_seq ON subject_talk (subject_seq, talk_seq);
+
+CREATE TABLE IF NOT EXISTS talk_latest (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    subject_seq INTEGER NOT NULL,
+    talk_seq INTEGER NOT NULL,
+    from_to TEXT NOT NULL,
+    talk_history TEXT,
+    write_key TEXT UNIQUE,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_talk_latest_name_seq ON talk_latest (name, subject_seq, talk_seq);
+
+CREATE TABLE IF NOT EXISTS talk_old (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    subject_seq INTEGER NOT NULL,
+    level INTEGER NOT NULL DEFAULT 0,
+    seq_from INTEGER,
+    seq_to INTEGER,
+    talk_history TEXT,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_talk_old_name_subject_level ON talk_old (name, subject_seq, level, seq_from);
+
+CREATE TABLE IF NOT EXISTS talk_usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    app TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    stream_id TEXT,
+    subject_seq INTEGER,
+    agent TEXT NOT NULL,
+    model TEXT,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    write_key TEXT UNIQUE,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_talk_usage_name_created ON talk_usage (name, created_at);
+CREATE INDEX IF NOT EXISTS idx_talk_usage_stream ON talk_usage (stream_id);
+
+CREATE TABLE IF NOT EXISTS talk_seq_counters (
+    table_name TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    subject_seq INTEGER NOT NULL,
+    last_seq INTEGER NOT NULL,
+    PRIMARY KEY (table_name, name, subject_seq)
+);
+"""
+
+
+class SqliteStorage(Storage):
+    """
+    내장 SQLite 구현 (WAL, 조회 경로마다 인덱스)
+    - 프로세스에서 연결 하나를 잠금으로 공유 (백그라운드 스레드 포함)
+    - 여러 문장을 묶는 처리(보관/합치기/번호 발급)는 한 트랜잭션으로 실행
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str = SQLITE_STORAGE_PATH):
+        self.location = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=10000")
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def _rows(self, sql: str, params: Iterable = ()) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, tuple(params))]
+
+    def _value(self, sql: str, params: Iterable = ()):
+        with self._lock:
+            row = self._conn.execute(sql, tuple(params)).fetchone()
+        return row[0] if row is not None else None
+
+    def _transaction(self, work):
+        """work(conn)을 한 트랜잭션으로 실행 (예외 시 전체 취소)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    @staticmethod
+    def _talk_where(table: str, name: Optional[str]) -> str:
+        if table not in TALK_TABLES:
+            raise ValueError(f"unknown talk table: {table}")
+        return "subject_seq = ?" + (" AND name = ?" if name is not None else "")
+
+    @staticmethod
+    def _talk_params(subject_seq: int, name: Optional[str]) -> List:
+        return [subject_seq] + ([name] if name is not None else [])
+
+    # ---------- team_leads ----------
+    def team_leads(self) -> List[Dict]:
+        return self._rows(f"SELECT {TEAM_LEAD_COLUMNS} FROM team_leads ORDER BY id")
+
+    def team_leads_by_name(self, names: List[str]) -> List[Dict]:
+        if not names:
+            return []
+        marks = ", ".join("?" * len(names))
+        return self._rows(f"SELECT {TEAM_LEAD_COLUMNS} FROM team_leads WHERE name IN ({marks})", names)
+
+    def insert_team_leads(self, rows: List[Dict]):
+        self._transaction(lambda conn: conn.executemany(
+            "INSERT INTO team_leads (name, role, personality, strategic_focus) VALUES (?, ?, ?, ?)",
+            [(row['name'], row.get('role'), row.get('personality'), row.get('strategic_focus')) for row in rows],
+        ))
+
+    def update_team_lead(self, lead_id: int, fields: Dict):
+        columns = [column for column in ('name', 'role', 'personality', 'strategic_focus') if column in fields]
+        if not columns:
+            return
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        self._transaction(lambda conn: conn.execute(
+            f"UPDATE team_leads SET {assignments} WHERE id = ?",
+            [fields[column] for column in columns] + [lead_id],
+        ))
+
+    def clear_team_leads(self):
+        self._transaction(lambda conn: conn.execute("DELETE FROM team_leads"))
+
+    # ---------- 대화 ----------
+    def last_subject_seq(self, table: str, name: Optional[str] = None) -> int:
+        where = " WHERE name = ?" if name is not None else ""
+        self._talk_where(table, name)
+        return self._value(f"SELECT COALESCE(MAX(subject_seq), 0) FROM {table}{where}",
+                           [name] if name is not None else [])
+
+    def last_talk_seq(self, table: str, subject_seq: int, name: Optional[str] = None) -> int:
+        return self._value(f"SELECT COALESCE(MAX(talk_seq), 0) FROM {table} WHERE {self._talk_where(table, name)}",
+                           self._talk_params(subject_seq, name))
+
+    def talk_rows(self, table: str, subject_seq: int, name: Optional[str] = None,
+                  limit: Optional[int] = None) -> List[Dict]:
+        sql = f"SELECT {TALK_COLUMNS} FROM {table} WHERE {self._talk_where(table, name)} ORDER BY talk_seq"
+        params = self._talk_params(subject_seq, name)
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._rows(sql, params)
+
+    def count_talk(self, table: str, subject_seq: int, name: Optional[str] = None) -> int:
+        return self._value(f"SELECT COUNT(*) FROM {table} WHERE {self._talk_where(table, name)}",
+                           self._talk_params(subject_seq, name))
+
+    def insert_talk(self, table: str, rows: List[Dict]):
+        if not rows:
+            return
+        if table not in WRITE_TABLES:
+            raise ValueError(f"unknown write table: {table}")
+        columns = list(rows[0].keys())
+        sql = (f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' * len(columns))})")
+        self._transaction(lambda conn: conn.executemany(sql, [[row.get(c) for c in columns] for row in rows]))
+
+    def allocate_talk_seq(self, table: str, subject_seq: int, count: int = 1,
+                          name: Optional[str] = None) -> int:
+        where = self._talk_where(table, name or None)
+        key = (table, name or '', subject_seq)
+
+        def work(conn):
+            row = conn.execute(
+                "SELECT last_seq FROM talk_seq_counters WHERE table_name = ? AND name = ? AND subject_seq = ?", key
+            ).fetchone()
+            if row is None:
+                last = conn.execute(f"SELECT COALESCE(MAX(talk_seq), 0) FROM {table} WHERE {where}",
+                                    self._talk_params(subject_seq, name or None)).fetchone()[0]
+            else:
+                last = row[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO talk_seq_counters (table_name, name, subject_seq, last_seq) VALUES (?, ?, ?, ?)",
+                key + (last + count,),
+            )
+            return last + 1
+
+        return self._transaction(work)
+
+    # ---------- talk_old ----------
+    def talk_summaries(self, name: str, subject_seq: int) -> List[Dict]:
+        return self._rows(
+            f"SELECT {TALK_OLD_COLUMNS} FROM talk_old WHERE name = ? AND subject_seq = ? ORDER BY id",
+            (name, subject_seq),
+        )
+
+    def archive_talk_latest(self, name: str, subject_seq: int, seq_to: int, summary: str) -> int:
+        def work(conn):
+            seq_from, moved = conn.execute(
+                "SELECT MIN(talk_seq), COUNT(*) FROM talk_latest WHERE name = ? AND subject_seq = ? AND talk_seq <= ?",
+                (name, subject_seq, seq_to),
+            ).fetchone()
+            if not moved:
+                return 0
+            conn.execute("DELETE FROM talk_latest WHERE name = ? AND subject_seq = ? AND talk_seq <= ?",
+                         (name, subject_seq, seq_to))
+            conn.execute(
+                "INSERT INTO talk_old (name, subject_seq, level, seq_from, seq_to, talk_history) VALUES (?, ?, 0, ?, ?, ?)",
+                (name, subject_seq, seq_from, seq_to, summary),
+            )
+            return moved
+
+        return self._transaction(work)
+
+    def merge_talk_old(self, name: str, subject_seq: int, ids: List[int], summary: str) -> int:
+        marks = ", ".join("?" * len(ids))
+
+        def work(conn):
+            level, seq_from, seq_to, merged = conn.execute(
+                f"SELECT MAX(level), MIN(seq_from), MAX(seq_to), COUNT(*) FROM talk_old "
+                f"WHERE name = ? AND subject_seq = ? AND id IN ({marks})",
+                [name, subject_seq] + list(ids),
+            ).fetchone()
+            if merged != len(ids):
+                raise RuntimeError(f"talk_old rows changed during merge (expected {len(ids)}, got {merged})")
+            conn.execute(f"DELETE FROM talk_old WHERE id IN ({marks})", list(ids))
+            conn.execute(
+                "INSERT INTO talk_old (name, subject_seq, level, seq_from, seq_to, talk_history) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, subject_seq, level + 1, seq_from, seq_to, summary),
+            )
+            return merged
+
+        return self._transaction(work)
+
+    # ---------- talk_usage ----------
+    @staticmethod
+    def _timestamp(since: datetime) -> str:
+        """CURRENT_TIMESTAMP와 같은 형식 (UTC 'YYYY-MM-DD HH:MM:SS')"""
+        return since.strftime('%Y-%m-%d %H:%M:%S')
+
+    def usage_rollup(self, group: str, stream_id: Optional[str] = None,
+                     since: Optional[datetime] = None) -> Dict[str, Dict]:
+        if group not in USAGE_GROUPS:
+            raise ValueError(f"unknown usage group: {group}")
+        where, params = [], []
+        if stream_id is not None:
+            where.append('stream_id = ?')
+            params.append(stream_id)
+        if since is not None:
+            where.append('created_at >= ?')
+            params.append(self._timestamp(since))
+        sql = (f"SELECT {group} AS grp, SUM(input_tokens) AS input_tokens, SUM(cached_tokens) AS cached_tokens, "
+               f"SUM(output_tokens) AS output_tokens, SUM(cost_usd) AS cost_usd FROM talk_usage")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return {row['grp'] or '-': _usage_totals(row) for row in self._rows(sql + f" GROUP BY {group}", params)}
+
+    def usage_cost(self, name: str, since: datetime) -> float:
+        return float(self._value(
+            "SELECT COALESCE(SUM(cost_usd), 0) FROM talk_usage WHERE name = ? AND created_at >= ?",
+            (name, self._timestamp(since)),
+        ))
+
+    # ---------- 상태 ----------
+    def ping(self, table: str = 'team_leads'):
+        self._value(f"SELECT 1 FROM {table} LIMIT 1")
+
+    def table_counts(self, tables: Iterable[str]) -> Dict[str, int]:
+        return {table: self._value(f"SELECT COUNT(*) FROM {table}") for table in tables}
+
+
+@st.cache_resource(show_spinner=False)
+def get_supabase_storage(url: str, key: str) -> SupabaseStorage:
+    """(url, key)당 하나의 Supabase 저장소 (클라이언트는 db.get_supabase_client와 공유)"""
+    return SupabaseStorage(get_supabase_client(url, key), url)
+
+
+@st.cache_resource(show_spinner=False)
+def get_sqlite_storage(path: str = SQLITE_STORAGE_PATH) -> SqliteStorage:
+    """파일당 하나의 SQLite 저장소"""
+    return SqliteStorage(path)
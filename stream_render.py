@@ -0,0 +1,110 @@
+import os
+import time
+from typing import List
+
+# 화면 갱신 간격(초)과, 간격 전이라도 갱신할 누적 크기(문자 수)
+STREAM_RENDER_INTERVAL = float(os.getenv("STREAM_RENDER_INTERVAL", "0.1"))
+STREAM_RENDER_MAX_PENDING = int(os.getenv("STREAM_RENDER_MAX_PENDING", "2048"))
+
+FENCE_MARKERS = ("```", "~~~")
+
+
+def _split_completed_blocks(text: str, in_fence: bool):
+    """
+    text에서 '완성된' 마크다운 블록 경계(코드펜스 밖의 빈 줄)를 찾음
+    :return: (완성된 부분, 남은 꼬리, 꼬리 시작 시점의 코드펜스 상태)
+    """
+    cut = 0
+    cut_fence = in_fence
+    pos = 0
+    lines = text.split("\n")
+    # 마지막 줄은 아직 끝나지 않았을 수 있으므로 경계 판단에서 제외
+    for line in lines[:-1]:
+        pos += len(line) + 1
+        stripped = line.strip()
+        if stripped.startswith(FENCE_MARKERS):
+            in_fence = not in_fence
+            if not in_fence:
+                # 코드블럭이 닫히면 그 자리까지가 하나의 블록
+                cut, cut_fence = pos, in_fence
+        elif not stripped and not in_fence:
+            cut, cut_fence = pos, in_fence
+    return text[:cut], text[cut:], cut_fence
+
+
+class MarkdownStreamRenderer:
+    """
+    스트리밍 마크다운 렌더러
+    - 청크는 리스트에 모으고(문자열 반복 연결 없음), 전체 텍스트는 필요할 때만 join
+    - 화면 갱신은 시간/크기 기준으로 묶어서 수행
+    - 완성된 블록은 별도 요소로 고정하고, 마지막(작성 중) 블록만 다시 그림
+    """
+
+    def __init__(self, container, cursor: str = "▌",
+                 interval: float = STREAM_RENDER_INTERVAL,
+                 max_pending: int = STREAM_RENDER_MAX_PENDING):
+        self.container = container
+        self.cursor = cursor
+        self.interval = interval
+        self.max_pending = max_pending
+
+        self.chunks: List[str] = []        # 전체 원문 (순서대로)
+        self._pending: List[str] = []      # 아직 화면에 반영되지 않은 청크
+        self._pending_size = 0
+        self._tail = ""                    # 고정되지 않은 마지막 블록
+        self._tail_in_fence = False        # 꼬리 시작 시점에 코드블럭 안인지
+        self._tail_slot = container.empty()
+        self._last_flush = 0.0
+        self.frozen_blocks = 0
+        self.render_count = 0
+        self.render_seconds = 0.0
+
+    def write(self, chunk: str):
+        if not chunk:
+            return
+        self.chunks.append(chunk)
+        self._pending.append(chunk)
+        self._pending_size += len(chunk)
+        if (self._pending_size >= self.max_pending
+                or time.monotonic() - self._last_flush >= self.interval):
+            self.flush()
+
+    def flush(self, final: bool = False):
+        started = time.perf_counter()
+        if self._pending:
+            self._tail += "".join(self._pending)
+            self._pending = []
+            self._pending_size = 0
+
+            done, rest, fence = _split_completed_blocks(self._tail, self._tail_in_fence)
+            if done.strip():
+                # 완성된 블록은 현재 슬롯에 확정하고, 꼬리는 새 슬롯에서 이어서 그림
+                self._tail_slot.markdown(done)
+                self._tail_slot = self.container.empty()
+                self.frozen_blocks += 1
+                self._tail, self._tail_in_fence = rest, fence
+
+        if final:
+            if self._tail:
+                self._tail_slot.markdown(self._tail)
+            else:
+                self._tail_slot.empty()
+        elif self._tail:
+            self._tail_slot.markdown(self._tail + self.cursor)
+        self._last_flush = time.monotonic()
+        self.render_count += 1
+        self.render_seconds += time.perf_counter() - started
+
+    def finish(self) -> str:
+        """남은 내용을 커서 없이 그리고 전체 텍스트 반환"""
+        self.flush(final=True)
+        return self.text
+
+    @property
+    def has_pending(self) -> bool:
+        """아직 화면에 반영되지 않은 청크가 있는지"""
+        return bool(self._pending)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
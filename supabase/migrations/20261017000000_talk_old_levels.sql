@@ -0,0 +1,10 @@
+-- talk_old 단계별 요약 (index2 대화 보관)
+-- level 0 = talk_latest 원문 묶음의 요약, level n+1 = level n 요약 여러 건의 요약
+-- seq_from/seq_to = 요약이 덮는 talk_seq 범위 (시간순 정렬용)
+
+alter table talk_old add column if not exists level integer not null default 0;
+alter table talk_old add column if not exists seq_from integer;
+alter table talk_old add column if not exists seq_to integer;
+
+create index if not exists idx_talk_old_name_subject_level
+    on talk_old (name, subject_seq, level, seq_from);
@@ -0,0 +1,75 @@
+-- index2 대화 보관을 한 트랜잭션으로 처리하는 함수
+-- 중간에 실패하면 전체가 취소되어 원문만 지워지거나 요약만 남는 일이 없음
+
+-- talk_latest의 p_seq_to 이하 대화를 지우고 그 자리를 요약(0단계) 한 건으로 대체
+-- 이미 다른 작업이 옮겼으면 아무것도 하지 않고 0 반환
+create or replace function archive_talk_latest(
+    p_name text,
+    p_subject_seq integer,
+    p_seq_to integer,
+    p_summary text
+) returns integer
+language plpgsql
+as $$
+declare
+    v_from integer;
+    v_count integer;
+begin
+    with moved as (
+        delete from talk_latest
+        where name = p_name
+          and subject_seq = p_subject_seq
+          and talk_seq <= p_seq_to
+        returning talk_seq
+    )
+    select min(talk_seq), count(*) into v_from, v_count from moved;
+
+    if v_count = 0 then
+        return 0;
+    end if;
+
+    insert into talk_old (name, subject_seq, level, seq_from, seq_to, talk_history)
+    values (p_name, p_subject_seq, 0, v_from, p_seq_to, p_summary);
+
+    return v_count;
+end;
+$$;
+
+-- 같은 단계 요약 여러 건(p_ids)을 한 단계 위 요약 한 건으로 대체
+-- 그사이 대상이 바뀌었으면(다른 작업이 먼저 합침) 예외로 전체 취소
+create or replace function merge_talk_old(
+    p_name text,
+    p_subject_seq integer,
+    p_ids bigint[],
+    p_summary text
+) returns integer
+language plpgsql
+as $$
+declare
+    v_level integer;
+    v_from integer;
+    v_to integer;
+    v_count integer;
+begin
+    with merged as (
+        delete from talk_old
+        where name = p_name
+          and subject_seq = p_subject_seq
+          and id = any(p_ids)
+        returning level, seq_from, seq_to
+    )
+    select max(level), min(seq_from), max(seq_to), count(*)
+      into v_level, v_from, v_to, v_count
+      from merged;
+
+    if v_count <> coalesce(array_length(p_ids, 1), 0) then
+        raise exception 'talk_old rows changed during merge (expected %, got %)',
+            coalesce(array_length(p_ids, 1), 0), v_count;
+    end if;
+
+    insert into talk_old (name, subject_seq, level, seq_from, seq_to, talk_history)
+    values (p_name, p_subject_seq, v_level + 1, v_from, v_to, p_summary);
+
+    return v_count;
+end;
+$$;
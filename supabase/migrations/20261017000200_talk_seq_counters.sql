@@ -0,0 +1,53 @@
+-- talk_seq 서버 발급 (index2: talk_latest, index3: subject_talk)
+-- 대화(테이블, 이름, subject_seq)별 마지막 번호를 보관하고 한 번의 호출로 여러 개를 연속 발급
+
+create table if not exists talk_seq_counters (
+    table_name text not null,
+    name text not null default '',
+    subject_seq integer not null,
+    last_seq integer not null,
+    primary key (table_name, name, subject_seq)
+);
+
+-- p_count개를 발급하고 첫 번호 반환
+-- 카운터가 처음 만들어질 때는 해당 테이블의 현재 최대 talk_seq에서 이어감
+create or replace function allocate_talk_seq(
+    p_table text,
+    p_name text,
+    p_subject_seq integer,
+    p_count integer default 1
+) returns integer
+language plpgsql
+as $$
+declare
+    v_seed integer;
+    v_last integer;
+begin
+    update talk_seq_counters
+       set last_seq = last_seq + p_count
+     where table_name = p_table and name = p_name and subject_seq = p_subject_seq
+    returning last_seq into v_last;
+
+    if not found then
+        if p_table = 'talk_latest' then
+            select coalesce(max(talk_seq), 0) into v_seed
+              from talk_latest
+             where name = p_name and subject_seq = p_subject_seq;
+        elsif p_table = 'subject_talk' then
+            select coalesce(max(talk_seq), 0) into v_seed
+              from subject_talk
+             where subject_seq = p_subject_seq;
+        else
+            raise exception 'unknown talk table: %', p_table;
+        end if;
+
+        insert into talk_seq_counters (table_name, name, subject_seq, last_seq)
+        values (p_table, p_name, p_subject_seq, v_seed + p_count)
+        on conflict (table_name, name, subject_seq)
+            do update set last_seq = talk_seq_counters.last_seq + p_count
+        returning last_seq into v_last;
+    end if;
+
+    return v_last - p_count + 1;
+end;
+$$;
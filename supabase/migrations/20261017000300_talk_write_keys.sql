@@ -0,0 +1,7 @@
+-- 대화 저장 재시도 시 중복 방지 키 (write_queue.py의 upsert on_conflict 대상)
+
+alter table talk_latest add column if not exists write_key text;
+create unique index if not exists talk_latest_write_key_key on talk_latest (write_key);
+
+alter table subject_talk add column if not exists write_key text;
+create unique index if not exists subject_talk_write_key_key on subject_talk (write_key);
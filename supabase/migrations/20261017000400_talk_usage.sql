@@ -0,0 +1,55 @@
+-- 호출별 토큰/비용 (usage.py) - 회의(stream_id)/대화(subject_seq), 에이전트(팀장/리더/본부장), 사용자별 집계용
+-- 대화와 같은 지연 쓰기 대기열로 저장하므로 write_key로 중복 방지
+
+create table if not exists talk_usage (
+    id bigint generated by default as identity primary key,
+    app text not null,
+    name text not null default '',
+    stream_id text,
+    subject_seq integer,
+    agent text not null,
+    model text,
+    input_tokens integer not null default 0,
+    cached_tokens integer not null default 0,
+    output_tokens integer not null default 0,
+    cost_usd numeric(12, 6) not null default 0,
+    write_key text,
+    created_at timestamptz not null default now()
+);
+
+create unique index if not exists talk_usage_write_key_key on talk_usage (write_key);
+create index if not exists talk_usage_name_created_idx on talk_usage (name, created_at);
+create index if not exists talk_usage_stream_idx on talk_usage (stream_id);
+
+-- 사용자의 기간 비용 합계 (한도 확인용, PostgREST max-rows에 잘리지 않도록 서버에서 합산)
+create or replace function usage_cost(p_name text, p_since timestamptz)
+returns numeric
+language sql
+stable
+as $$
+    select coalesce(sum(cost_usd), 0)
+      from talk_usage
+     where name = p_name and created_at >= p_since;
+$$;
+
+-- 사용량 합계 p_group(agent / name / stream_id / app)별 (조건은 null이면 적용하지 않음)
+create or replace function usage_rollup(p_group text, p_stream_id text default null, p_since timestamptz default null)
+returns table (grp text, input_tokens bigint, cached_tokens bigint, output_tokens bigint, cost_usd numeric)
+language sql
+stable
+as $$
+    select case p_group
+               when 'agent' then agent
+               when 'name' then name
+               when 'stream_id' then stream_id
+               when 'app' then app
+           end as grp,
+           sum(input_tokens)::bigint,
+           sum(cached_tokens)::bigint,
+           sum(output_tokens)::bigint,
+           sum(cost_usd)
+      from talk_usage
+     where (p_stream_id is null or stream_id = p_stream_id)
+       and (p_since is null or created_at >= p_since)
+     group by 1;
+$$;
@@ -0,0 +1,156 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import streamlit as st
+
+from chat_context import clip_to_tokens, count_tokens, summarize_turns
+
+# talk_latest가 이 개수 이상이면 가장 오래된 TALK_ARCHIVE_BATCH건을 요약해 talk_old로 옮김
+TALK_SUMMARIZE_THRESHOLD = int(os.getenv("TALK_SUMMARIZE_THRESHOLD", "40"))
+TALK_ARCHIVE_BATCH = int(os.getenv("TALK_ARCHIVE_BATCH", "20"))
+# 요약 한 건의 목표 크기(토큰), 같은 단계 요약이 이만큼 쌓이면 한 단계 위 요약 하나로 합침
+TALK_SUMMARY_TOKENS = int(os.getenv("TALK_SUMMARY_TOKENS", "500"))
+TALK_ROLLUP_FANIN = int(os.getenv("TALK_ROLLUP_FANIN", "4"))
+# 프롬프트에 넣는 요약 전체의 최대 크기(토큰)
+TALK_DIGEST_TOKENS = int(os.getenv("TALK_DIGEST_TOKENS", "1500"))
+TALK_ARCHIVE_WORKERS = int(os.getenv("TALK_ARCHIVE_WORKERS", "2"))
+
+# 본부장 시뮬레이션 대화의 화자 표기
+TALK_LABELS = {"Q": "보고자", "A": "본부장", "S": "이전 요약"}
+
+
+class TalkArchiver:
+    """
+    talk_latest → talk_old 요약 보관 (백그라운드)
+    - 응답을 보낸 뒤 스레드에서 실행 → 채팅 응답 경로에서 LLM 요약/DB 정리를 기다리지 않음
+    - 같은 대화(name, subject_seq)의 보관은 동시에 하나만 실행
+    - talk_old는 단계(level)별 요약: 0단계 = 원문 TALK_ARCHIVE_BATCH건의 요약,
+      같은 단계가 TALK_ROLLUP_FANIN건 쌓이면 합쳐서 한 단계 위 요약 하나로 (요약의 요약)
+    """
+
+    def __init__(self, workers: int = TALK_ARCHIVE_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="talk-archive")
+        self._lock = threading.Lock()
+        self._inflight: Set[Tuple[str, int]] = set()
+
+    def schedule(self, storage, openai_client, name: str, subject_seq: int,
+                 on_done: Optional[Callable[[], None]] = None) -> bool:
+        """보관 작업 등록 (같은 대화가 이미 진행 중이면 건너뜀, 끝나면 on_done 호출)"""
+        key = (name, subject_seq)
+        with self._lock:
+            if key in self._inflight:
+                return False
+            self._inflight.add(key)
+        self._executor.submit(self._run, storage, openai_client, name, subject_seq, on_done)
+        return True
+
+    def _run(self, storage, openai_client, name: str, subject_seq: int, on_done=None):
+        try:
+            # 한 번에 밀린 분량이 많으면 기준 아래로 내려갈 때까지 반복
+            while count_latest(storage, name, subject_seq) >= TALK_SUMMARIZE_THRESHOLD:
+                if not archive_oldest(storage, openai_client, name, subject_seq):
+                    break
+            rollup_summaries(storage, openai_client, name, subject_seq)
+        except Exception as e:
+            print(f"[ERROR] 대화 요약 보관 실패 ({name}, {subject_seq}): {e}")
+        finally:
+            with self._lock:
+                self._inflight.discard((name, subject_seq))
+            if on_done is not None:
+                on_done()
+
+
+@st.cache_resource(show_spinner=False)
+def get_talk_archiver() -> TalkArchiver:
+    """프로세스 공용 대화 보관 실행기"""
+    return TalkArchiver()
+
+
+def count_latest(storage, name: str, subject_seq: int) -> int:
+    """talk_latest 건수 (행을 내려받지 않고 개수만 조회)"""
+    return storage.count_talk('talk_latest', subject_seq, name=name)
+
+
+def archive_oldest(storage, openai_client, name: str, subject_seq: int) -> bool:
+    """
+    가장 오래된 TALK_ARCHIVE_BATCH건을 요약해 talk_old(0단계)로 옮김
+    - 요약 저장과 원문 삭제는 storage.archive_talk_latest 한 번으로 (한 트랜잭션)
+    - 요약 호출이 실패하면 아무것도 바꾸지 않음 (다음 보관 예약 때 다시 시도)
+    """
+    rows = storage.talk_rows('talk_latest', subject_seq, name=name, limit=TALK_ARCHIVE_BATCH)
+    if not rows:
+        return False
+
+    summary = summarize_turns(
+        "", [(row['from_to'], row['talk_history']) for row in rows],
+        max_tokens=TALK_SUMMARY_TOKENS, labels=TALK_LABELS, client=openai_client, fallback=False,
+    )
+    if summary is None:
+        print(f"[DEBUG] 대화 보관 보류 - 요약 실패 ({name}, {subject_seq})")
+        return False
+    moved = storage.archive_talk_latest(name, subject_seq, rows[-1]['talk_seq'], summary)
+    print(f"[DEBUG] 대화 보관 - talk_seq {rows[0]['talk_seq']}~{rows[-1]['talk_seq']} "
+          f"({moved}건) → 요약 {count_tokens(summary)} 토큰")
+    # 0건이면 다른 작업이 먼저 옮긴 것
+    return bool(moved)
+
+
+def get_summaries(storage, name: str, subject_seq: int) -> List[Dict]:
+    """talk_old 요약 목록 (시간순, level이 없는 예전 행은 0단계로 취급)"""
+    rows = storage.talk_summaries(name, subject_seq)
+    for row in rows:
+        row['level'] = row.get('level') or 0
+    return sorted(rows, key=lambda row: (row.get('seq_from') is None, row.get('seq_from') or 0, row['id']))
+
+
+def rollup_summaries(storage, openai_client, name: str, subject_seq: int):
+    """같은 단계 요약이 TALK_ROLLUP_FANIN건 이상이면 오래된 것부터 묶어 한 단계 위 요약으로 합침"""
+    while True:
+        by_level: Dict[int, List[Dict]] = {}
+        for row in get_summaries(storage, name, subject_seq):
+            by_level.setdefault(row['level'], []).append(row)
+        full = [level for level, rows in sorted(by_level.items()) if len(rows) >= TALK_ROLLUP_FANIN]
+        if not full:
+            return
+        level = full[0]
+        group = by_level[level][:TALK_ROLLUP_FANIN]
+        summary = summarize_turns(
+            "", [('S', row['talk_history']) for row in group],
+            max_tokens=TALK_SUMMARY_TOKENS, labels=TALK_LABELS, client=openai_client, fallback=False,
+        )
+        if summary is None:
+            print(f"[DEBUG] 요약 합치기 보류 - 요약 실패 ({name}, {subject_seq})")
+            return
+        # 새 요약 저장과 기존 요약 삭제를 한 트랜잭션으로
+        storage.merge_talk_old(name, subject_seq, [row['id'] for row in group], summary)
+        print(f"[DEBUG] 요약 합치기 - {level}단계 {len(group)}건 → {level + 1}단계 1건")
+
+
+def build_summary_digest(rows: List[Dict], max_tokens: int = TALK_DIGEST_TOKENS) -> str:
+    """
+    프롬프트용 요약 (시간순으로 이어 붙이되 max_tokens 이내)
+    - 넘치면 가장 오래된(가장 압축된) 요약부터 잘라냄
+    """
+    parts: List[str] = []
+    used = 0
+    for row in reversed(rows):
+        text = row['talk_history'].strip()
+        tokens = count_tokens(text)
+        if used + tokens > max_tokens:
+            remaining = max_tokens - used
+            if remaining > 50:
+                parts.append(clip_to_tokens(text, remaining))
+            break
+        parts.append(text)
+        used += tokens
+    return "\n\n".join(reversed(parts))
+
+
+def get_summary_digest(storage, name: str, subject_seq: int) -> Optional[str]:
+    """talk_old 요약들을 합친 프롬프트용 요약 (없으면 None)"""
+    rows = get_summaries(storage, name, subject_seq)
+    if not rows:
+        return None
+    return build_summary_digest(rows)
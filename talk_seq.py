@@ -0,0 +1,50 @@
+import os
+from typing import Callable, Optional, Set
+
+import streamlit as st
+
+# talk_seq를 저장소(allocate_talk_seq RPC / SQLite 트랜잭션)에서 발급 - 끄거나 실패하면 세션에서 이어서 계산
+TALK_SEQ_RPC = os.getenv("TALK_SEQ_RPC", "true").lower() in ("1", "true", "yes", "on")
+
+# 저장소 발급 함수가 없는 테이블 (프로세스가 떠 있는 동안 다시 시도하지 않음)
+_rpc_unavailable: Set[str] = set()
+
+
+def _rpc_missing(error: Exception) -> bool:
+    """발급 함수 자체가 없는 오류인지 (PostgREST PGRST202 / 404, 미구현 저장소) - 그 밖의 오류는 일시적인 것으로 봄"""
+    if isinstance(error, NotImplementedError):
+        return True
+    code = str(getattr(error, 'code', '') or '')
+    message = str(getattr(error, 'message', '') or error).lower()
+    return (code in ('PGRST202', '42883', '404')
+            or 'could not find the function' in message
+            or ('function' in message and 'does not exist' in message))
+
+
+def allocate_talk_seq(storage, table: str, subject_seq: int, count: int = 1,
+                      name: Optional[str] = None,
+                      read_next: Optional[Callable[[], int]] = None) -> int:
+    """
+    talk_seq를 count개 연속으로 발급하고 첫 번호 반환 (질문/답변 한 턴 = 2개)
+    - 저장소 발급: 한 번의 호출로 끝나고, 여러 탭/사용자가 동시에 써도 번호가 겹치지 않음
+    - 세션 발급: 처음 한 번만 read_next()로 DB에서 읽고 이후에는 세션에 기억한 번호에서 이어감
+    """
+    if TALK_SEQ_RPC and table not in _rpc_unavailable:
+        try:
+            return storage.allocate_talk_seq(table, subject_seq, count, name=name)
+        except Exception as e:
+            if _rpc_missing(e):
+                print(f"[DEBUG] allocate_talk_seq 없음 - 세션 발급으로 전환 ({table}): {e}")
+                _rpc_unavailable.add(table)
+            else:
+                # 이번 한 번만 세션 발급 (다음 턴에 다시 저장소 발급 시도), 그 사이 저장소에서 발급된 번호가 있으니 DB에서 다시 읽음
+                print(f"[DEBUG] allocate_talk_seq 실패 - 이번만 세션 발급 ({table}): {e}")
+                st.session_state.setdefault('talk_seq_next', {}).pop((table, name or '', subject_seq), None)
+
+    counters = st.session_state.setdefault('talk_seq_next', {})
+    key = (table, name or '', subject_seq)
+    if key not in counters:
+        counters[key] = read_next() if read_next is not None else 1
+    first = counters[key]
+    counters[key] = first + count
+    return first
@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Tuple
+
+import streamlit as st
+
+# 프로세스 전체에서 유지할 유휴 Team 객체 최대 개수
+TEAM_POOL_SIZE = int(os.getenv("TEAM_POOL_SIZE", "16"))
+
+
+def make_team_key(leads: Iterable, mode: str, depth: str, frameworks: Dict, model_id: str) -> Tuple:
+    """
+    Team 구성 캐시 키
+    - 참석자 순서 + 행 버전(내용이 바뀌면 새 키) + 팀별 사고 프레임 + 모드/깊이/모델
+    """
+    members = tuple(
+        (lead.id, lead.version, frameworks.get(lead.id, "none"))
+        for lead in leads
+    )
+    return (members, mode, depth, model_id)
+
+
+def reset_team_state(team):
+    """
+    반납된 Team의 실행/세션 상태 초기화 (다음 사용자에게 이전 대화가 섞이지 않도록)
+    - memory는 None으로 두면 다음 실행 시 Agno가 새로 생성함
+    """
+    for obj in [team, *getattr(team, "members", [])]:
+        reset_run_state = getattr(obj, "_reset_run_state", None) or getattr(obj, "reset_run_state", None)
+        if callable(reset_run_state):
+            reset_run_state()
+        for attr in ("memory", "session_id", "session_state", "session_name", "team_session_id", "run_response"):
+            if hasattr(obj, attr):
+                setattr(obj, attr, None)
+
+
+class TeamPool:
+    """
+    구성된 Agno Team 객체 LRU 풀
+    - acquire: 같은 키의 유휴 Team이 있으면 꺼내 쓰고, 없으면 build()로 생성
+    - release: 상태를 초기화한 뒤 풀에 반납 (가장 오래 안 쓴 키부터 제거)
+    - 사용 중인 Team은 풀에서 빠져 있으므로 세션 간에 동시에 공유되지 않음
+    """
+
+    def __init__(self, max_idle: int = TEAM_POOL_SIZE):
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: "OrderedDict[Hashable, List]" = OrderedDict()
+        self._idle_count = 0
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, key: Hashable, build: Callable):
+        with self._lock:
+            teams = self._idle.get(key)
+            if teams:
+                team = teams.pop()
+                self._idle_count -= 1
+                if not teams:
+                    del self._idle[key]
+                self.hits += 1
+                return team
+            self.misses += 1
+        # 구성은 락 밖에서 (다른 세션을 막지 않도록)
+        return build()
+
+    def release(self, key: Hashable, team):
+        reset_team_state(team)
+        with self._lock:
+            self._idle.setdefault(key, []).append(team)
+            self._idle.move_to_end(key)
+            self._idle_count += 1
+            while self._idle_count > self.max_idle and self._idle:
+                old_key, old_teams = next(iter(self._idle.items()))
+                old_teams.pop(0)
+                self._idle_count -= 1
+                if not old_teams:
+                    del self._idle[old_key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "idle": self._idle_count,
+                "keys": len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_team_pool() -> TeamPool:
+    """프로세스 공용 Team 풀"""
+    return TeamPool()
@@ -0,0 +1,472 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+# 팀장(멤버) 배정용 도구 - 도구 로그에서는 "누구에게 맡겼는지"만 보여줌
+MEMBER_DISPATCH_TOOLS = ("transfer_task_to_member", "forward_task_to_member", "run_member_agents")
+
+# 팀장 1차 발언을 동시에 실행할 수 있는 팀 모드와 최대 동시 실행 수
+# - coordinate: 팀장 의견을 동시에 받고 리더가 종합 (리더의 팀장별 세부 과업 배분은 생략)
+# - collaborate: 첫 입장 발표만 동시에 받고, 반박 라운드와 공동 결론은 팀 실행으로 이어감
+PARALLEL_TEAM_MODES = ("coordinate", "collaborate")
+PARALLEL_MEMBER_WORKERS = int(os.getenv("PARALLEL_MEMBER_WORKERS", "8"))
+
+
+# ======================== 이벤트 타입 ========================
+
+class TeamEvent:
+    """Team 실행 중 발생하는 이벤트 (member가 None이면 리더/팀 자체)"""
+
+    __slots__ = ('member',)
+    kind = "event"
+
+    def __init__(self, member: Optional[str] = None):
+        self.member = member
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields())
+        return f"{type(self).__name__}({fields})"
+
+    @classmethod
+    def _fields(cls) -> List[str]:
+        names = []
+        for klass in reversed(cls.__mro__):
+            names.extend(getattr(klass, "__slots__", ()))
+        return names
+
+
+class MemberStarted(TeamEvent):
+    __slots__ = ()
+    kind = "member_started"
+
+
+class MemberFinished(TeamEvent):
+    __slots__ = ('metrics',)
+    kind = "member_finished"
+
+    def __init__(self, member: str, metrics: Optional[Dict] = None):
+        super().__init__(member)
+        self.metrics = metrics or {}
+
+
+class MemberContent(TeamEvent):
+    __slots__ = ('text',)
+    kind = "member_content"
+
+    def __init__(self, member: str, text: str):
+        super().__init__(member)
+        self.text = text
+
+
+class LeaderContent(TeamEvent):
+    __slots__ = ('text',)
+    kind = "leader_content"
+
+    def __init__(self, text: str):
+        super().__init__(None)
+        self.text = text
+
+
+class ToolCall(TeamEvent):
+    __slots__ = ('tool_name', 'tool_args')
+    kind = "tool_call"
+
+    def __init__(self, member: Optional[str], tool_name: str, tool_args: Optional[Dict] = None):
+        super().__init__(member)
+        self.tool_name = tool_name
+        self.tool_args = tool_args or {}
+
+
+class ToolResult(TeamEvent):
+    __slots__ = ('tool_name', 'tool_args', 'result', 'duration', 'error')
+    kind = "tool_result"
+
+    def __init__(self, member: Optional[str], tool_name: str, tool_args: Optional[Dict] = None,
+                 result: Optional[str] = None, duration: Optional[float] = None, error: bool = False):
+        super().__init__(member)
+        self.tool_name = tool_name
+        self.tool_args = tool_args or {}
+        self.result = result
+        self.duration = duration
+        self.error = error
+
+
+class RunMetrics(TeamEvent):
+    """실행 완료 시 리더 지표 + 팀장별 지표"""
+    __slots__ = ('metrics', 'member_metrics')
+    kind = "metrics"
+
+    def __init__(self, metrics: Optional[Dict] = None, member_metrics: Optional[Dict[str, Dict]] = None):
+        super().__init__(None)
+        self.metrics = metrics or {}
+        self.member_metrics = member_metrics or {}
+
+
+class RunError(TeamEvent):
+    __slots__ = ('message',)
+    kind = "error"
+
+    def __init__(self, member: Optional[str], message: str):
+        super().__init__(member)
+        self.message = message
+
+
+# ======================== Agno 응답 → 이벤트 변환 ========================
+
+class TeamEventMapper:
+    """
+    Agno가 내보내는 구조화된 스트림 이벤트를 TeamEvent로 변환
+    - "Team..." 이벤트는 리더, 그 외(agent_name 포함)는 멤버 이벤트
+    - 구버전 RunResponse(event 없음)는 content만 리더 발화로 처리
+    """
+
+    def __init__(self, team):
+        self.team = team
+        self._started = set()
+
+    def _member_started(self, member: str) -> Iterator[TeamEvent]:
+        if member not in self._started:
+            self._started.add(member)
+            yield MemberStarted(member)
+
+    def map(self, chunk) -> Iterator[TeamEvent]:
+        event = getattr(chunk, "event", None) or ""
+        is_team = event.startswith("Team") or not getattr(chunk, "agent_name", None)
+        name = event[4:] if event.startswith("Team") else event
+        member = None if is_team else chunk.agent_name
+
+        if name in ("RunResponseContent", "RunResponse", ""):
+            content = getattr(chunk, "content", None)
+            if not content or not isinstance(content, str):
+                return
+            if member:
+                yield from self._member_started(member)
+                yield MemberContent(member, content)
+            else:
+                yield LeaderContent(content)
+
+        elif name == "RunStarted":
+            if member:
+                yield from self._member_started(member)
+
+        elif name == "ToolCallStarted":
+            tool = getattr(chunk, "tool", None)
+            if tool is not None:
+                yield ToolCall(member, tool.tool_name or "", tool.tool_args)
+
+        elif name == "ToolCallCompleted":
+            tool = getattr(chunk, "tool", None)
+            if tool is not None:
+                metrics = getattr(tool, "metrics", None)
+                yield ToolResult(
+                    member,
+                    tool.tool_name or "",
+                    tool.tool_args,
+                    result=tool.result,
+                    duration=getattr(metrics, "time", None),
+                    error=bool(tool.tool_call_error),
+                )
+
+        elif name == "RunCompleted":
+            if member:
+                self._started.discard(member)
+                yield MemberFinished(member, _metrics_of(chunk))
+            else:
+                yield self._run_metrics()
+
+        elif name == "RunError":
+            yield RunError(member, str(getattr(chunk, "content", "") or ""))
+
+    def _run_metrics(self) -> RunMetrics:
+        """완료된 실행의 리더/팀장별 지표 (Agno가 run_response에 집계해 둔 값)"""
+        run_response = getattr(self.team, "run_response", None)
+        member_metrics: Dict[str, Dict] = {}
+        for response in getattr(run_response, "member_responses", None) or []:
+            member = getattr(response, "agent_name", None) or getattr(response, "team_name", None)
+            if member:
+                member_metrics[member] = getattr(response, "metrics", None) or {}
+        return RunMetrics(_metrics_of(run_response), member_metrics)
+
+
+def _metrics_of(obj) -> Dict:
+    metrics = getattr(obj, "metrics", None)
+    return dict(metrics) if isinstance(metrics, dict) else {}
+
+
+def iter_team_events(team, message: str, session_id: str = None) -> Iterator[TeamEvent]:
+    """Team 실행 → TeamEvent 스트림"""
+    mapper = TeamEventMapper(team)
+    stream = team.run(message, stream=True, stream_intermediate_steps=True, session_id=session_id)
+    for chunk in stream:
+        yield from mapper.map(chunk)
+
+
+# ======================== 팀장 동시 실행 (fan-out → 리더 종합) ========================
+
+MEMBER_TASK_TEMPLATES = {
+    "coordinate": (
+        "다음 회의 주제에 대해 당신의 역할과 소속팀 관점에서 의견을 제시하세요.\n"
+        "필요하면 검색으로 근거를 확인하고, 핵심 주장과 근거, 리스크, 제안을 정리하세요.\n\n"
+        "회의 주제:\n{message}"
+    ),
+    "collaborate": (
+        "다음 회의 주제에 대한 토론의 첫 입장 발표입니다. 당신의 역할과 소속팀 관점에서 입장을 밝히세요.\n"
+        "다른 팀장들의 입장에 대한 반박과 공동 결론은 이후 토론 라운드에서 이어집니다.\n\n"
+        "회의 주제:\n{message}"
+    ),
+}
+
+SYNTHESIS_TEMPLATE = (
+    "아래는 회의 주제와 각 팀장의 1차 의견입니다.\n"
+    "팀 리더로서 팀장들의 의견을 비교하고, 합의점과 이견, 최종 결론과 실행 방안을 정리한 최종 보고서를 작성하세요.\n\n"
+    "회의 주제:\n{message}\n\n{opinions}"
+)
+
+DEBATE_TEMPLATE = (
+    "아래는 회의 주제와 각 팀장이 이미 발표한 1차 입장입니다. 1차 입장 발표는 다시 하지 마세요.\n"
+    "이 입장들에서 토론을 이어가세요: 상반된 주장은 팀장들이 반박·재반박하고(최대 3라운드), "
+    "매 라운드마다 합의 가능 지점을 정리한 뒤 팀 지침에 따라 공동 결론을 작성하세요.\n\n"
+    "회의 주제:\n{message}\n\n{opinions}"
+)
+
+
+def build_member_task(mode: str, message: str) -> str:
+    """팀장에게 동시에 보낼 1차 과제"""
+    template = MEMBER_TASK_TEMPLATES.get(mode, MEMBER_TASK_TEMPLATES["coordinate"])
+    return template.format(message=message)
+
+
+def _format_opinions(opinions: Dict[str, str]) -> str:
+    return "\n\n".join(f"### {member}\n{text.strip() or '(응답 없음)'}" for member, text in opinions.items())
+
+
+def build_synthesis_prompt(message: str, opinions: Dict[str, str]) -> str:
+    """리더 종합용 프롬프트 (팀장 순서 유지)"""
+    return SYNTHESIS_TEMPLATE.format(message=message, opinions=_format_opinions(opinions))
+
+
+def build_debate_prompt(message: str, opinions: Dict[str, str]) -> str:
+    """collaborate 반박 라운드용 팀 메시지 (동시에 받은 1차 입장 포함)"""
+    return DEBATE_TEMPLATE.format(message=message, opinions=_format_opinions(opinions))
+
+
+def _leader_system_prompt(team) -> str:
+    """리더 모델용 시스템 프롬프트 (팀 description/instructions 재사용)"""
+    instructions = getattr(team, "instructions", None) or []
+    if callable(instructions):
+        instructions = instructions()
+    if isinstance(instructions, str):
+        instructions = [instructions]
+    lines = [team.description] if getattr(team, "description", None) else []
+    lines.extend(f"- {line}" for line in instructions if line)
+    if getattr(team, "markdown", False):
+        lines.append("- 응답은 마크다운 형식으로 작성하세요.")
+    return "\n".join(lines)
+
+
+def _message_metrics(message) -> Dict:
+    """Agno Message.metrics → Team 지표와 같은 {이름: [값]} 형태"""
+    metrics = getattr(message, "metrics", None)
+    if metrics is None:
+        return {}
+    raw = metrics.to_dict() if hasattr(metrics, "to_dict") else dict(metrics)
+    return {k: [v] for k, v in raw.items() if isinstance(v, (int, float)) and v}
+
+
+def _merge_metrics(first: Optional[Dict], second: Optional[Dict]) -> Dict:
+    """같은 에이전트의 두 실행 지표를 합침 (Agno처럼 값마다 리스트로 이어 붙임)"""
+    merged: Dict[str, List] = {}
+    for metrics in (first or {}, second or {}):
+        for name, value in metrics.items():
+            values = value if isinstance(value, list) else [value]
+            merged.setdefault(name, []).extend(v for v in values if isinstance(v, (int, float)))
+    return merged
+
+
+def _iter_member_fanout(team, task: str, session_id: str, opinions: Dict[str, List[str]],
+                        member_metrics: Dict[str, Dict]) -> Iterator[TeamEvent]:
+    """팀장마다 별도 스레드에서 agent.run(stream=True) → 이벤트를 도착 순서대로 내보냄 (발언/지표는 인자에 모음)"""
+    members = list(getattr(team, "members", None) or [])
+    events: "queue.Queue" = queue.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def run_member(member):
+        mapper = TeamEventMapper(team)
+        try:
+            for chunk in member.run(task, stream=True, stream_intermediate_steps=True, session_id=session_id):
+                if stop.is_set():
+                    break
+                for event in mapper.map(chunk):
+                    events.put(event)
+        except Exception as e:
+            events.put(RunError(member.name, str(e)))
+        finally:
+            events.put(done)
+
+    opinions.update({member.name: [] for member in members})
+    executor = ThreadPoolExecutor(max_workers=max(1, min(len(members), PARALLEL_MEMBER_WORKERS)),
+                                  thread_name_prefix="team-member")
+    try:
+        for member in members:
+            executor.submit(run_member, member)
+        remaining = len(members)
+        while remaining:
+            event = events.get()
+            if event is done:
+                remaining -= 1
+                continue
+            if isinstance(event, MemberContent):
+                opinions.setdefault(event.member, []).append(event.text)
+            elif isinstance(event, MemberFinished):
+                member_metrics[event.member] = event.metrics
+            yield event
+    finally:
+        # 소비자가 중간에 멈추면 남은 팀장 실행도 다음 청크에서 중단
+        stop.set()
+        executor.shutdown(wait=False)
+
+
+def _iter_leader_synthesis(team, message: str, opinions: Dict[str, str],
+                           member_metrics: Dict[str, Dict]) -> Iterator[TeamEvent]:
+    """리더 종합 (팀장 재위임 없이 리더 모델만 호출)"""
+    from agno.models.message import Message
+
+    messages = [
+        Message(role="system", content=_leader_system_prompt(team)),
+        Message(role="user", content=build_synthesis_prompt(message, opinions)),
+    ]
+    for response in team.model.response_stream(messages=messages):
+        content = getattr(response, "content", None)
+        if content and isinstance(content, str):
+            yield LeaderContent(content)
+    assistant = next((m for m in reversed(messages) if m.role == team.model.assistant_message_role), None)
+    yield RunMetrics(_message_metrics(assistant), member_metrics)
+
+
+def _iter_debate_rounds(team, message: str, opinions: Dict[str, str], member_metrics: Dict[str, Dict],
+                        session_id: str = None) -> Iterator[TeamEvent]:
+    """
+    collaborate 반박 라운드 ~ 공동 결론 (1차 입장을 넣어 팀 실행으로 이어감)
+    - 팀장 지표는 1차 입장 실행분과 합쳐서 내보냄 (사용량/응답 시간 기록이 1차 입장을 덮어쓰지 않도록)
+    """
+    for event in iter_team_events(team, build_debate_prompt(message, opinions), session_id=session_id):
+        if isinstance(event, MemberFinished):
+            event = MemberFinished(event.member, _merge_metrics(member_metrics.get(event.member), event.metrics))
+        elif isinstance(event, RunMetrics):
+            merged = {member: _merge_metrics(member_metrics.get(member), metrics)
+                      for member, metrics in event.member_metrics.items()}
+            for member, metrics in member_metrics.items():
+                merged.setdefault(member, metrics)
+            event = RunMetrics(event.metrics, merged)
+        yield event
+
+
+def iter_parallel_team_events(team, message: str, session_id: str = None) -> Iterator[TeamEvent]:
+    """
+    팀장 1차 발언을 동시에 실행한 뒤 이어서 진행
+    - coordinate: 리더 모델이 팀장 의견을 모아 최종 보고서를 스트리밍 (전체 시간 ≈ 가장 느린 팀장 + 종합)
+    - collaborate: 동시에 받은 첫 입장을 팀 실행에 넘겨 반박 라운드와 공동 결론을 이어감
+    """
+    mode = getattr(team, "mode", "coordinate")
+    opinions: Dict[str, List[str]] = {}
+    member_metrics: Dict[str, Dict] = {}
+    yield from _iter_member_fanout(team, build_member_task(mode, message), session_id, opinions, member_metrics)
+
+    gathered = {name: "".join(chunks) for name, chunks in opinions.items()}
+    if mode == "collaborate":
+        yield from _iter_debate_rounds(team, message, gathered, member_metrics, session_id=session_id)
+    else:
+        yield from _iter_leader_synthesis(team, message, gathered, member_metrics)
+
+
+def iter_meeting_events(team, message: str, session_id: str = None, parallel: bool = False) -> Iterator[TeamEvent]:
+    """회의 실행 방식 선택 (parallel이면서 지원 모드일 때만 팀장 동시 실행)"""
+    if parallel and getattr(team, "mode", None) in PARALLEL_TEAM_MODES and getattr(team, "members", None):
+        return iter_parallel_team_events(team, message, session_id=session_id)
+    return iter_team_events(team, message, session_id=session_id)
+
+
+# ======================== 표시/저장용 변환 ========================
+
+def format_tool_event(event: TeamEvent) -> str:
+    """도구 로그 한 줄 (마크다운)"""
+    who = f"[{event.member}] " if event.member else ""
+    if isinstance(event, ToolCall):
+        args = ", ".join(f"{k}={v!r}" for k, v in event.tool_args.items()
+                         if event.tool_name not in MEMBER_DISPATCH_TOOLS or k in ("member_id", "member_name"))
+        return f"`{who}{event.tool_name}({args}) 시작`"
+    duration = f" completed in {event.duration:.2f}s" if event.duration is not None else " completed"
+    status = " ❌" if event.error else ""
+    return f"`{who}{event.tool_name}{duration}`{status}"
+
+
+def _sum_metric(metrics: Dict, name: str) -> int:
+    value = metrics.get(name) or 0
+    return int(sum(v or 0 for v in value)) if isinstance(value, list) else int(value)
+
+
+def format_cache_report(event: RunMetrics) -> str:
+    """리더/팀장별 입력 토큰 중 프롬프트 캐시 적중 토큰 (예: "리더 1200/4000 · A 800/2500")"""
+    parts = []
+    for who, metrics in [("리더", event.metrics), *event.member_metrics.items()]:
+        total = _sum_metric(metrics, "input_tokens")
+        if total:
+            parts.append(f"{who} {_sum_metric(metrics, 'cached_tokens')}/{total}")
+    return " · ".join(parts)
+
+
+def event_to_text(event: TeamEvent) -> str:
+    """기존 텍스트 스트림과 호환되는 표현 (멤버 구분 제목 + 도구 완료 로그)"""
+    if isinstance(event, (LeaderContent, MemberContent)):
+        return event.text
+    if isinstance(event, MemberStarted):
+        return f"\n\n#### 🧑‍💼 {event.member}\n\n"
+    if isinstance(event, ToolResult):
+        return f"\n\n{format_tool_event(event)}\n\n"
+    if isinstance(event, RunError):
+        return f"\n\n❌ {event.message}\n\n"
+    return ""
+
+
+class TranscriptSegments:
+    """
+    회의 기록을 발화자별 구간으로 저장
+    - 같은 발화자의 연속된 청크는 한 구간에 모음 (리스트에 쌓고 필요할 때만 join)
+    - segments: [{"kind": "member"/"leader", "speaker": 이름 또는 None, "text": ...}]
+    """
+
+    def __init__(self):
+        self._segments: List[Dict] = []
+
+    def add(self, event: TeamEvent):
+        if isinstance(event, MemberContent):
+            kind, speaker = "member", event.member
+        elif isinstance(event, LeaderContent):
+            kind, speaker = "leader", None
+        else:
+            return
+        last = self._segments[-1] if self._segments else None
+        if last is None or last["kind"] != kind or last["speaker"] != speaker:
+            last = {"kind": kind, "speaker": speaker, "chunks": []}
+            self._segments.append(last)
+        last["chunks"].append(event.text)
+
+    @property
+    def segments(self) -> List[Dict]:
+        return [
+            {"kind": s["kind"], "speaker": s["speaker"], "text": "".join(s["chunks"])}
+            for s in self._segments
+        ]
+
+    def to_markdown(self) -> str:
+        """다운로드/저장용 전체 마크다운 (팀장 발언은 제목으로 구분)"""
+        parts = []
+        for segment in self.segments:
+            if segment["kind"] == "member":
+                parts.append(f"#### 🧑‍💼 {segment['speaker']}\n\n{segment['text'].strip()}")
+            else:
+                parts.append(segment["text"].strip())
+        return "\n\n".join(p for p in parts if p)
@@ -0,0 +1,136 @@
+import os
+import time
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import streamlit as st
+
+# 팀장 목록 캐시 유지 시간(초) - 다른 프로세스에서 수정한 내용은 최대 이 시간만큼 늦게 반영됨
+TEAM_LEADS_CACHE_TTL = float(os.getenv("TEAM_LEADS_CACHE_TTL", "300"))
+
+class TeamLead:
+    """team_leads 테이블 한 행 (기존 5-튜플 대체)"""
+
+    __slots__ = ('id', 'name', 'role', 'personality', 'strategic_focus', 'version')
+
+    def __init__(self, id: int, name: str, role: str, personality: str, strategic_focus: str):
+        self.id = id
+        self.name = name
+        self.role = role
+        self.personality = personality or ""
+        self.strategic_focus = strategic_focus or ""
+        # 행 내용 기반 버전 (내용이 바뀌면 값도 바뀜 → 팀 캐시 키 등에 사용)
+        raw = "\x1f".join([str(id), name or "", role or "", self.personality, self.strategic_focus])
+        self.version = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+    @classmethod
+    def from_row(cls, row: dict) -> "TeamLead":
+        return cls(row['id'], row['name'], row['role'], row.get('personality'), row.get('strategic_focus'))
+
+    def __repr__(self) -> str:
+        return f"TeamLead(id={self.id!r}, name={self.name!r}, version={self.version!r})"
+
+
+class TeamLeadRepository:
+    """
+    team_leads 조회/수정 창구 (read-through 캐시 + id/name 인덱스)
+    - 전체 목록은 TTL 동안 메모리에서 제공
+    - 이름으로 찾을 때 캐시에 없는 항목만 한 번으로 묶어서 조회
+    - 쓰기(추가/수정/삭제)가 일어나면 캐시를 무효화
+    """
+
+    def __init__(self, storage, ttl: float = TEAM_LEADS_CACHE_TTL):
+        self.storage = storage
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._leads: List[TeamLead] = []
+        self._by_id: Dict[int, TeamLead] = {}
+        self._by_name: Dict[str, TeamLead] = {}
+        self._loaded_at: Optional[float] = None
+
+    # ---------- 캐시 ----------
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and (time.monotonic() - self._loaded_at) < self.ttl
+
+    def _index(self, leads: Iterable[TeamLead]):
+        for lead in leads:
+            self._by_id[lead.id] = lead
+            self._by_name[lead.name] = lead
+
+    def invalidate(self):
+        """캐시 전체 무효화 (다음 조회 시 DB에서 다시 읽음)"""
+        with self._lock:
+            self._leads = []
+            self._by_id = {}
+            self._by_name = {}
+            self._loaded_at = None
+
+    # ---------- 조회 ----------
+    def all(self) -> List[TeamLead]:
+        """전체 팀장 목록 (id 순)"""
+        with self._lock:
+            if not self._is_fresh():
+                self._leads = [TeamLead.from_row(row) for row in self.storage.team_leads()]
+                self._by_id = {}
+                self._by_name = {}
+                self._index(self._leads)
+                self._loaded_at = time.monotonic()
+            return list(self._leads)
+
+    def get_by_id(self, lead_id: int) -> Optional[TeamLead]:
+        with self._lock:
+            if not self._is_fresh():
+                self.all()
+            return self._by_id.get(lead_id)
+
+    def get_many_by_name(self, names: Iterable[str]) -> Dict[str, TeamLead]:
+        """
+        이름 목록 → {이름: TeamLead}
+        - 캐시에 없는 이름만 모아서 한 번의 쿼리로 조회 (N+1 방지)
+        """
+        names = list(dict.fromkeys(names))
+        with self._lock:
+            if not self._is_fresh():
+                self.all()
+            missing = [n for n in names if n not in self._by_name]
+            if missing:
+                self._index(TeamLead.from_row(row) for row in self.storage.team_leads_by_name(missing))
+            return {n: self._by_name[n] for n in names if n in self._by_name}
+
+    def get_by_name(self, name: str) -> Optional[TeamLead]:
+        return self.get_many_by_name([name]).get(name)
+
+    # ---------- 쓰기 (모두 캐시 무효화) ----------
+    def insert_many(self, rows: List[dict]):
+        """여러 팀장을 한 번의 insert로 추가"""
+        try:
+            self.storage.insert_team_leads(rows)
+        finally:
+            self.invalidate()
+
+    def update(self, lead_id: int, name: str, role: str, personality: str, strategic_focus: str):
+        try:
+            self.storage.update_team_lead(lead_id, {
+                'name': name,
+                'role': role,
+                'personality': personality,
+                'strategic_focus': strategic_focus
+            })
+        finally:
+            self.invalidate()
+
+    def clear(self):
+        try:
+            self.storage.clear_team_leads()
+        finally:
+            self.invalidate()
+
+
+@st.cache_resource(show_spinner=False)
+def get_team_lead_repository(_storage, cache_key: str) -> TeamLeadRepository:
+    """
+    저장소(=DB)당 하나의 팀장 창구를 프로세스 전체에서 공유
+    - _storage는 해시 대상에서 제외되므로 cache_key(Supabase URL 또는 SQLite 경로)로 구분
+    """
+    return TeamLeadRepository(_storage)
@@ -0,0 +1,130 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import streamlit as st
+
+# 메모리에 둘 최대 대화 수 (넘으면 가장 오래 안 쓴 대화부터 버림)
+TRANSCRIPT_STORE_MAX = int(os.getenv("TRANSCRIPT_STORE_MAX", "500"))
+
+# (talk_seq, from_to, 내용)
+Turn = Tuple[int, str, str]
+# DB에서 대화 전체를 읽는 함수 → (시간순 턴 목록, 보관된 요약 또는 None), 읽지 못하면 None
+Loader = Callable[[], Optional[Tuple[List[Turn], Optional[str]]]]
+
+
+class Transcript:
+    """
+    대화 하나(subject)의 메모리 사본
+    - render가 있으면 턴마다 프롬프트용 조각(예: XML 이스케이프된 <turn>)을 미리 만들어 둠
+    """
+
+    def __init__(self, render: Optional[Callable[[str, str], str]] = None):
+        self.render = render
+        self.turns: List[Turn] = []
+        self.fragments: List[str] = []
+        self.summary: Optional[str] = None
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    @property
+    def last_seq(self) -> int:
+        return self.turns[-1][0] if self.turns else 0
+
+    def history(self, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """(from_to, 내용) 목록 (limit이면 최근 limit건)"""
+        turns = self.turns[-limit:] if limit else self.turns
+        return [(from_to, content) for _, from_to, content in turns]
+
+    def recent_fragments(self, limit: Optional[int] = None) -> List[str]:
+        return self.fragments[-limit:] if limit else list(self.fragments)
+
+    def _reset(self, turns: List[Turn], summary: Optional[str]):
+        self.turns = list(turns)
+        self.fragments = [self.render(from_to, content) for _, from_to, content in turns] if self.render else []
+        self.summary = summary
+        self.loaded = True
+
+    def _extend(self, turns: List[Turn]):
+        self.turns.extend(turns)
+        if self.render:
+            self.fragments.extend(self.render(from_to, content) for _, from_to, content in turns)
+
+
+class TranscriptStore:
+    """
+    대화별 메모리 사본 (write-through)
+    - 처음 볼 때 한 번만 DB에서 읽고, 이후 저장하는 턴은 DB와 함께 사본에도 바로 추가
+    - 새로 받은 talk_seq가 사본의 다음 번호가 아니면(다른 탭/사용자가 끼어듦) 다음 조회 때 다시 읽음
+    - 보관(요약) 등으로 DB가 바뀌면 invalidate로 다시 읽게 함
+    """
+
+    def __init__(self, max_transcripts: int = TRANSCRIPT_STORE_MAX):
+        self.max_transcripts = max_transcripts
+        self._lock = threading.Lock()
+        self._transcripts: "OrderedDict[Hashable, Transcript]" = OrderedDict()
+        self.loads = 0
+        self.hits = 0
+
+    def _entry(self, key: Hashable, render=None) -> Transcript:
+        with self._lock:
+            transcript = self._transcripts.get(key)
+            if transcript is None:
+                transcript = self._transcripts[key] = Transcript(render)
+                while len(self._transcripts) > self.max_transcripts:
+                    self._transcripts.popitem(last=False)
+            else:
+                self._transcripts.move_to_end(key)
+            return transcript
+
+    def get(self, key: Hashable, loader: Loader, render=None) -> Transcript:
+        """
+        사본 반환 (없거나 무효화됐으면 loader로 다시 읽음)
+        - loader가 None(조회 실패)이면 빈 사본을 돌려주되 읽은 것으로 표시하지 않음 → 다음 조회 때 다시 시도
+        """
+        transcript = self._entry(key, render)
+        with transcript.lock:
+            if transcript.loaded:
+                self.hits += 1
+            else:
+                transcript.render = render or transcript.render
+                loaded = loader()
+                if loaded is None:
+                    print(f"[DEBUG] 대화 사본 로드 실패 - {key}: 다음 조회 때 다시 읽음")
+                    transcript.turns, transcript.fragments, transcript.summary = [], [], None
+                    return transcript
+                turns, summary = loaded
+                transcript._reset(turns, summary)
+                self.loads += 1
+                print(f"[DEBUG] 대화 사본 로드 - {key}: {len(turns)}턴")
+        return transcript
+
+    def append(self, key: Hashable, turns: List[Turn]):
+        """저장한 턴을 사본에도 추가 (번호가 이어지지 않으면 무효화)"""
+        if not turns:
+            return
+        transcript = self._entry(key)
+        with transcript.lock:
+            if not transcript.loaded:
+                return
+            if turns[0][0] != transcript.last_seq + 1:
+                print(f"[DEBUG] 대화 사본 불일치 - {key}: 마지막 {transcript.last_seq}, 새 번호 {turns[0][0]} → 다시 읽음")
+                transcript.loaded = False
+                return
+            transcript._extend(turns)
+
+    def invalidate(self, key: Hashable):
+        transcript = self._entry(key)
+        with transcript.lock:
+            transcript.loaded = False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"transcripts": len(self._transcripts), "loads": self.loads, "hits": self.hits}
+
+
+@st.cache_resource(show_spinner=False)
+def get_transcript_store() -> TranscriptStore:
+    """프로세스 공용 대화 사본 저장소"""
+    return TranscriptStore()
@@ -0,0 +1,302 @@
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import streamlit as st
+
+from team_events import MemberFinished, RunMetrics
+from llm import usage_cached_tokens
+from write_queue import insert_rows
+
+# 호출별 토큰/비용 기록 (false면 기록/한도 확인 모두 하지 않음)
+USAGE_ENABLED = os.getenv("USAGE_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+# 사용자별 기간 한도(USD), 0이면 제한 없음 / 사용자별 한도 {"아이디": 5.0} (JSON)
+USAGE_BUDGET_USD = float(os.getenv("USAGE_BUDGET_USD", "0"))
+USAGE_USER_BUDGETS = json.loads(os.getenv("USAGE_USER_BUDGETS", "") or "{}")
+# 한도 기간 (day / month, UTC 기준)
+USAGE_BUDGET_PERIOD = os.getenv("USAGE_BUDGET_PERIOD", "month").lower()
+# 한도를 넘었을 때 - block(실행 막음) / downgrade(저렴한 모델로 실행)
+USAGE_BUDGET_ACTION = os.getenv("USAGE_BUDGET_ACTION", "block").lower()
+USAGE_DOWNGRADE_MODEL = os.getenv("USAGE_DOWNGRADE_MODEL", "gpt-4o-mini")
+
+USAGE_TABLE = "talk_usage"
+
+# 모델별 100만 토큰당 가격(USD) - (입력, 캐시 적중 입력, 출력), USAGE_PRICES(JSON)로 덮어쓰기/추가
+MODEL_PRICES: Dict[str, tuple] = {
+    "gpt-5": (1.25, 0.125, 10.00),
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+    "gpt-5-nano": (0.05, 0.005, 0.40),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+MODEL_PRICES.update({model: tuple(price) for model, price in
+                     json.loads(os.getenv("USAGE_PRICES", "") or "{}").items()})
+
+LEADER = "리더"
+
+
+def model_price(model: str) -> Optional[tuple]:
+    """모델 가격 (버전이 붙은 이름은 가장 길게 일치하는 기본 이름으로, 예: gpt-4o-2024-08-06 → gpt-4o)"""
+    if model in MODEL_PRICES:
+        return MODEL_PRICES[model]
+    matches = [name for name in MODEL_PRICES if model.startswith(name + "-")]
+    return MODEL_PRICES[max(matches, key=len)] if matches else None
+
+
+def compute_cost(model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+    """호출 비용(USD) - 가격을 모르는 모델은 0 (입력 토큰에는 캐시 적중 토큰이 포함됨)"""
+    price = model_price(model or "")
+    if price is None:
+        return 0.0
+    uncached = max(input_tokens - cached_tokens, 0)
+    return (uncached * price[0] + cached_tokens * price[1] + output_tokens * price[2]) / 1_000_000
+
+
+def _metric_total(metrics: Dict, name: str) -> int:
+    """Agno 지표 값 합계 (호출마다 리스트로 쌓임)"""
+    value = metrics.get(name) or 0
+    return int(sum(v or 0 for v in value)) if isinstance(value, list) else int(value)
+
+
+def period_start(now: Optional[datetime] = None, period: str = USAGE_BUDGET_PERIOD) -> datetime:
+    """한도 기간 시작 시각 (UTC)"""
+    now = now or datetime.now(timezone.utc)
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start if period == "day" else start.replace(day=1)
+
+
+class UsageMeter:
+    """
+    실행 하나(회의/채팅 한 턴)의 에이전트별 토큰 사용량
+    - 직접 호출(ChatCompletionResult)은 add_completion으로 누적
+    - Team 실행은 Agno 지표(MemberFinished / RunMetrics)로 기록 - 같은 에이전트는 마지막 값으로 대체
+    - stream_id는 회의/대화 묶음 (집계 단위), subject_seq는 대화 테이블과 같은 번호
+    """
+
+    def __init__(self, app: str, user: str, model: str, stream_id: str,
+                 subject_seq: Optional[int] = None):
+        self.app = app
+        self.user = user or ""
+        self.model = model
+        self.stream_id = stream_id
+        self.subject_seq = subject_seq
+        self.agents: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def add(self, agent: str, input_tokens: int, cached_tokens: int, output_tokens: int,
+            model: Optional[str] = None):
+        with self._lock:
+            usage = self.agents.setdefault(agent, {"model": model or self.model, "input_tokens": 0,
+                                                   "cached_tokens": 0, "output_tokens": 0})
+            usage["input_tokens"] += input_tokens
+            usage["cached_tokens"] += cached_tokens
+            usage["output_tokens"] += output_tokens
+
+    def add_completion(self, agent: str, result):
+        """직접 호출 결과 - 캐시에서 재생한 응답은 API 호출이 없으므로 제외"""
+        if result.cached or not result.usage:
+            return
+        prompt_tokens, cached_tokens = usage_cached_tokens(result.usage)
+        self.add(agent, prompt_tokens, cached_tokens, int(result.usage.get("completion_tokens") or 0),
+                 model=result.model)
+
+    def _set_metrics(self, agent: str, metrics: Dict):
+        if not metrics:
+            return
+        with self._lock:
+            self.agents[agent] = {
+                "model": self.model,
+                "input_tokens": _metric_total(metrics, "input_tokens"),
+                "cached_tokens": _metric_total(metrics, "cached_tokens"),
+                "output_tokens": _metric_total(metrics, "output_tokens"),
+            }
+
+    def observe(self, event):
+        if isinstance(event, MemberFinished):
+            self._set_metrics(event.member, event.metrics)
+        elif isinstance(event, RunMetrics):
+            self._set_metrics(LEADER, event.metrics)
+            for member, metrics in event.member_metrics.items():
+                self._set_metrics(member, metrics)
+
+    def observe_events(self, events: Iterable) -> Iterator:
+        """이벤트 스트림을 그대로 넘기면서 Agno 지표 기록 (작업 스레드에서 실행)"""
+        for event in events:
+            self.observe(event)
+            yield event
+
+    def rows(self) -> List[Dict]:
+        """talk_usage 행 (에이전트별 한 행)"""
+        with self._lock:
+            agents = {agent: dict(usage) for agent, usage in self.agents.items()}
+        rows = []
+        for agent, usage in agents.items():
+            if not (usage["input_tokens"] or usage["output_tokens"]):
+                continue
+            rows.append({
+                "app": self.app,
+                "name": self.user,
+                "stream_id": self.stream_id,
+                "subject_seq": self.subject_seq,
+                "agent": agent,
+                "model": usage["model"],
+                "input_tokens": usage["input_tokens"],
+                "cached_tokens": usage["cached_tokens"],
+                "output_tokens": usage["output_tokens"],
+                "cost_usd": round(compute_cost(usage["model"], usage["input_tokens"],
+                                               usage["cached_tokens"], usage["output_tokens"]), 6),
+            })
+        return rows
+
+
+# ======================== 기록 / 한도 ========================
+
+class BudgetLedger:
+    """
+    사용자별 이번 기간 사용 금액 (프로세스 공용)
+    - 처음 한 번만 저장소에서 합계를 읽고, 이후에는 기록할 때마다 더함 (실행마다 DB 조회하지 않음)
+    """
+
+    def __init__(self):
+        self._spent: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, storage, user: str) -> tuple:
+        return (storage.location, user, period_start().isoformat())
+
+    def spent(self, storage, user: str) -> float:
+        key = self._key(storage, user)
+        with self._lock:
+            if key in self._spent:
+                return self._spent[key]
+        total = storage.usage_cost(user, period_start())
+        with self._lock:
+            return self._spent.setdefault(key, total)
+
+    def add(self, storage, user: str, cost: float):
+        key = self._key(storage, user)
+        with self._lock:
+            if key in self._spent:
+                self._spent[key] += cost
+
+
+@st.cache_resource(show_spinner=False)
+def get_budget_ledger() -> BudgetLedger:
+    """프로세스 공용 사용 금액 장부"""
+    return BudgetLedger()
+
+
+def record_usage(storage, meter: Optional[UsageMeter]) -> List[Dict]:
+    """실행 사용량 저장 (대화와 같은 지연 쓰기 대기열) - 작업 스레드에서도 호출 가능"""
+    if meter is None or storage is None:
+        return []
+    rows = meter.rows()
+    if not rows:
+        return []
+    try:
+        insert_rows(storage, USAGE_TABLE, rows)
+        get_budget_ledger().add(storage, meter.user, sum(row["cost_usd"] for row in rows))
+    except Exception as e:
+        print(f"[ERROR] 사용량 저장 실패: {e}")
+        return []
+    total = rollup(rows)["total"]
+    print(f"[DEBUG] 사용량 - {meter.app}/{meter.stream_id}: 입력 {total['input_tokens']} "
+          f"(캐시 {total['cached_tokens']}), 출력 {total['output_tokens']}, ${total['cost_usd']:.4f}")
+    return rows
+
+
+def budget_limit(user: str) -> Optional[float]:
+    """사용자 기간 한도(USD), 없으면 None"""
+    limit = USAGE_USER_BUDGETS.get(user, USAGE_BUDGET_USD)
+    return float(limit) if limit else None
+
+
+def budget_model(storage, user: str, model: str) -> Optional[str]:
+    """
+    한도 확인 후 이번 실행에 쓸 모델 반환
+    - 한도 안: 요청한 모델 / 초과: downgrade면 USAGE_DOWNGRADE_MODEL, block이면 None (실행 막음)
+    - 사용량을 읽지 못하면 실행은 막지 않음
+    """
+    limit = budget_limit(user)
+    if not USAGE_ENABLED or limit is None or storage is None:
+        return model
+    try:
+        spent = get_budget_ledger().spent(storage, user)
+    except Exception as e:
+        print(f"[ERROR] 사용량 조회 실패 - 한도 확인 생략: {e}")
+        return model
+    if spent < limit:
+        return model
+    print(f"[DEBUG] 사용 한도 초과 - {user}: ${spent:.2f} / ${limit:.2f} ({USAGE_BUDGET_ACTION})")
+    if USAGE_BUDGET_ACTION == "downgrade":
+        return USAGE_DOWNGRADE_MODEL
+    return None
+
+
+def budget_message(user: str) -> str:
+    limit = budget_limit(user) or 0.0
+    period = "오늘" if USAGE_BUDGET_PERIOD == "day" else "이번 달"
+    return f"❌ {period} 사용 한도(${limit:.2f})를 초과했습니다. 관리자에게 문의해주세요."
+
+
+# ======================== 집계 / 표시 ========================
+
+def rollup(rows: Iterable[Dict], key: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    talk_usage 행 합계 - key(agent / name / stream_id / app)별, key가 없으면 {"total": 합계}
+    - 메모리의 행(UsageMeter.rows)용, 저장된 사용량 집계는 storage.usage_rollup
+    """
+    totals: Dict[str, Dict] = {}
+    for row in rows:
+        group = str(row.get(key) or "-") if key else "total"
+        total = totals.setdefault(group, {"input_tokens": 0, "cached_tokens": 0, "output_tokens": 0,
+                                          "cost_usd": 0.0})
+        for column in ("input_tokens", "cached_tokens", "output_tokens"):
+            total[column] += int(row.get(column) or 0)
+        total["cost_usd"] += float(row.get("cost_usd") or 0)
+    if not key:
+        totals.setdefault("total", {"input_tokens": 0, "cached_tokens": 0, "output_tokens": 0,
+                                    "cost_usd": 0.0})
+    return totals
+
+
+def _rollup_table(totals: Dict[str, Dict], label: str) -> List[Dict]:
+    return [{label: group, "입력": total["input_tokens"], "캐시": total["cached_tokens"],
+             "출력": total["output_tokens"], "비용($)": round(total["cost_usd"], 4)}
+            for group, total in sorted(totals.items(), key=lambda item: -item[1]["cost_usd"])]
+
+
+def render_usage_panel(storage, user: str, stream_id: Optional[str] = None, key: str = "usage"):
+    """사이드바 "💰 사용량/비용" - 이번 기간 한도, 현재 회의/대화의 팀장별 합계, 사용자별 합계"""
+    if not USAGE_ENABLED or storage is None:
+        return
+    with st.expander("💰 사용량/비용", expanded=False):
+        period = "오늘" if USAGE_BUDGET_PERIOD == "day" else "이번 달"
+        limit = budget_limit(user)
+        try:
+            spent = get_budget_ledger().spent(storage, user)
+        except Exception as e:
+            st.error(f"사용량 조회 중 오류: {str(e)}")
+            return
+        if limit:
+            st.progress(min(spent / limit, 1.0), text=f"{period} ${spent:.2f} / ${limit:.2f}")
+        else:
+            st.caption(f"{period} 사용 금액: ${spent:.2f} (한도 없음)")
+
+        # 집계는 DB 조회가 필요하므로 버튼을 눌렀을 때만
+        if not st.button("📊 사용량 집계", key=f"{key}_rollup"):
+            return
+        try:
+            if stream_id:
+                st.markdown("**현재 회의/대화 (에이전트별)**")
+                st.dataframe(_rollup_table(storage.usage_rollup("agent", stream_id=stream_id), "에이전트"),
+                             hide_index=True)
+            st.markdown(f"**{period} 사용자별**")
+            st.dataframe(_rollup_table(storage.usage_rollup("name", since=period_start()), "사용자"),
+                         hide_index=True)
+        except Exception as e:
+            st.error(f"사용량 집계 중 오류: {str(e)}")
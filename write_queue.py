@@ -0,0 +1,328 @@
+import os
+import json
+import time
+import atexit
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+from uuid import uuid4
+
+import streamlit as st
+
+# 대화 저장을 백그라운드에서 모아서 쓰기 (false면 호출한 자리에서 바로 저장)
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+# 메모리에 쌓아 둘 최대 행 수 (가득 차면 호출한 자리에서 직접 저장), 한 번에 쓸 최대 행 수
+WRITE_QUEUE_MAX_ROWS = int(os.getenv("WRITE_QUEUE_MAX_ROWS", "1000"))
+WRITE_BATCH_ROWS = int(os.getenv("WRITE_BATCH_ROWS", "50"))
+# 모으는 시간(초), 재시도 횟수, 종료/조회 전 대기 한도(초)
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "0.2"))
+WRITE_MAX_ATTEMPTS = int(os.getenv("WRITE_MAX_ATTEMPTS", "5"))
+WRITE_SHUTDOWN_TIMEOUT = float(os.getenv("WRITE_SHUTDOWN_TIMEOUT", "10"))
+WRITE_READ_FLUSH_TIMEOUT = float(os.getenv("WRITE_READ_FLUSH_TIMEOUT", "2"))
+# 대기열 통계를 로그에 남기는 간격(초, 0이면 남기지 않음 - write_queue_stats()로 직접 조회)
+WRITE_STATS_INTERVAL = float(os.getenv("WRITE_STATS_INTERVAL", "60"))
+# 끝내 저장하지 못한 행을 남기는 파일 (JSON Lines)
+WRITE_FAILED_PATH = os.getenv("WRITE_FAILED_PATH", os.path.join(".cache", "write_queue_failed.jsonl"))
+
+# 중복 저장 방지 키 컬럼 (테이블에 unique 인덱스 필요)
+WRITE_KEY_COLUMN = "write_key"
+
+
+class PendingWrite:
+    """저장 대기 중인 행 하나"""
+
+    __slots__ = ('storage', 'table', 'row', 'enqueued_at', 'attempts', 'next_attempt_at', 'done')
+
+    def __init__(self, storage, table: str, row: Dict):
+        self.storage = storage
+        self.table = table
+        self.row = row
+        self.enqueued_at = time.time()
+        self.attempts = 0
+        # 재시도 대기 중이면 이 시각 전에는 쓰지 않음
+        self.next_attempt_at = self.enqueued_at
+        # 저장했거나 실패 파일에 기록함
+        self.done = False
+
+
+class WriteQueue:
+    """
+    대화 insert 지연 쓰기(write-behind)
+    - 스크립트는 행을 대기열에 넣고 바로 진행, 백그라운드 스레드가 테이블별로 모아 한 번에 저장
+    - 행마다 write_key를 붙여 storage.insert_talk(중복 무시) → 응답을 못 받아 재시도해도 두 번 저장되지 않음
+    - 실패하면 간격을 늘려 가며 재시도 (기다리는 동안 다른 행은 계속 저장), 끝내 실패하거나 종료 시 남은 행은 WRITE_FAILED_PATH에 기록
+    - 대기열이 가득 차면 호출한 자리에서 직접 저장 (메모리 무한 증가 방지)
+    """
+
+    def __init__(self, max_rows: int = WRITE_QUEUE_MAX_ROWS, batch_rows: int = WRITE_BATCH_ROWS,
+                 interval: float = WRITE_FLUSH_INTERVAL, max_attempts: int = WRITE_MAX_ATTEMPTS,
+                 failed_path: str = WRITE_FAILED_PATH):
+        self.max_rows = max_rows
+        self.batch_rows = batch_rows
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.failed_path = failed_path
+        self._items: Deque[PendingWrite] = deque()
+        self._inflight = 0
+        self._inflight_items: List[PendingWrite] = []
+        self._closed = False
+        self._cond = threading.Condition()
+        # 통계
+        self.written = 0
+        self.retries = 0
+        self.failed = 0
+        self.direct = 0
+        self.last_lag = 0.0
+        self.avg_lag = 0.0
+        self.max_lag = 0.0
+        self._stats_logged_at = time.time()
+        self._thread = threading.Thread(target=self._loop, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------- 스크립트 쪽 ----------
+    def submit(self, storage, table: str, rows: List[Dict]) -> List[str]:
+        """행들을 저장 대기열에 넣고 write_key 목록 반환 (가득 찼으면 바로 저장)"""
+        items = []
+        for row in rows:
+            row = dict(row)
+            row.setdefault(WRITE_KEY_COLUMN, f"{table}:{uuid4().hex}")
+            items.append(PendingWrite(storage, table, row))
+        keys = [item.row[WRITE_KEY_COLUMN] for item in items]
+
+        with self._cond:
+            queued = not self._closed and len(self._items) + len(items) <= self.max_rows
+            if queued:
+                self._items.extend(items)
+                self._cond.notify_all()
+        if not queued:
+            print(f"[DEBUG] 쓰기 대기열 가득 참 - {table} {len(items)}건 직접 저장")
+            self._write(storage, table, items)
+            with self._cond:
+                self.direct += len(items)
+        return keys
+
+    def flush(self, timeout: float = WRITE_READ_FLUSH_TIMEOUT) -> bool:
+        """
+        지금까지 넣은 행이 저장될 때까지 최대 timeout초 대기 (조회 전에 호출)
+        - 재시도 대기 중인 행은 기다리지 않음, 기다리던 행이 실패해 재시도 대기로 가도 더 기다리지 않음
+        """
+        with self._cond:
+            now = time.time()
+            waiting = {item: item.attempts for item in list(self._items) + self._inflight_items
+                       if item.next_attempt_at <= now or item in self._inflight_items}
+            return self._cond.wait_for(
+                lambda: all(item.done or item.attempts != attempts for item, attempts in waiting.items()),
+                timeout=timeout)
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._items) + self._inflight
+
+    def close(self, timeout: float = WRITE_SHUTDOWN_TIMEOUT):
+        """종료 시 남은 행 저장 (시간 안에 못 쓴 행은 실패 파일에 기록)"""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            leftover = list(self._items)
+            self._items.clear()
+            self._cond.notify_all()
+        if leftover:
+            self._record_failed(leftover, "shutdown")
+
+    # ---------- 백그라운드 쪽 ----------
+    def _next_due(self) -> float:
+        """가장 먼저 쓸 수 있는 행의 시각 (대기열이 비었으면 inf)"""
+        return min((item.next_attempt_at for item in self._items), default=float("inf"))
+
+    def _take_batch(self, now: float) -> List[PendingWrite]:
+        """쓸 때가 된 첫 행과 같은 (저장소, 테이블)의 쓸 때가 된 행을 최대 batch_rows건 꺼냄"""
+        first = next((item for item in self._items if item.next_attempt_at <= now), None)
+        if first is None:
+            return []
+        batch, rest = [], deque()
+        while self._items and len(batch) < self.batch_rows:
+            item = self._items.popleft()
+            if item.storage is first.storage and item.table == first.table and item.next_attempt_at <= now:
+                batch.append(item)
+            else:
+                rest.append(item)
+        self._items.extendleft(reversed(rest))
+        return batch
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._items or self._closed)
+                if self._closed and not self._items:
+                    return
+                # 재시도 대기 중인 행만 있으면 가장 빠른 재시도 시각까지 (새 행이 들어오면 바로) 깨어남
+                delay = self._next_due() - time.time()
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+            # 짧게 기다려 같은 테이블의 행을 모음
+            time.sleep(self.interval)
+            with self._cond:
+                batch = self._take_batch(time.time())
+                if not batch:
+                    continue
+                self._inflight += len(batch)
+                self._inflight_items.extend(batch)
+            try:
+                self._write(batch[0].storage, batch[0].table, batch)
+            except Exception as e:
+                self._retry(batch, e)
+            finally:
+                with self._cond:
+                    self._inflight -= len(batch)
+                    self._inflight_items = [item for item in self._inflight_items if item not in batch]
+                    self._cond.notify_all()
+
+    def _write(self, storage, table: str, items: List[PendingWrite]):
+        storage.insert_talk(table, [item.row for item in items])
+        now = time.time()
+        with self._cond:
+            for item in items:
+                lag = now - item.enqueued_at
+                self.last_lag = lag
+                self.avg_lag = lag if not self.written else 0.9 * self.avg_lag + 0.1 * lag
+                self.max_lag = max(self.max_lag, lag)
+                self.written += 1
+                item.done = True
+            log_stats = WRITE_STATS_INTERVAL > 0 and now - self._stats_logged_at >= WRITE_STATS_INTERVAL
+            if log_stats:
+                self._stats_logged_at = now
+        if log_stats:
+            print(f"[DEBUG] 쓰기 대기열: {self.stats()}")
+
+    def _retry(self, items: List[PendingWrite], error: Exception):
+        attempts = items[0].attempts + 1
+        for item in items:
+            item.attempts = attempts
+        if attempts >= self.max_attempts:
+            print(f"[ERROR] 대화 저장 실패 ({items[0].table}, {len(items)}건, {attempts}회): {error}")
+            self._record_failed(items, str(error))
+            return
+        delay = min(0.5 * 2 ** attempts, 30.0)
+        print(f"[DEBUG] 대화 저장 재시도 {attempts}/{self.max_attempts} ({delay:.1f}s 후): {error}")
+        # 스레드를 재우지 않고 재시도 시각만 표시 → 그 사이 다른 테이블/저장소의 행은 계속 저장
+        next_attempt_at = time.time() + delay
+        for item in items:
+            item.next_attempt_at = next_attempt_at
+        with self._cond:
+            self.retries += 1
+            self._items.extendleft(reversed(items))
+            self._cond.notify_all()
+
+    def _record_failed(self, items: List[PendingWrite], reason: str):
+        with self._cond:
+            self.failed += len(items)
+            for item in items:
+                item.done = True
+        try:
+            if os.path.dirname(self.failed_path):
+                os.makedirs(os.path.dirname(self.failed_path), exist_ok=True)
+            with open(self.failed_path, "a", encoding="utf-8") as f:
+                for item in items:
+                    f.write(json.dumps({"table": item.table, "row": item.row, "reason": reason,
+                                        "enqueued_at": item.enqueued_at}, ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"[ERROR] 저장 실패 기록 불가 ({len(items)}건): {e}")
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            oldest = self._items[0].enqueued_at if self._items else None
+            return {
+                "pending": len(self._items) + self._inflight,
+                "written": self.written,
+                "retries": self.retries,
+                "failed": self.failed,
+                "direct": self.direct,
+                # 넣은 뒤 저장될 때까지 걸린 시간(초)과 지금 가장 오래 기다리는 행의 대기 시간
+                "lag_last": round(self.last_lag, 3),
+                "lag_avg": round(self.avg_lag, 3),
+                "lag_max": round(self.max_lag, 3),
+                "oldest_pending": round(time.time() - oldest, 3) if oldest else 0.0,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_write_queue() -> WriteQueue:
+    """프로세스 공용 지연 쓰기 대기열"""
+    return WriteQueue()
+
+
+def insert_rows(storage, table: str, rows: List[Dict]):
+    """
+    대화 행 저장 - WRITE_BEHIND_ENABLED면 대기열에 넣고 바로 반환, 아니면 바로 저장
+    - 두 경우 모두 write_key를 붙여 저장 (중복 무시)
+    """
+    if WRITE_BEHIND_ENABLED:
+        get_write_queue().submit(storage, table, rows)
+        return
+    rows = [dict(row, **{WRITE_KEY_COLUMN: f"{table}:{uuid4().hex}"}) for row in rows]
+    storage.insert_talk(table, rows)
+
+
+def flush_pending_writes():
+    """대기 중인 대화 저장이 끝날 때까지 잠깐 기다림 (방금 저장한 대화를 다시 읽기 전에)"""
+    if WRITE_BEHIND_ENABLED:
+        if not get_write_queue().flush(WRITE_READ_FLUSH_TIMEOUT):
+            print("[DEBUG] 대기 중인 대화 저장이 아직 남아 있음 - 이력이 늦게 보일 수 있음")
+
+
+def failed_write_count(path: str = WRITE_FAILED_PATH) -> int:
+    """WRITE_FAILED_PATH에 남아 있는 (아직 다시 쓰지 않은) 행 수"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def replay_failed_writes(storage, path: str = WRITE_FAILED_PATH) -> Tuple[int, int]:
+    """
+    WRITE_FAILED_PATH의 행을 테이블별로 다시 저장 → (저장한 행 수, 남은 행 수)
+    - 행에 기록된 write_key를 그대로 쓰므로 이미 저장된 행은 중복되지 않음
+    - 다시 실패한 테이블의 행(과 읽지 못한 줄)은 파일에 남겨 다음에 다시 시도
+    """
+    if not os.path.exists(path):
+        return 0, 0
+    # 도는 동안 새로 실패한 행이 섞이지 않도록 파일을 옮겨 놓고 처리
+    replaying = f"{path}.replaying"
+    os.replace(path, replaying)
+    by_table: Dict[str, List[Dict]] = {}
+    kept: List[str] = []
+    with open(replaying, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                by_table.setdefault(entry["table"], []).append(entry["row"])
+            except (ValueError, KeyError, TypeError):
+                kept.append(line)
+
+    written = 0
+    for table, rows in by_table.items():
+        for start in range(0, len(rows), WRITE_BATCH_ROWS):
+            batch = rows[start:start + WRITE_BATCH_ROWS]
+            try:
+                storage.insert_talk(table, batch)
+                written += len(batch)
+            except Exception as e:
+                print(f"[ERROR] 실패한 저장 다시 쓰기 실패 ({table}, {len(batch)}건): {e}")
+                kept.extend(json.dumps({"table": table, "row": row, "reason": f"replay: {e}"},
+                                       ensure_ascii=False) + "\n" for row in batch)
+    if kept:
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(kept)
+    os.remove(replaying)
+    print(f"[DEBUG] 실패한 저장 다시 쓰기 - 저장 {written}건, 남음 {len(kept)}건")
+    return written, len(kept)
+
+
+def write_queue_stats() -> Dict[str, float]:
+    """지연 쓰기 대기열 통계 (꺼져 있으면 빈 dict)"""
+    return get_write_queue().stats() if WRITE_BEHIND_ENABLED else {}